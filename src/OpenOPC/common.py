@@ -10,13 +10,26 @@
 # Copyright (c) 2022 j3mg
 #
 ###########################################################################
+import bisect
+import datetime
+import functools
+import math
 import os
+import re
+import threading
+from collections import OrderedDict
+from itertools import accumulate, compress
 
 try:
     import pythoncom # Only used by get_error_str on Python 32-bit systems
 except:
     pass
 
+try:
+    import pywintypes # Only used by epoch2time
+except:
+    pywintypes = None
+
 
 # OPC Constants
 ACCESS_RIGHTS = (0, 'Read', 'Write', 'Read/Write')
@@ -45,42 +58,91 @@ def exceptional(func, alt_return=None, alt_exceptions=(Exception,), final=None,
          if final: final()
    return _exceptional
 
-def get_error_str(error, _opc=None):
-    """Return the error string for a OPC or COM error code"""
+class ErrorStrings():
+    """LRU cache of error code -> message text for one server connection
+
+    Looking up an error string is a COM round trip per call, yet a device
+    dropping out fails all of its tags with one or two codes.  The cache is
+    cleared on reconnect since the text comes from the connected server."""
+
+    def __init__(self, maxsize=256, stats=None):
+        self.maxsize = maxsize
+        self.stats = stats if stats is not None else {}
+        for key in ('error_str_hits', 'error_str_misses'):
+            self.stats.setdefault(key, 0)
+
+        self._lock = threading.Lock()
+        self._strings = OrderedDict()
+
+    def __len__(self):
+        return len(self._strings)
+
+    def get(self, key, lookup):
+        """Return the cached string for 'key', calling lookup() to resolve it on a miss"""
+
+        with self._lock:
+            if key in self._strings:
+                self._strings.move_to_end(key)
+                self.stats['error_str_hits'] += 1
+                return self._strings[key]
+            self.stats['error_str_misses'] += 1
+
+        error_str = lookup()
+
+        with self._lock:
+            self._strings[key] = error_str
+            if len(self._strings) > self.maxsize:
+                self._strings.popitem(last=False)
+
+        return error_str
+
+    def clear(self):
+        with self._lock:
+            self._strings.clear()
+
+def get_error_str(error, _opc=None, cache=None):
+    """Return the error string for a OPC or COM error code (memoized by scode when 'cache' is an ErrorStrings)"""
 
     hr, msg, exc, arg = error.args
 
     if exc == None:
-        error_str = str(msg)
+        return str(msg)
+
+    scode = exc[5]
+    if cache is not None:
+        return cache.get(('scode', scode, _opc is not None), lambda: scode_str(scode, _opc))
     else:
-        scode = exc[5]
-
-        if _opc is not None:
-            try:
-                opc_err_str = unicode(_opc.GetErrorString(scode)).strip('\r\n')
-            except:
-                opc_err_str = None
-        else:
-            opc_err_str = None
+        return scode_str(scode, _opc)
+
+def scode_str(scode, _opc=None):
+    """Return the combined OPC and COM error string for an scode"""
 
+    if _opc is not None:
         try:
-            com_err_str = unicode(pythoncom.GetScodeString(scode)).strip('\r\n')
+            opc_err_str = unicode(_opc.GetErrorString(scode)).strip('\r\n')
         except:
-            com_err_str = None
-
-        # OPC error codes and COM error codes are overlapping concepts,
-        # so we combine them together into a single error message.
-
-        if opc_err_str == None and com_err_str == None:
-            error_str = str(scode)
-        elif opc_err_str == com_err_str:
-            error_str = opc_err_str
-        elif opc_err_str == None:
-            error_str = com_err_str
-        elif com_err_str == None:
-            error_str = opc_err_str
-        else:
-            error_str = '%s (%s)' % (opc_err_str, com_err_str)
+            opc_err_str = None
+    else:
+        opc_err_str = None
+
+    try:
+        com_err_str = unicode(pythoncom.GetScodeString(scode)).strip('\r\n')
+    except:
+        com_err_str = None
+
+    # OPC error codes and COM error codes are overlapping concepts,
+    # so we combine them together into a single error message.
+
+    if opc_err_str == None and com_err_str == None:
+        error_str = str(scode)
+    elif opc_err_str == com_err_str:
+        error_str = opc_err_str
+    elif opc_err_str == None:
+        error_str = com_err_str
+    elif com_err_str == None:
+        error_str = opc_err_str
+    else:
+        error_str = '%s (%s)' % (opc_err_str, com_err_str)
 
     return error_str
 
@@ -90,6 +152,31 @@ def quality_str(quality_bits):
     quality = (quality_bits >> 6) & 3
     return OPC_QUALITY[quality]
 
+def time2epoch(timestamp):
+    """Convert an OPC (pywintypes) timestamp to seconds since the Unix epoch"""
+
+    if timestamp == None:
+        return float('nan')
+
+    try:
+        return timestamp.timestamp()  # pywin32 >= 300 timestamps are timezone aware datetimes
+    except AttributeError:
+        return float(int(timestamp))
+
+def epoch2time(seconds):
+    """Convert seconds since the Unix epoch back to an OPC (pywintypes) UTC timestamp, the inverse of time2epoch()"""
+
+    if seconds is None or math.isnan(seconds):
+        return None
+
+    if pywintypes is None:
+        return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc)
+
+    try:
+        return pywintypes.TimeType.fromtimestamp(seconds, datetime.timezone.utc)
+    except AttributeError:
+        return pywintypes.Time(int(seconds))  # pywin32 < 300 has whole-second timestamps
+
 def type_check(tags):
     """Perform a type check on a list of tags"""
 
@@ -121,6 +208,130 @@ def wild2regex(string):
    """Convert a Unix wildcard glob into a regular expression"""
    return string.replace('.','[.]').replace('*','.*').replace('?','.').replace('!','^')
 
+GLOB_SPECIAL = frozenset('*?![]()+^$|\\{}')
+
+class GlobMatcher():
+    """Case-insensitive match of names against several Unix wildcard globs in one pass
+
+    Each glob is sorted out once: plain names, 'prefix*', '*suffix' and
+    '*part*' are tested with string operations and the rest are joined into
+    a single regular expression (see wild2regex).  match() returns the
+    position of the first glob a name matches, and calling the matcher
+    returns whether it matches any of them, so it can be given to filter().
+    classify() sorts a long list of names (a flat browse) in one go."""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._exact = {}
+        self._tests = []
+        self._searches = []
+        self._regex_first = None
+        regex = []
+        for i, pattern in enumerate(self.patterns):
+            lower = pattern.lower()
+            stripped = lower.strip('*')
+            if len(GLOB_SPECIAL.intersection(stripped)) > 0:
+                regex.append((i, pattern))
+            elif stripped == lower:
+                self._exact.setdefault(lower, i)
+                self._searches.append((i, '\n' + lower + '\n'))
+            elif len(stripped) == 0:
+                self._tests.append((i, lambda name, text: True, ''))
+                self._searches.append((i, None))
+            elif lower == stripped + '*':
+                self._tests.append((i, str.startswith, stripped))
+                self._searches.append((i, '\n' + stripped))
+            elif lower == '*' + stripped:
+                self._tests.append((i, str.endswith, stripped))
+                self._searches.append((i, stripped + '\n'))
+            elif lower == '*' + stripped + '*':
+                self._tests.append((i, str.__contains__, stripped))
+                self._searches.append((i, stripped))
+            else:
+                regex.append((i, pattern))
+
+        # Alternatives are tried in order, so the group that matched is the first matching glob
+        self._regex = None
+        if len(regex) > 0:
+            self._regex = re.compile('^(?:%s)$' % '|'.join('(?P<p%d>%s)' % (i, wild2regex(p)) for i, p in regex), re.IGNORECASE)
+            self._regex_first = regex[0][0]
+
+    def match(self, name):
+        """Return the position of the first glob matching name, or None"""
+
+        lower = name.lower()
+        best = self._exact.get(lower)
+        for i, test, text in self._tests:
+            if best is not None and i > best: break
+            if test(lower, text):
+                best = i
+                break
+        if self._regex is not None and (best is None or best > self._regex_first):
+            m = self._regex.match(name)
+            if m is not None:
+                i = int(m.lastgroup[1:])
+                if best is None or i < best: best = i
+        return best
+
+    def __call__(self, name):
+        return self.match(name) is not None
+
+    def classify(self, names):
+        """Split names into one list per glob, each name going to the first glob it matches
+
+        The string-test globs are found with substring searches over all the
+        names joined into one lower-cased string, and the others with one
+        pass of the combined regular expression, instead of a Python-level
+        test per name and glob."""
+
+        if len(self.patterns) == 1:
+            pattern = re.compile('^%s$' % wild2regex(self.patterns[0]), re.IGNORECASE)
+            return [list(filter(pattern.search, names))]
+
+        names = list(names)
+        buckets = [[] for p in self.patterns]
+        text = '\n' + '\n'.join(names).lower() + '\n'
+        starts = [1] + [end + 1 for end in accumulate(len(name) + 1 for name in names)]
+
+        # Lower-casing changed some lengths, so the line offsets are off
+        if starts[-1] != len(text):
+            for name in names:
+                i = self.match(name)
+                if i is not None: buckets[i].append(name)
+            return buckets
+
+        owner = {}
+        if self._regex is not None:
+            found = list(map(self._regex.match, names))
+            for line in compress(range(len(names)), found):
+                owner[line] = int(found[line].lastgroup[1:])
+
+        for i, sub in self._searches:
+            if sub is None:
+                # '*' takes every name no earlier glob has
+                for line in range(len(names)):
+                    if owner.get(line, i) >= i: owner[line] = i
+                break
+            offset = 1 if sub[0] == '\n' else 0
+            pos = text.find(sub)
+            while pos >= 0:
+                line = bisect.bisect_right(starts, pos + offset) - 1
+                if owner.get(line, i) >= i: owner[line] = i
+                pos = text.find(sub, pos + 1)
+
+        for line in sorted(owner):
+            buckets[owner[line]].append(names[line])
+        return buckets
+
+@functools.lru_cache(maxsize=256)
+def _compile_glob(patterns):
+    return GlobMatcher(patterns)
+
+def compile_glob(patterns):
+    """Return a (cached) GlobMatcher for a glob or a list of globs"""
+    if isinstance(patterns, str): patterns = [patterns]
+    return _compile_glob(tuple(patterns))
+
 def TimeoutError(msg):
     return Exception("TimeoutError", msg)
 
@@ -19,6 +19,7 @@ import types
 import datetime
 import re, time, csv
 import OpenOPC
+import OpenOPC.opcdabrowse
 
 try:
     import Pyro5
@@ -41,6 +42,7 @@ def usage():
     print('  -p, --properties           View properties of ITEMs')
     print('  -l, --list                 List items at specified PATHs (tree browser)')
     print('  -f, --flat                 List all ITEM names (flat browser)')
+    print('  -k, --save                 Save the namespace at PATHs to the -d snapshot FILE')
     print('  -i, --info                 Display OPC server information')
     print('  -q, --servers              Query list of available OPC servers')
     print('  -S, --sessions             List sessions in OpenOPC Gateway Service')
@@ -56,7 +58,7 @@ def usage():
     print('')
     print('  -F FUNC, --function=FUNC   Read FUNCTION to use (sync, async)')
     print('  -c SRC,  --source=SOURCE   Set data SOURCE for reads (cache, device, hybrid)')
-    print('  -g SIZE, --size=SIZE       Group tags into SIZE items per transaction')
+    print('  -g SIZE, --size=SIZE       Group tags into SIZE items per transaction (auto to adapt to the server)')
     print('  -z MSEC, --pause=MSEC      Sleep MSEC milliseconds between transactions')
     print('  -u MSEC, --update=MSEC     Set update rate for group to MSEC milliseconds')
     print('  -t MSEC, --timeout=MSEC    Set read timeout to MSEC mulliseconds')
@@ -69,6 +71,9 @@ def usage():
     print('  -v,      --verbose         Verbose mode showing all OPC function calls')
     print('  -e,      --errors          Include descriptive error message strings')
     print('  -R,      --recursive       List items recursively when browsing tree')
+    print('  -j N,    --jobs=N          Browse recursively or get properties with N parallel workers')
+    print('  -d FILE, --snapshot=FILE   Namespace snapshot FILE (-l and -f run offline against it)')
+    print('  -A SEC,  --max-age=SEC     With -k, skip branches saved less than SEC seconds ago')
     print('  -,       --pipe            Pipe item/value list from standard input')
 
 # Helper class for handling signals (i.e. Ctrl-C)
@@ -251,6 +256,9 @@ def main():
     repeat_pause = None
     property_ids = None
     include_err_msg = False
+    snapshot_file = None
+    snapshot_age = None
+    browse_workers = 1
 
     if 'OPC_MODE' in os.environ:         opc_mode = environ['OPC_MODE']
     if 'OPC_CLASS' in os.environ:        opc_class = environ['OPC_CLASS']
@@ -268,7 +276,7 @@ def main():
         pipe = True
 
     try:
-        opts, args = gnu_getopt(argv[1:], 'rwlpfiqRSevx:m:C:H:P:c:h:s:L:F:z:o:a:u:t:g:y:n:', ['read','write','list','properties','flat','info','mode=','gate-host=','gate-port=','class=','host=','server=','output=','pause=','pipe','servers','sessions','repeat=','function=','append=','update=','timeout=','size=','source=','id=','verbose','recursive','rotate=','errors','name='])
+        opts, args = gnu_getopt(argv[1:], 'rwlpfiqkRSevx:m:C:H:P:c:h:s:L:F:z:o:a:u:t:g:y:n:d:j:A:', ['read','write','list','properties','flat','save','info','mode=','gate-host=','gate-port=','class=','host=','server=','output=','pause=','pipe','servers','sessions','repeat=','function=','append=','update=','timeout=','size=','source=','id=','verbose','recursive','rotate=','errors','name=','snapshot=','jobs=','max-age='])
     except GetoptError:
         usage()
         exit()   
@@ -286,6 +294,7 @@ def main():
         if o in ['-w', '--write']      : action = 'write'
         if o in ['-l', '--list']       : action = 'list'
         if o in ['-f', '--flat']       : action = 'flat'
+        if o in ['-k', '--save']       : action = 'save'
         if o in ['-p', '--properties'] : action = 'properties'
         if o in ['-i', '--info']       : action = 'info'
         if o in ['-q', '--servers']    : action = 'servers'
@@ -297,7 +306,7 @@ def main():
         if o in ['-z', '--pause']      : tx_pause = int(a)
         if o in ['-u', '--update']     : update_rate = int(a)
         if o in ['-t', '--timeout']    : timeout = int(a)
-        if o in ['-g', '--size']       : group_size = int(a)
+        if o in ['-g', '--size']       : group_size = a if a == 'auto' else int(a)
         if o in ['-c', '--source']     : data_source = a
         if o in ['-y', '--id']         : property_ids = a
         if o in ['-a', '--append']     : append = a
@@ -305,10 +314,19 @@ def main():
         if o in ['-v', '--verbose']    : verbose = True
         if o in ['-e', '--errors']     : include_err_msg = True
         if o in ['-R', '--recursive']  : recursive = True
+        if o in ['-d', '--snapshot']   : snapshot_file = a
+        if o in ['-j', '--jobs']       : browse_workers = int(a)
+        if o in ['-A', '--max-age']    : snapshot_age = float(a)
         if o in ['--pipe']             : pipe = True
 
     # Check validity of command line options
 
+    offline = snapshot_file != None and action in ('list', 'flat')
+
+    if action == 'save' and snapshot_file == None:
+        print('Snapshot file missing: use -d option with the save action')
+        exit()
+
     if num_columns > 0 and style in ('values', 'pairs'):
         print("'%s' style format may not be used with rotate" % style)
         exit()
@@ -317,7 +335,7 @@ def main():
         print("'%s' is not a valid protocol mode (options: dcom, open)" % opc_mode)
         exit()
 
-    if opc_mode == 'dcom' and not OpenOPC.opcda.win32com_found:
+    if opc_mode == 'dcom' and not OpenOPC.opcda.win32com_found and not offline:
         print("win32com modules required when using DCOM protocol mode (http://pywin32.sourceforge.net/)")
         exit()
 
@@ -343,7 +361,7 @@ def main():
         usage()
         exit()
 
-    if opc_server == '' and action not in ('servers', 'sessions'):
+    if opc_server == '' and action not in ('servers', 'sessions') and not offline:
        print('OPC server name missing: use -s option or set OPC_SERVER environment variable')
        exit()
 
@@ -432,6 +450,20 @@ def main():
             print("Cannot connect to OpenOPC service at %s:%s - %s" % (open_host, open_port, error_msg))
         exit()
        
+    # ACTION: List Items from a namespace snapshot (no server connection)
+
+    if offline:
+        try:
+            snapshot = OpenOPC.opcdabrowse.NamespaceSnapshot(snapshot_file, readonly=True)
+            if action == 'list':
+                output(irotate(snapshot.ilist(tags, recursive=recursive), num_columns), style)
+            else:
+                output(snapshot.list(tags, flat=True), style)
+            snapshot.close()
+        except Exception as error_msg:
+            print("Cannot read snapshot file '%s' - %s" % (snapshot_file, error_msg.args[-1]))
+        exit()
+
     # Connect to OpenOPC service (Open mode)
 
     if opc_mode == 'open':
@@ -468,7 +500,7 @@ def main():
     # ACTION: Read Items
 
     if action == 'read':
-        if group_size and len(tags) > group_size and opc_mode == 'dcom':
+        if (group_size == 'auto' or (group_size and len(tags) > group_size)) and opc_mode == 'dcom':
             opc_read = opc.iread
             rotate = irotate
         else:
@@ -483,6 +515,7 @@ def main():
         total_count = 0
         com_connected = True
         pyro_connected = True
+        next_read = time.time()
 
         while not sh.signaled:
 
@@ -546,8 +579,12 @@ def main():
                 total_count += len(status)
 
             if repeat_pause != None:
+                # Repeat on a fixed schedule so the time taken by each read does not add up
+                next_read += repeat_pause
+                if next_read < time.time():
+                    next_read = time.time()
                 try:
-                    time.sleep(repeat_pause)
+                    time.sleep(max(next_read - time.time(), 0))
                 except IOError:
                     break
             else:
@@ -565,7 +602,7 @@ def main():
     # ACTION: Write Items
 
     elif action == 'write':
-        if group_size and len(tags) > group_size and opc_mode == 'dcom':
+        if (group_size == 'auto' or (group_size and len(tags) > group_size)) and opc_mode == 'dcom':
             opc_write = opc.iwrite
             rotate = irotate
         else:
@@ -598,7 +635,7 @@ def main():
             rotate = irotate
 
         try:
-            output(rotate(opc_list(tags, recursive=recursive), num_columns), style)
+            output(rotate(opc_list(tags, recursive=recursive, workers=browse_workers), num_columns), style)
         except Exception as error_msg:
             if opc_mode == 'open': error_msg = error_msg[0]
             print(error_msg)
@@ -612,6 +649,16 @@ def main():
             if opc_mode == 'open': error_msg = error_msg[0]
             print(error_msg)
 
+    # ACTION: Save Namespace Snapshot
+
+    elif action == 'save':
+        try:
+            summary = opc.save_namespace(snapshot_file, tags if len(tags) > 0 else None, max_age=snapshot_age)
+            print('Saved %d branches to %s (%d skipped, %d items added, %d removed, %.2f seconds)' % (summary['branches'], snapshot_file, summary['skipped'], summary['added'], summary['removed'], time.time() - start_time))
+        except Exception as error_msg:
+            if opc_mode == 'open': error_msg = error_msg[0]
+            print(error_msg)
+
     # ACTION: Item Properties
 
     elif action == 'properties':
@@ -628,7 +675,7 @@ def main():
             value_idx = 3
 
         try:
-            output(rotate(opc_properties(tags, property_ids), num_columns, value_idx), style, value_idx)
+            output(rotate(opc_properties(tags, property_ids, workers=browse_workers), num_columns, value_idx), style, value_idx)
         except Exception as error_msg:
             if opc_mode == 'open': error_msg = error_msg[0]
             print(error_msg)
@@ -17,11 +17,13 @@ import types
 import string
 import socket
 import re
+import threading
 import Pyro5.core
 import Pyro5.server
 
 # OPC Constants
-from OpenOPC.common import get_error_str, OPC_CLASS, OPC_SERVER, OPC_CLIENT, OPCError
+from OpenOPC.common import get_error_str, type_check, OPC_CLASS, OPC_SERVER, OPC_CLIENT, OPCError
+from OpenOPC.opcdasched import Scheduler, WriteQueue
 
 win32com_found = False
 win32_found = (os.name == 'nt')
@@ -70,6 +72,7 @@ class client():
         self._group_server_handles = {}
         self._group_handles_tag = {}
         self._group_hooks = {}
+        self._write_queue = None
         # Members prefixed by __open are owned by the OPC Gateway Service
         self.__open_serv__ = None 
         self.__open_self__ = None
@@ -102,7 +105,7 @@ class client():
             self._event = win32event.CreateEvent(None,0,0,None)
 
             self.clientIO = ClientIO()
-            self.clientTools = ClientTools(self.opc_class, self.opc_host)
+            self.clientTools = ClientTools(self.opc_class, self.opc_host, self.clientIO.error_strings)
 
         self.win32os = win32com_found # win32com_found set to False by pytest-mock in test_client
         if self.win32os: win32_init(opc_class)
@@ -122,6 +125,61 @@ class client():
             self.trace = trace
             if self.win32os: self.clientIO.setTrace(trace)
 
+    def set_item_pool(self, max_items=10000, max_idle=600, max_write_items=10000):
+        """Cap the items kept live for anonymous reads and writes (0 to create and remove a group on every call) and the seconds an unused item is kept (None for no limit)"""
+        if self.win32os:
+            self.clientIO.item_pool.max_items = max_items
+            self.clientIO.item_pool.max_idle = max_idle
+            self.clientIO.write_pool.max_items = max_write_items
+            self.clientIO.write_pool.max_idle = max_idle
+
+    def set_value_cache(self, max_items=100000):
+        """Cap the tags whose last value is kept for read(max_age=...) (0 to disable the cache)
+
+        Values are only kept once a read has given max_age, so clients that
+        never use it do not pay for the cache.  max_age applies to anonymous
+        reads only; a read of a named group given max_age raises ValueError."""
+        if self.win32os:
+            self.clientIO.value_cache.max_items = max_items
+            if not max_items: self.clientIO.value_cache.clear()
+
+    def set_browse_cache(self, ttl=None):
+        """Answer list()/ilist() from browse results kept for ttl seconds (None until invalidate_browse(), 0 to disable the cache)"""
+        if self.win32os:
+            self.clientTools.browse_index.ttl = ttl
+            if ttl == 0: self.clientTools.browse_index.clear()
+
+    def invalidate_browse(self, paths=None):
+        """Drop the cached browse results at and below path(s), or all of them if paths is None"""
+        if self.win32os:
+            if paths is None:
+                self.clientTools.browse_index.clear()
+                return
+
+            paths, single, valid = type_check(paths)
+            if not valid:
+                raise TypeError("invalidate_browse(): 'paths' parameter must be a string or a list of strings")
+            for path in paths:
+                self.clientTools.browse_index.invalidate(path)
+
+    def set_property_cache(self, ttl=300):
+        """Keep item properties other than value, quality and timestamp for ttl seconds (None until invalidate_properties(), 0 to disable the cache)"""
+        if self.win32os:
+            self.clientTools.property_cache.ttl = ttl
+            if ttl == 0: self.clientTools.property_cache.clear()
+
+    def invalidate_properties(self, tags=None):
+        """Drop the cached properties of tag(s), or of all tags if tags is None"""
+        if self.win32os:
+            if tags is None:
+                self.clientTools.property_cache.clear()
+                return
+
+            tags, single, valid = type_check(tags)
+            if not valid:
+                raise TypeError("invalidate_properties(): 'tags' parameter must be a string or a list of strings")
+            self.clientTools.property_cache.invalidate(tags)
+
     def connect(self, opc_server=None, opc_host='localhost'):
         """Connect to the specified OPC server"""
         
@@ -178,6 +236,13 @@ class client():
                 opc_host = socket.gethostname()
             self.opc_host = opc_host
             self.clientTools.set_opc_host(opc_host)
+
+            # Error strings, pooled items, cached values, browse results and properties belong to the server, so drop any kept from a previous connection
+            self.clientIO.error_strings.clear()
+            self.clientIO.reset_pool()
+            self.clientIO.value_cache.clear()
+            self.clientTools.browse_index.clear()
+            self.clientTools.property_cache.clear()
             return connected
         
         connected = False
@@ -188,16 +253,54 @@ class client():
     def GUID(self):
         return self.__open_guid__
 
+    def _connection(self):
+        """Open another connection to the connected server, owned by the calling thread
+
+        COM objects may only be called from the apartment of the thread
+        that created them, so worker threads make their calls through a
+        connection of their own rather than through this client."""
+
+        connection = client(self.opc_class, self.client_name)
+        connection.set_trace(self.trace)
+        connection.set_item_pool(self.clientIO.item_pool.max_items, self.clientIO.item_pool.max_idle, self.clientIO.write_pool.max_items)
+        connection.connect(self.opc_server, self.opc_host)
+        return connection
+
+    def _thread_connections(self):
+        """Return (current, on_start, on_exit) giving a background thread its own connection
+
+        on_start() and on_exit() run on the background thread to open and
+        close its connection, and current() returns the client the calling
+        thread should use (this one for any other thread)."""
+
+        local = threading.local()
+
+        def on_start():
+            local.client = self._connection()
+
+        def on_exit():
+            connection = local.__dict__.pop('client', None)
+            if connection:
+                try:
+                    connection.close()
+                finally:
+                    connection = None
+                    pythoncom.CoUninitialize()
+
+        current = lambda: getattr(local, 'client', self)
+        return current, on_start, on_exit
+
     def close(self, del_object=True):
         """Disconnect from the currently connected OPC server"""
 
         def win32_close(del_object):
             try:
                 pythoncom.CoInitialize()
+                self.stop_writer()
                 self.remove(self.groups())
 
             except pythoncom.com_error as err:
-                error_msg = 'Disconnect: %s' % get_error_str(err, self._opc)
+                error_msg = 'Disconnect: %s' % get_error_str(err, self._opc, self.clientIO.error_strings)
                 raise OPCError(error_msg)
 
             except OPCError:
@@ -206,6 +309,7 @@ class client():
             finally:
                 if self.trace: self.trace('Disconnect()')
                 self._opc.Disconnect()
+                self.clientIO.reset_pool()
 
                 # Remove this object from the open gateway service
                 if self.__open_serv__ and del_object:
@@ -217,19 +321,37 @@ class client():
         """Return a list of active tag groups"""
         return self._groups.keys()
 
+    def sizing(self):
+        """Return the transaction size and pause currently chosen by size='auto' for reads and writes"""
+        if self.win32os:
+            return {'read': self.clientIO.read_sizer.state(), 'write': self.clientIO.write_sizer.state()}
+        else:
+            return None
+
+    def stats(self):
+        """Return a dictionary of client performance counters"""
+        if self.win32os:
+            stats = dict(self.clientIO.stats)
+            stats.update(self.clientIO.transactions.stats)
+            stats.update(self.clientTools.browse_index.stats)
+            stats.update(self.clientTools.property_cache.stats)
+            return stats
+        else:
+            return None
+
 
     #
     # Read/Write functions
     #
-    def iread(self, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False, include_error=False, rebuild=False):
+    def iread(self, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False, include_error=False, rebuild=False, window=1, format='tuples', quality='str', timestamps='str', max_age=None):
         if self.win32os:
-            return self.clientIO.iread(self._opc, self.clientTools, tags, group, size, pause, source, update, timeout, sync, include_error, rebuild)
+            return self.clientIO.iread(self._opc, self.clientTools, tags, group, size, pause, source, update, timeout, sync, include_error, rebuild, window=window, format=format, quality=quality, timestamps=timestamps, max_age=max_age)
         else:
             return None
 
-    def read(self, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False, include_error=False, rebuild=False):
+    def read(self, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False, include_error=False, rebuild=False, window=1, format='tuples', quality='str', timestamps='str', max_age=None):
         if self.win32os:
-            return self.clientIO.read(self._opc, self.clientTools, tags, group, size, pause, source, update, timeout, sync, include_error, rebuild)
+            return self.clientIO.read(self._opc, self.clientTools, tags, group, size, pause, source, update, timeout, sync, include_error, rebuild, window=window, format=format, quality=quality, timestamps=timestamps, max_age=max_age)
         else:
             return None
 
@@ -239,15 +361,99 @@ class client():
         else:
             return None
 
-    def iwrite(self, tag_value_pairs, size=None, pause=0, include_error=False):
+    def read_changed(self, tags=None, group=None, deadband=None, percent=None, **kwargs):
+        """Read like read() but return only the (tag, value, quality, time) tuples that changed since the last call for the group"""
         if self.win32os:
-            return self.clientIO.iwrite(self._opc, self.clientTools, tag_value_pairs, size, pause, include_error)
+            return self.clientIO.read_changed(self._opc, self.clientTools, tags, group, deadband, percent, **kwargs)
         else:
             return None
 
-    def write(self, tag_value_pairs, size=None, pause=0, include_error=False):
+    def scheduler(self, sink=None):
+        """Return a Scheduler whose scan classes are read through this client (see OpenOPC.opcdasched.Scheduler)
+
+        Scans merged into one tick are read as one anonymous read, so the
+        item pool should be big enough for the tags of all scan classes.
+        Scans run by Scheduler.run() are read through this client, those
+        run by Scheduler.start() through a connection of the scheduler
+        thread's own."""
+
         if self.win32os:
-            return self.clientIO.write(self._opc, self.clientTools, tag_value_pairs, size, pause, include_error)
+            current, on_start, on_exit = self._thread_connections()
+            read = lambda tags, size: current().read(tags, size=size)
+            return Scheduler(read, sink, on_start, on_exit)
+        else:
+            return None
+
+    def start_writer(self, max_batch=1000, max_delay=10, background=False):
+        """Start the queue used by write_async() to coalesce writes into batches
+
+        Batches are flushed once they hold 'max_batch' tags or 'max_delay'
+        milliseconds after their first write.  With 'background' set they
+        are written by a separate thread through its own connection to the
+        server.  Otherwise they are written on the calling thread: by
+        write_async() once due, by waiting on one of the returned futures
+        (its result() flushes the batch after 'max_delay'), or by
+        flush_writes() and stop_writer()."""
+
+        if self.win32os:
+            self.stop_writer()
+            current, on_start, on_exit = self._thread_connections()
+            write = lambda tag_value_pairs: current().write(tag_value_pairs)
+            self._write_queue = WriteQueue(write, max_batch, max_delay, background, self.clientIO.stats, on_start, on_exit)
+            return self._write_queue
+        else:
+            return None
+
+    def stop_writer(self):
+        """Flush the pending writes of write_async() and stop its queue"""
+        if self._write_queue:
+            self._write_queue.close()
+            self._write_queue = None
+
+    def write_async(self, tag_value_pairs):
+        """Queue (tag, value) pair(s) for writing and return a Future (or a list of them) resolving to each status"""
+
+        if self.win32os:
+            if type(tag_value_pairs) not in (list, tuple) or len(tag_value_pairs) == 0:
+                raise TypeError("write_async(): 'tag_value_pairs' parameter must be a (tag, value) tuple or a list of (tag,value) tuples")
+
+            if self._write_queue is None:
+                self.start_writer()
+
+            if type(tag_value_pairs[0]) in (str,bytes):
+                return self._write_queue.submit(tag_value_pairs[0], tag_value_pairs[1])
+            else:
+                return [self._write_queue.submit(p[0], p[1]) for p in tag_value_pairs]
+        else:
+            return None
+
+    def flush_writes(self):
+        """Write everything queued by write_async() now, returning the number of tags written"""
+        if self._write_queue:
+            return self._write_queue.flush()
+        return 0
+
+    def iwrite(self, tag_value_pairs, size=None, pause=0, include_error=False, sync=True, window=1, timeout=5000):
+        if self.win32os:
+            return self.clientIO.iwrite(self._opc, self.clientTools, tag_value_pairs, size, pause, include_error, sync, window, timeout)
+        else:
+            return None
+
+    def write(self, tag_value_pairs, size=None, pause=0, include_error=False, sync=True, window=1, timeout=5000):
+        if self.win32os:
+            return self.clientIO.write(self._opc, self.clientTools, tag_value_pairs, size, pause, include_error, sync, window, timeout)
+        else:
+            return None
+
+    def subscribe(self, tags, update_rate=1000, callback=None, group=None, buffer_size=1000, policy='coalesce', quality='str', timestamps='str'):
+        if self.win32os:
+            return self.clientIO.subscribe(self._opc, self.clientTools, tags, update_rate, callback, group, buffer_size, policy, quality, timestamps)
+        else:
+            return None
+
+    def set_group(self, group, update_rate=None, deadband=None, active=None):
+        if self.win32os:
+            return self.clientIO.set_group(self._opc, group, update_rate, deadband, active)
         else:
             return None
 
@@ -271,27 +477,42 @@ class client():
     #
     # General tools functions
     #
-    def iproperties(self, tags, id=None):
+    def iproperties(self, tags, id=None, workers=1):
+        if self.win32os:
+            return self.clientTools.iproperties(self._opc, tags, id, workers, self._connection)
+        else:
+            return None
+
+    def properties(self, tags, id=None, workers=1):
+        """Return item properties; with workers > 1 the properties of several tags are read by that many threads"""
         if self.win32os:
-            return self.clientTools.iproperties(self._opc, tags, id)
+            return self.clientTools.properties(self._opc, tags, id, workers, self._connection)
         else:
             return None
 
-    def properties(self, tags, id=None):
+    def ilist(self, paths='*', recursive=False, flat=False, include_type=False, workers=1):
         if self.win32os:
-            return self.clientTools.properties(self._opc, tags, id)
+            return self.clientTools.ilist(self._opc, paths, recursive, flat, include_type, workers, self._connection)
         else:
             return None
 
-    def ilist(self, paths='*', recursive=False, flat=False, include_type=False):
+    def list(self, paths='*', recursive=False, flat=False, include_type=False, workers=1):
+        """Return list of item nodes at specified path(s); a recursive browse with workers > 1 uses that many browsers in parallel"""
         if self.win32os:
-            return self.clientTools.ilist(self._opc, paths, recursive, flat, include_type)
+            return self.clientTools.list(self._opc, paths, recursive, flat, include_type, workers, self._connection)
         else:
             return None
 
-    def list(self, paths='*', recursive=False, flat=False, include_type=False):
+    def save_namespace(self, filename, paths=None, properties=False, max_age=None):
+        """Save the address space below path(s) to an SQLite file that OpenOPC.opcdabrowse.NamespaceSnapshot lists without a connection
+
+        Saving over an existing file re-browses the branches but only looks
+        up item IDs (and, with properties=True, datatypes and access rights)
+        for new items.  Branches saved less than max_age seconds ago are not
+        browsed again."""
+
         if self.win32os:
-            return self.clientTools.list(self._opc, paths, recursive, flat, include_type)
+            return self.clientTools.save_namespace(self._opc, filename, paths, properties, max_age)
         else:
             return None
 
@@ -315,7 +536,7 @@ class client():
 
     def _get_error_str(self, err):
         if self.win32os:
-            return get_error_str(err, self._opc)
+            return get_error_str(err, self._opc, self.clientIO.error_strings)
         else:
             return None
 
@@ -0,0 +1,508 @@
+###########################################################################
+#
+# OpenOPC for Python OPC-DA Browse Library file
+#
+# Tree browsing of the server address space: an in-memory index used by
+# ClientTools.ilist() to answer repeated browses without walking the server
+# browser again, and an SQLite snapshot that can be listed offline.
+#
+# Copyright (c) 2007-2012 Barry Barnreiter (barry_b@users.sourceforge.net)
+# Copyright (c) 2014 Anton D. Kachalov (mouse@yandex.ru)
+# Copyright (c) 2017 José A. Maita (jose.a.maita@gmail.com)
+# Copyright (c) 2022 j3mg
+#
+###########################################################################
+import os
+import sqlite3
+import threading
+import time
+from collections import deque, OrderedDict
+from urllib.request import pathname2url
+from OpenOPC.common import OPCError, compile_glob, exceptional
+from OpenOPC.opcdaevents import ThreadWait
+
+def path_parts(path):
+    """Split a browse path ('Channel_1.Device_1' or '/Channel_1/Device_1') into a tuple of names"""
+    return tuple(p for p in path.replace('.','/').split('/') if len(p) > 0)
+
+class BrowseNode():
+    """One branch of the address space
+
+    'children' maps sub-branch names to their nodes and 'leaves' maps leaf
+    names to item IDs (None until the ID has been asked for).  The *_time
+    fields hold when each listing was loaded, or None if it never was."""
+
+    __slots__ = ('children', 'leaves', 'branches_time', 'leaves_time')
+
+    def __init__(self):
+        self.children = OrderedDict()
+        self.leaves = None
+        self.branches_time = None
+        self.leaves_time = None
+
+class BrowseIndex():
+    """Trie of branches and leaves filled in as the address space is browsed
+
+    Listings are loaded through the callables passed in by the caller, which
+    walk the server browser, and are kept for 'ttl' seconds (None keeps them
+    until invalidate() is called, 0 disables the cache)."""
+
+    def __init__(self, ttl=0, stats=None):
+        self.ttl = ttl
+        self.root = BrowseNode()
+        self._flat = None
+        self._flat_time = None
+        self.stats = stats if stats is not None else {}
+        for key in ('browse_hits', 'browse_misses'):
+            self.stats.setdefault(key, 0)
+
+    def _fresh(self, loaded):
+        if loaded is None:
+            return False
+        return self.ttl is None or time.monotonic() - loaded <= self.ttl
+
+    def _node(self, path):
+        node = self.root
+        for p in path:
+            if node.branches_time is None:
+                node = node.children.setdefault(p, BrowseNode())
+            else:
+                # A branch missing from a loaded listing gets a detached node
+                node = node.children.get(p) or BrowseNode()
+        return node
+
+    def branches(self, path, load):
+        """Return the sub-branch names below path, calling load(path) if they are not cached"""
+
+        node = self._node(path)
+        if self._fresh(node.branches_time):
+            self.stats['browse_hits'] += 1
+            return node.children
+
+        self.stats['browse_misses'] += 1
+        names = load(path)
+
+        # Keep the sub-trees of branches that are still there
+        node.children = OrderedDict((n, node.children.get(n) or BrowseNode()) for n in names)
+        node.branches_time = time.monotonic()
+        return node.children
+
+    def leaves(self, path, load):
+        """Return the leaf names below path, calling load(path) if they are not cached"""
+
+        node = self._node(path)
+        if self._fresh(node.leaves_time):
+            self.stats['browse_hits'] += 1
+            return node.leaves
+
+        self.stats['browse_misses'] += 1
+        names = load(path)
+
+        # Item IDs of leaves that are still there stay valid
+        old = node.leaves or {}
+        node.leaves = OrderedDict((n, old.get(n)) for n in names)
+        node.leaves_time = time.monotonic()
+        return node.leaves
+
+    def item_id(self, path, name, resolve):
+        """Return the item ID of leaf name below path, calling resolve(path, name) if it is not cached"""
+
+        leaves = self._node(path).leaves
+        item_id = leaves.get(name) if leaves else None
+        if item_id is not None:
+            self.stats['browse_hits'] += 1
+            return item_id
+
+        self.stats['browse_misses'] += 1
+        item_id = resolve(path, name)
+        if leaves is not None and name in leaves:
+            leaves[name] = item_id
+        return item_id
+
+    def flat(self, load):
+        """Return the flat list of item IDs, calling load() if it is not cached"""
+
+        if self._fresh(self._flat_time):
+            self.stats['browse_hits'] += 1
+            return self._flat
+
+        self.stats['browse_misses'] += 1
+        self._flat = list(load())
+        self._flat_time = time.monotonic()
+        return self._flat
+
+    def invalidate(self, path=None):
+        """Forget the cached listings at and below path (the whole index if path is None)"""
+
+        parts = path_parts(path) if path else ()
+        if len(parts) == 0:
+            self.clear()
+            return
+
+        node = self.root
+        for p in parts:
+            node = node.children.get(p)
+            if node is None: break
+        else:
+            node.children = OrderedDict()
+            node.leaves = None
+            node.branches_time = None
+            node.leaves_time = None
+
+        # The flat listing spans every branch
+        self._flat = None
+        self._flat_time = None
+
+    def clear(self):
+        self.root = BrowseNode()
+        self._flat = None
+        self._flat_time = None
+
+def prefetch(index, make_source, roots, workers=4, stats=None, wait=None):
+    """Load the listings and item IDs of every branch below root(s) into index using parallel workers
+
+    Each worker thread calls make_source() once for a browse source of its
+    own and pulls branches from a shared queue, so at most 'workers' server
+    browsers are busy at a time.  A branch that fails to load is left for the
+    caller to browse (and report) itself.  Workers that could not get a
+    source and branches that failed are counted in stats.  The calling
+    thread waits for the workers through 'wait' (see OpenOPC.opcdaevents),
+    e.g. a MessageWait so it keeps pumping COM messages.  Returns the
+    number of branches loaded."""
+
+    queue = deque(roots)
+    lock = threading.Condition()
+    state = {'busy': 0, 'loaded': 0, 'done': 0}
+    stats = stats if stats is not None else {}
+    for key in ('browse_prefetched', 'browse_prefetch_errors', 'browse_worker_errors'):
+        stats.setdefault(key, 0)
+    wait = wait if wait else ThreadWait()
+
+    def run():
+        source = make_source()
+        try:
+            while True:
+                with lock:
+                    while len(queue) == 0 and state['busy'] > 0:
+                        lock.wait()
+                    if len(queue) == 0:
+                        return
+                    branch = queue.popleft()
+                    state['busy'] += 1
+
+                try:
+                    branches = index.branches(branch, source.branches)
+                    for name in index.leaves(branch, source.leaves):
+                        index.item_id(branch, name, source.item_id)
+                    children = [branch + (b,) for b in branches]
+                    loaded = 1
+                except Exception:
+                    children = []
+                    loaded = 0
+
+                with lock:
+                    queue.extend(children)
+                    state['busy'] -= 1
+                    state['loaded'] += loaded
+                    stats['browse_prefetched'] += loaded
+                    stats['browse_prefetch_errors'] += 1 - loaded
+                    lock.notify_all()
+        finally:
+            if hasattr(source, 'close'): source.close()
+
+    def worker():
+        # A worker that cannot get a browser just leaves the work to the others
+        try:
+            run()
+        except Exception:
+            with lock:
+                stats['browse_worker_errors'] += 1
+        finally:
+            with lock:
+                state['done'] += 1
+            wait.notify()
+
+    threads = [threading.Thread(target=worker, name='OpenOPC.Browse', daemon=True) for i in range(max(1, workers))]
+    for t in threads: t.start()
+    wait.wait(lambda: state['done'] == len(threads), None)
+    for t in threads: t.join()
+    return state['loaded']
+
+def _literal_root(path):
+    root = ()
+    for p in path_parts(path):
+        if p.find('*') >= 0 or p.find('?') >= 0: break
+        root += (p,)
+    return root
+
+def ibrowse(index, source, paths, recursive=False, flat=False, include_type=False, workers=1, make_source=None, wait=None):
+    """Yield the nodes at path(s) like ClientTools.ilist(), reading listings from source through index
+
+    'source' provides branches(branch), leaves(branch), item_id(branch, name)
+    and flat(), where branch is a tuple of branch names from the root.  For a
+    recursive browse with workers > 1, the branches below each path are
+    first loaded in parallel through sources from make_source() (see
+    prefetch), and then walked from the index in the usual order."""
+
+    nodes = {}
+
+    if recursive and not flat and workers > 1 and make_source:
+        prefetch(index, make_source, [_literal_root(p) for p in paths], workers, index.stats, wait)
+
+    if flat:
+        # One pass over the flat listing for all paths, each item reported under the first path it matches
+        for matches in compile_glob(paths).classify(index.flat(source.flat)):
+            if include_type:  matches = [(x, 'Leaf') for x in matches]
+            for node in matches: yield node
+        return
+
+    for path in paths:
+
+        queue = deque([path])
+
+        while len(queue) > 0:
+            tag = queue.popleft()
+
+            branch = ()
+            pattern = None
+
+            path_str = '/'
+            path_list = path_parts(tag)
+            found_filter = False
+            path_postfix = '/'
+
+            for i, p in enumerate(path_list):
+                if found_filter:
+                    path_postfix += p + '/'
+                elif p.find('*') >= 0:
+                    pattern = compile_glob(p)
+                    found_filter = True
+                elif len(p) != 0:
+                    pattern = compile_glob('*')
+                    branches = index.branches(branch, source.branches)
+
+                    # Branch node, so move down
+                    if len(branches) > 0:
+                        if p in branches:
+                            branch += (p,)
+                            path_str += p + '/'
+                        else:
+                            if i < len(path_list)-1: return
+                            pattern = compile_glob(p)
+
+                    # Leaf node, so append all remaining path parts together
+                    # to form a single search expression
+                    else:
+                        p = '.'.join(path_list[i:])
+                        pattern = compile_glob(p)
+                        break
+
+            branches = index.branches(branch, source.branches)
+            node_types = ['Branch','Leaf']
+
+            if len(branches) == 0:
+                node_types.pop(0)
+
+            for node_type in node_types:
+                if node_type=='Leaf':
+                    matches = filter(pattern, index.leaves(branch, source.leaves))
+                else:
+                    matches = filter(pattern, branches)
+
+                if node_type=='Branch' and recursive:
+                    queue += [path_str + x + path_postfix for x in matches]
+                else:
+                    if node_type=='Leaf':  matches = [exceptional(lambda x: index.item_id(branch, x, source.item_id), x)(x) for x in matches]
+                    if include_type:  matches = [(x, node_type) for x in matches]
+                    for node in matches:
+                        if not node in nodes: yield node
+                        nodes[node] = True
+
+SNAPSHOT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS branches (path TEXT PRIMARY KEY, parent TEXT, name TEXT NOT NULL, pos INTEGER NOT NULL, browsed REAL);
+CREATE INDEX IF NOT EXISTS branches_parent ON branches (parent, pos);
+CREATE TABLE IF NOT EXISTS items (branch TEXT NOT NULL, name TEXT NOT NULL, pos INTEGER NOT NULL, item_id TEXT NOT NULL, datatype TEXT, access TEXT, PRIMARY KEY (branch, name));
+CREATE INDEX IF NOT EXISTS items_branch ON items (branch, pos);
+CREATE INDEX IF NOT EXISTS items_id ON items (item_id);
+INSERT OR IGNORE INTO branches (path, parent, name, pos) VALUES ('', NULL, '', 0);
+"""
+
+def _key(branch):
+    return '/'.join(branch)
+
+def _subtree(key):
+    # Rows strictly below key: '0' is the character after '/'
+    return key + '/', key + '0'
+
+class NamespaceSnapshot():
+    """Address space saved to an SQLite file
+
+    save() walks a browse source (a connected ClientTools browser) and stores
+    every branch and leaf with its item ID, and optionally the datatype and
+    access rights.  Saving over an existing snapshot still lists every branch
+    it walks, but only looks up item IDs and properties for leaves that were
+    not there before and drops the ones that are gone; given a 'max_age' it
+    skips listing branches saved less than that many seconds ago.  list()/ilist() answer from the file without a server,
+    and with 'readonly' set the file must already exist and is never
+    written to."""
+
+    def __init__(self, filename, readonly=False):
+        self.filename = filename
+
+        if not readonly:
+            self._db = sqlite3.connect(filename, check_same_thread=False)
+            self._db.executescript(SNAPSHOT_SCHEMA)
+            return
+
+        if not os.path.isfile(filename):
+            raise OPCError('NamespaceSnapshot: Snapshot file %s does not exist' % filename)
+
+        try:
+            uri = 'file:%s?mode=ro' % pathname2url(os.path.abspath(filename))
+            self._db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            tables = set(r[0] for r in self._db.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+        except sqlite3.Error as err:
+            raise OPCError('NamespaceSnapshot: Cannot open %s (%s)' % (filename, err))
+
+        if not tables.issuperset(('branches', 'items')):
+            self._db.close()
+            raise OPCError('NamespaceSnapshot: %s is not a namespace snapshot' % filename)
+
+    def close(self):
+        self._db.close()
+
+    # Browse source interface (see ibrowse)
+
+    def branches(self, branch):
+        rows = self._db.execute('SELECT name FROM branches WHERE parent = ? ORDER BY pos', (_key(branch),))
+        return [r[0] for r in rows]
+
+    def leaves(self, branch):
+        rows = self._db.execute('SELECT name FROM items WHERE branch = ? ORDER BY pos', (_key(branch),))
+        return [r[0] for r in rows]
+
+    def item_id(self, branch, name):
+        row = self._db.execute('SELECT item_id FROM items WHERE branch = ? AND name = ?', (_key(branch), name)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def flat(self):
+        rows = self._db.execute('SELECT item_id FROM items ORDER BY branch, pos')
+        return [r[0] for r in rows]
+
+    def ilist(self, paths='*', recursive=False, flat=False, include_type=False):
+        """Iterable version of list()"""
+
+        if isinstance(paths, str): paths = [paths]
+        if len(paths) == 0: paths = ['*']
+        return ibrowse(BrowseIndex(ttl=None), self, paths, recursive, flat, include_type)
+
+    def list(self, paths='*', recursive=False, flat=False, include_type=False):
+        """Return list of item nodes at specified path(s), like client.list()"""
+        return list(self.ilist(paths, recursive, flat, include_type))
+
+    def properties(self, tags):
+        """Return (item ID, datatype, access rights) for the saved items among tags"""
+
+        if isinstance(tags, str): tags = [tags]
+        result = []
+        for tag in tags:
+            row = self._db.execute('SELECT item_id, datatype, access FROM items WHERE item_id = ?', (tag,)).fetchone()
+            if row is not None: result.append(row)
+        return result
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    # Saving
+
+    def save(self, source, paths=None, properties=None, max_age=None):
+        """Browse source recursively from the branch path(s) and store the result
+
+        'properties' is an optional callable taking a list of item IDs and
+        returning a (datatype, access rights) pair for each of them.  A branch
+        browsed less than 'max_age' seconds ago is not listed again; the walk
+        goes on into its saved sub-branches.  Returns a dictionary counting
+        the branches browsed and skipped and the items added and removed."""
+
+        if paths is None or isinstance(paths, str): paths = [paths or '']
+        summary = {'branches': 0, 'skipped': 0, 'added': 0, 'removed': 0}
+        recent = time.time() - max_age if max_age is not None else None
+
+        with self._db:
+            queue = deque()
+            for path in paths:
+                branch = path_parts(path)
+                self._add_parents(branch)
+                queue.append(branch)
+
+            while len(queue) > 0:
+                branch = queue.popleft()
+
+                if recent is not None and self._browsed(branch) >= recent:
+                    summary['skipped'] += 1
+                    queue.extend(branch + (b,) for b in self.branches(branch))
+                    continue
+
+                branches = list(source.branches(branch))
+                leaves = list(source.leaves(branch))
+
+                summary['removed'] += self._store_branches(branch, branches)
+                added, removed = self._store_leaves(source, branch, leaves, properties)
+                summary['added'] += added
+                summary['removed'] += removed
+                summary['branches'] += 1
+
+                queue.extend(branch + (b,) for b in branches)
+
+        return summary
+
+    def _browsed(self, branch):
+        """Return when branch was last listed, 0 if it never was"""
+        row = self._db.execute('SELECT browsed FROM branches WHERE path = ?', (_key(branch),)).fetchone()
+        return row[0] if row is not None and row[0] is not None else 0
+
+    def _add_parents(self, branch):
+        for i in range(len(branch)):
+            self._db.execute('INSERT OR IGNORE INTO branches (path, parent, name, pos) VALUES (?, ?, ?, 0)',
+                             (_key(branch[:i+1]), _key(branch[:i]), branch[i]))
+
+    def _store_branches(self, branch, names):
+        key = _key(branch)
+        known = [r[0] for r in self._db.execute('SELECT name FROM branches WHERE parent = ?', (key,))]
+
+        # Drop branches that are gone along with everything below them
+        removed = 0
+        wanted = set(names)
+        for name in known:
+            if name not in wanted:
+                path = _key(branch + (name,))
+                low, high = _subtree(path)
+                self._db.execute('DELETE FROM branches WHERE path = ? OR (path >= ? AND path < ?)', (path, low, high))
+                removed += self._db.execute('DELETE FROM items WHERE branch = ? OR (branch >= ? AND branch < ?)', (path, low, high)).rowcount
+
+        rows = [(_key(branch + (name,)), key, name, pos) for pos, name in enumerate(names)]
+        self._db.executemany('INSERT OR IGNORE INTO branches (path, parent, name, pos) VALUES (?, ?, ?, ?)', rows)
+        self._db.executemany('UPDATE branches SET pos = ? WHERE path = ?', [(pos, path) for path, parent, name, pos in rows])
+        self._db.execute('UPDATE branches SET browsed = ? WHERE path = ?', (time.time(), key))
+        return removed
+
+    def _store_leaves(self, source, branch, names, properties):
+        key = _key(branch)
+        known = set(r[0] for r in self._db.execute('SELECT name FROM items WHERE branch = ?', (key,)))
+
+        wanted = set(names)
+        gone = [(key, name) for name in known if name not in wanted]
+        self._db.executemany('DELETE FROM items WHERE branch = ? AND name = ?', gone)
+
+        # Only new leaves cost server round trips
+        new = [name for name in names if name not in known]
+        item_ids = [exceptional(source.item_id, name)(branch, name) for name in new]
+        props = properties(item_ids) if properties and len(item_ids) > 0 else [(None, None)] * len(item_ids)
+        self._db.executemany('INSERT INTO items (branch, name, pos, item_id, datatype, access) VALUES (?, ?, 0, ?, ?, ?)',
+                             [(key, name, item_id, p[0], p[1]) for name, item_id, p in zip(new, item_ids, props)])
+
+        self._db.executemany('UPDATE items SET pos = ? WHERE branch = ? AND name = ?',
+                             [(pos, key, name) for pos, name in enumerate(names)])
+        return len(new), len(gone)
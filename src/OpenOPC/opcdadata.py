@@ -0,0 +1,325 @@
+###########################################################################
+#
+# OpenOPC for Python OPC-DA Data Library file
+#
+# Containers for read results and the client-side value and item property
+# caches.  NumPy is used when it is installed, otherwise the standard array
+# module.
+#
+# Copyright (c) 2007-2012 Barry Barnreiter (barry_b@users.sourceforge.net)
+# Copyright (c) 2014 Anton D. Kachalov (mouse@yandex.ru)
+# Copyright (c) 2017 José A. Maita (jose.a.maita@gmail.com)
+# Copyright (c) 2022 j3mg
+#
+###########################################################################
+import array
+import threading
+import time
+from collections import OrderedDict
+from OpenOPC.common import epoch2time, quality_str
+
+try:
+    import numpy
+except ImportError:
+    numpy_found = False
+else:
+    numpy_found = True
+
+def _values_array(values):
+    if numpy_found:
+        if all(type(v) == int for v in values):
+            return numpy.array(values, dtype=numpy.int64)
+        if all(type(v) in (int, float) for v in values):
+            return numpy.array(values, dtype=numpy.float64)
+        return numpy.array(values, dtype=object)
+    return list(values)
+
+def _quality_array(qualities):
+    if numpy_found:
+        return numpy.array(qualities, dtype=numpy.uint16)
+    return array.array('H', qualities)
+
+def _time_array(timestamps):
+    if numpy_found:
+        return numpy.array(timestamps, dtype=numpy.float64)
+    return array.array('d', timestamps)
+
+def _ok_array(ok):
+    if numpy_found:
+        return numpy.array(ok, dtype=bool)
+    return array.array('B', ok)
+
+def _tolist(a):
+    return a.tolist() if hasattr(a, 'tolist') else list(a)
+
+class ReadBatch():
+    """Columnar read result
+
+    Holds the tag names plus parallel arrays of values, raw 16-bit OPC quality
+    words and timestamps in seconds since the Unix epoch.  'ok' flags the tags
+    that were read successfully; failed tags have a value of None, a quality
+    of 0 (Bad) and a NaN timestamp."""
+
+    def __init__(self, tags, values, qualities, timestamps, ok, errors=None):
+        self.tags = list(tags)
+        self.values = _values_array(values)
+        self.qualities = _quality_array(qualities)
+        self.timestamps = _time_array(timestamps)
+        self.ok = _ok_array(ok)
+        self.errors = errors
+        self._index = None
+
+    def __len__(self):
+        return len(self.tags)
+
+    @property
+    def index(self):
+        """Dictionary of tag name -> position in the arrays"""
+        if self._index is None:
+            self._index = dict((t, i) for i, t in enumerate(self.tags))
+        return self._index
+
+    @classmethod
+    def concat(cls, batches):
+        """Join the batches of several sub-groups into one batch"""
+
+        if len(batches) == 1:
+            return batches[0]
+
+        tags, values, qualities, timestamps, ok, errors = [], [], [], [], [], []
+
+        for b in batches:
+            tags += b.tags
+            values += _tolist(b.values)
+            qualities += _tolist(b.qualities)
+            timestamps += _tolist(b.timestamps)
+            ok += _tolist(b.ok)
+            if b.errors is not None: errors += b.errors
+
+        return cls(tags, values, qualities, timestamps, ok, errors if len(errors) > 0 else None)
+
+    def to_tuples(self):
+        """Return the legacy list of (tag, value, quality, time) tuples"""
+
+        results = []
+
+        for i, tag in enumerate(self.tags):
+            if self.ok[i]:
+                value = self.values[i]
+                if numpy_found and isinstance(value, numpy.generic):
+                    value = value.item()
+                quality = quality_str(int(self.qualities[i]))
+                # str() of the server's timestamp, as in the tuples returned by read()
+                timestamp = str(epoch2time(float(self.timestamps[i])))
+            else:
+                value = None
+                quality = 'Error'
+                timestamp = None
+
+            if self.errors is not None:
+                results.append((tag, value, quality, timestamp, self.errors[i]))
+            else:
+                results.append((tag, value, quality, timestamp))
+
+        return results
+
+class ValueCache():
+    """Last value, quality and timestamp received for each tag, as delivered by the server
+
+    Entries are filled by reads and subscription updates and are handed
+    back by fresh() while younger than the requested age.  'used' is set by
+    the first fresh(), so a client can skip filling the cache until it is
+    asked for cached values.  At most 'max_items' tags are kept, dropping
+    the least recently updated."""
+
+    def __init__(self, max_items=100000, stats=None):
+        self.max_items = max_items
+        self.used = False   # set by the first fresh()
+        self.stats = stats if stats is not None else {}
+        for key in ('cache_hits', 'cache_misses', 'cache_evictions'):
+            self.stats.setdefault(key, 0)
+
+        self._lock = threading.Lock()
+        self._samples = OrderedDict()   # tag -> (value, quality, timestamp, time received)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def update(self, samples, received=None):
+        """Store (tag, value, quality, timestamp) samples received at time 'received' (now by default)"""
+
+        if not self.max_items:
+            return
+
+        if received is None: received = time.time()
+
+        with self._lock:
+            for tag, value, quality, timestamp in samples:
+                if tag in self._samples:
+                    del(self._samples[tag])
+                self._samples[tag] = (value, quality, timestamp, received)
+
+            while len(self._samples) > self.max_items:
+                self._samples.popitem(last=False)
+                self.stats['cache_evictions'] += 1
+
+    def fresh(self, tags, max_age):
+        """Return a dict of tag -> (value, quality, timestamp) for the tags received within the last 'max_age' milliseconds"""
+
+        self.used = True
+        oldest = time.time() - max_age / 1000.0
+        fresh = {}
+
+        with self._lock:
+            for tag in tags:
+                sample = self._samples.get(tag)
+                if sample is not None and sample[3] >= oldest:
+                    fresh[tag] = sample[:3]
+
+        self.stats['cache_hits'] += len(fresh)
+        self.stats['cache_misses'] += len(tags) - len(fresh)
+        return fresh
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+# Item properties read from the server on every call (value, quality, timestamp)
+DYNAMIC_PROPERTIES = (2, 3, 4)
+
+# Item properties kept for the whole connection (canonical datatype)
+STATIC_PROPERTIES = (1,)
+
+class PropertyCache():
+    """Item property values by item ID and property ID for one server connection
+
+    The available properties of an item and the values of its properties are
+    kept for 'ttl' seconds (None keeps them until invalidated, 0 disables the
+    cache).  Static properties stay until the cache is invalidated or cleared,
+    and dynamic ones are never kept."""
+
+    def __init__(self, ttl=300, stats=None):
+        self.ttl = ttl
+        self.stats = stats if stats is not None else {}
+        for key in ('prop_hits', 'prop_misses'):
+            self.stats.setdefault(key, 0)
+
+        self._lock = threading.Lock()
+        self._values = {}      # item ID -> {property ID: (value, time stored)}
+        self._available = {}   # item ID -> (property IDs, descriptions, time stored)
+
+    def __len__(self):
+        return len(self._values)
+
+    def _fresh(self, property_id, stored):
+        if property_id in STATIC_PROPERTIES or self.ttl is None:
+            return True
+        return time.monotonic() - stored <= self.ttl
+
+    def get(self, item_id, property_ids):
+        """Return a dict of property ID -> value for the cached properties of item_id among property_ids"""
+
+        found = {}
+        if self.ttl != 0:
+            with self._lock:
+                values = self._values.get(item_id, {})
+                for p in property_ids:
+                    entry = values.get(p)
+                    if entry is not None and self._fresh(p, entry[1]):
+                        found[p] = entry[0]
+
+        self.stats['prop_hits'] += len(found)
+        self.stats['prop_misses'] += len(property_ids) - len(found)
+        return found
+
+    def update(self, item_id, properties):
+        """Store (property ID, value) pairs read for item_id"""
+
+        if self.ttl == 0:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            values = self._values.setdefault(item_id, {})
+            for p, value in properties:
+                if p not in DYNAMIC_PROPERTIES:
+                    values[p] = (value, now)
+
+    def available(self, item_id):
+        """Return the cached (property IDs, descriptions) available for item_id, or None"""
+
+        entry = self._available.get(item_id) if self.ttl != 0 else None
+        if entry is None or not self._fresh(None, entry[2]):
+            self.stats['prop_misses'] += 1
+            return None
+
+        self.stats['prop_hits'] += 1
+        return list(entry[0]), list(entry[1])
+
+    def set_available(self, item_id, property_ids, descriptions):
+        if self.ttl != 0:
+            self._available[item_id] = (list(property_ids), list(descriptions), time.monotonic())
+
+    def invalidate(self, item_ids=None):
+        """Forget everything cached for item_ids (all items if None)"""
+
+        if item_ids is None:
+            self.clear()
+            return
+
+        with self._lock:
+            for item_id in item_ids:
+                self._values.pop(item_id, None)
+                self._available.pop(item_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._available.clear()
+
+class ChangeFilter():
+    """Value and quality last reported for each tag, used to pass on only the tags that changed
+
+    A tag counts as changed when its quality differs or its value moved by
+    more than the deadband since it was last reported.  'deadband' is an
+    absolute amount and 'percent' a percentage of the last reported value;
+    either may be one number for all tags or a dict of tag -> amount.
+    Deadbands only apply to numeric values, other values change on any
+    difference."""
+
+    def __init__(self):
+        self._last = {}     # tag -> (value, quality) last reported
+
+    def __len__(self):
+        return len(self._last)
+
+    def changed(self, tag, value, quality, deadband=None, percent=None):
+        """Return True (and remember the new value) if the tag changed since it was last reported"""
+
+        last = self._last.get(tag)
+
+        if last is None or last[1] != quality:
+            changed = True
+        elif type(value) in (int, float) and type(last[0]) in (int, float):
+            band = 0
+            if type(deadband) == dict: deadband = deadband.get(tag)
+            if type(percent) == dict: percent = percent.get(tag)
+            if deadband: band = deadband
+            if percent: band = max(band, abs(last[0]) * percent / 100.0)
+            changed = abs(value - last[0]) > band if band else value != last[0]
+        else:
+            changed = value != last[0]
+
+        if changed:
+            self._last[tag] = (value, quality)
+        return changed
+
+    def filter(self, results, deadband=None, percent=None):
+        """Yield the (tag, value, quality, ...) read results whose tag changed"""
+
+        for result in results:
+            if self.changed(result[0], result[1], result[2], deadband, percent):
+                yield result
+
+    def clear(self):
+        self._last.clear()
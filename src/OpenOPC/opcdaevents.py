@@ -0,0 +1,386 @@
+###########################################################################
+#
+# OpenOPC for Python OPC-DA Events Library file
+#
+# OPC group event handlers and the completion of async transactions.
+# The wait strategy is pluggable so the completion logic can be used
+# without COM (e.g. under test with a fake group).
+#
+# Copyright (c) 2007-2012 Barry Barnreiter (barry_b@users.sourceforge.net)
+# Copyright (c) 2014 Anton D. Kachalov (mouse@yandex.ru)
+# Copyright (c) 2017 José A. Maita (jose.a.maita@gmail.com)
+# Copyright (c) 2022 j3mg
+#
+###########################################################################
+import threading
+import time
+from collections import OrderedDict, deque
+from OpenOPC.common import OPCError, TimeoutError
+
+try:
+    import pythoncom # Only used by MessageWait
+    import win32event
+except:
+    pass
+
+current_client = None
+
+class GroupEvents:
+    def __init__(self):
+        self.client = current_client
+        self.group_name = None  # set by the client once the events are hooked up
+
+    def OnDataChange(self, TransactionID, NumItems, ClientHandles, ItemValues, Qualities, TimeStamps):
+        callback = (TransactionID, ClientHandles, ItemValues, Qualities, TimeStamps)
+        if self.client.transactions.complete(TransactionID, callback):
+            return
+
+        subscription = self.client.subscriptions.get(self.group_name)
+        if subscription:
+            subscription.put(callback)
+        elif self.group_name in self.client.update_buffers:
+            self.client.update_buffers[self.group_name].put(callback)
+
+    def OnAsyncReadComplete(self, TransactionID, NumItems, ClientHandles, ItemValues, Qualities, TimeStamps, Errors):
+        self.client.transactions.complete(TransactionID, (TransactionID, ClientHandles, ItemValues, Qualities, TimeStamps, Errors))
+
+    def OnAsyncWriteComplete(self, TransactionID, NumItems, ClientHandles, Errors):
+        self.client.transactions.complete(TransactionID, (TransactionID, ClientHandles, Errors))
+
+class ThreadWait():
+    """Block on a condition variable until a callback is delivered by another thread"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+
+    def notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, predicate, timeout):
+        """Wait up to 'timeout' seconds (None for no limit) for predicate() to become true"""
+        with self._cond:
+            return self._cond.wait_for(predicate, timeout)
+
+class MessageWait():
+    """Block in MsgWaitForMultipleObjects and pump COM messages as they arrive
+
+    Callbacks to a single-threaded apartment are only delivered while the
+    waiting thread pumps messages, so this waits without spinning the CPU
+    yet still lets the callbacks run.  Each waiting thread gets its own
+    event so several threads can wait at once."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = set()
+        self._local = threading.local()
+
+    def notify(self):
+        with self._lock:
+            for event in self._events: win32event.SetEvent(event)
+
+    def wait(self, predicate, timeout):
+        """Wait up to 'timeout' seconds (None for no limit) for predicate() to become true"""
+
+        event = getattr(self._local, 'event', None)
+        if event is None:
+            event = self._local.event = win32event.CreateEvent(None, 0, 0, None)
+
+        with self._lock:
+            self._events.add(event)
+
+        try:
+            deadline = time.time() + timeout if timeout is not None else None
+            pythoncom.PumpWaitingMessages()
+
+            while not predicate():
+                if deadline is None:
+                    wait_msec = win32event.INFINITE
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    wait_msec = int(remaining * 1000) + 1
+                win32event.MsgWaitForMultipleObjects([event], 0, wait_msec, win32event.QS_ALLINPUT)
+                pythoncom.PumpWaitingMessages()
+
+            return True
+
+        finally:
+            with self._lock:
+                self._events.discard(event)
+
+class Transactions():
+    """Table of outstanding async transactions keyed by transaction id
+
+    Any number of transactions may be in flight, each completed by its own
+    callback.  Transactions past their deadline are expired, and callbacks
+    arriving for them afterwards are counted as late rather than being
+    mistaken for subscription updates."""
+
+    MAX_TX_ID = 0xFFFF
+    MAX_EXPIRED = 1024
+
+    def __init__(self, wait=None, timeout=5000):
+        self.wait = wait if wait else ThreadWait()
+        self.timeout = timeout
+        self.stats = {'transactions': 0, 'expired': 0, 'late_callbacks': 0}
+        self._lock = threading.Lock()
+        self._tx_id = 0
+        self._pending = {}      # tx id -> deadline
+        self._results = {}      # tx id -> (deadline, result)
+        self._expired = OrderedDict()
+
+    def _in_use(self, tx_id):
+        return tx_id in self._pending or tx_id in self._results or tx_id in self._expired
+
+    def _expire(self, tx_id):
+        self._pending.pop(tx_id, None)
+        self._results.pop(tx_id, None)
+        self._expired[tx_id] = True
+        if len(self._expired) > self.MAX_EXPIRED:
+            self._expired.popitem(last=False)
+
+    def begin(self, timeout=None):
+        """Allocate and register a transaction id before the request is sent so an early callback is not missed"""
+
+        if timeout is None: timeout = self.timeout
+        deadline = time.time() + timeout / 1000.0
+
+        with self._lock:
+            self._purge()
+
+            if len(self._pending) + len(self._results) + len(self._expired) >= self.MAX_TX_ID:
+                raise OPCError('Transactions: Too many transactions in progress')
+
+            # Transaction id 0 is used by the server for subscription updates
+            while True:
+                self._tx_id = self._tx_id % self.MAX_TX_ID + 1
+                if not self._in_use(self._tx_id): break
+
+            self._pending[self._tx_id] = deadline
+            self.stats['transactions'] += 1
+            return self._tx_id
+
+    def complete(self, tx_id, result):
+        """Store the result of a transaction, returning False if it is not one of ours"""
+
+        with self._lock:
+            if tx_id in self._pending:
+                self._results[tx_id] = (self._pending.pop(tx_id), result)
+            elif tx_id in self._expired:
+                self.stats['late_callbacks'] += 1
+                return True
+            else:
+                return False
+
+        self.wait.notify()
+        return True
+
+    def cancel(self, tx_id):
+        """Forget a transaction; a callback arriving for it later is counted as late"""
+
+        with self._lock:
+            if tx_id in self._pending or tx_id in self._results:
+                self._expire(tx_id)
+
+    def pending(self):
+        """Return the number of transactions still waiting for their callback"""
+        with self._lock:
+            return len(self._pending)
+
+    def purge(self):
+        """Expire transactions past their deadline, including results that were never collected"""
+        with self._lock:
+            return self._purge()
+
+    def _purge(self):
+        now = time.time()
+        expired = [tx_id for tx_id, deadline in self._pending.items() if deadline < now]
+        expired += [tx_id for tx_id, (deadline, result) in self._results.items() if deadline < now]
+
+        for tx_id in expired:
+            self._expire(tx_id)
+
+        self.stats['expired'] += len(expired)
+        return len(expired)
+
+    def result(self, tx_id, timeout=None):
+        """Block until the transaction completes, or raise TimeoutError after its deadline (or 'timeout' milliseconds)"""
+
+        with self._lock:
+            if tx_id in self._results:
+                return self._results.pop(tx_id)[1]
+            if tx_id not in self._pending:
+                raise OPCError('Transactions: Unknown transaction %d' % tx_id)
+            deadline = self._pending[tx_id]
+
+        if timeout is not None:
+            deadline = min(deadline, time.time() + timeout / 1000.0)
+
+        if not self.wait.wait(lambda: tx_id in self._results, max(deadline - time.time(), 0)):
+            with self._lock:
+                if tx_id in self._results:
+                    return self._results.pop(tx_id)[1]
+                if tx_id in self._pending:
+                    self._expire(tx_id)
+                    self.stats['expired'] += 1
+            raise TimeoutError('Callback: Timeout waiting for data')
+
+        with self._lock:
+            return self._results.pop(tx_id)[1]
+
+class UpdateBuffer():
+    """Bounded buffer of data change callbacks for one group
+
+    The overflow 'policy' is one of:
+        coalesce     keep only the latest value, quality and time per client handle
+        drop_oldest  keep the latest 'maxlen' callbacks, dropping the oldest
+        block        make the producer wait up to 'timeout' milliseconds for room,
+                     then drop the update (only useful when callbacks are
+                     delivered on a different thread than the consumer)"""
+
+    POLICIES = ('coalesce', 'drop_oldest', 'block')
+
+    def __init__(self, maxlen=1000, policy='coalesce', timeout=1000, stats=None):
+        if policy not in self.POLICIES:
+            raise ValueError("UpdateBuffer(): 'policy' must be one of %s" % ', '.join(self.POLICIES))
+
+        self.maxlen = maxlen
+        self.policy = policy
+        self.timeout = timeout
+        self.stats = stats if stats is not None else {}
+        for key in ('updates', 'updates_dropped', 'updates_coalesced'):
+            self.stats.setdefault(key, 0)
+
+        self._cond = threading.Condition()
+        self._callbacks = deque()
+        self._latest = OrderedDict()    # client handle -> (value, quality, timestamp)
+
+    def __len__(self):
+        if self.policy == 'coalesce':
+            return len(self._latest)
+        else:
+            return len(self._callbacks)
+
+    def put(self, callback):
+        """Buffer the arguments of a data change callback, returning False if the update was dropped"""
+
+        tx_id, handles, values, qualities, timestamps = callback
+
+        with self._cond:
+            self.stats['updates'] += 1
+
+            if self.policy == 'coalesce':
+                for i, h in enumerate(handles):
+                    if h in self._latest:
+                        del(self._latest[h])
+                        self.stats['updates_coalesced'] += 1
+                    self._latest[h] = (values[i], qualities[i], timestamps[i])
+
+                    if len(self._latest) > self.maxlen:
+                        self._latest.popitem(last=False)
+                        self.stats['updates_dropped'] += 1
+            else:
+                if self.policy == 'block' and len(self._callbacks) >= self.maxlen:
+                    if not self._cond.wait_for(lambda: len(self._callbacks) < self.maxlen, self.timeout / 1000.0):
+                        self.stats['updates_dropped'] += 1
+                        return False
+
+                if len(self._callbacks) >= self.maxlen:
+                    self._callbacks.popleft()
+                    self.stats['updates_dropped'] += 1
+                self._callbacks.append(callback)
+
+        return True
+
+    def get(self):
+        """Remove and return the oldest buffered callback (all coalesced values as one callback), or None"""
+
+        with self._cond:
+            if self.policy == 'coalesce':
+                if len(self._latest) == 0:
+                    return None
+                handles = list(self._latest)
+                values, qualities, timestamps = zip(*self._latest.values())
+                self._latest.clear()
+                callback = (0, handles, list(values), list(qualities), list(timestamps))
+            else:
+                if len(self._callbacks) == 0:
+                    return None
+                callback = self._callbacks.popleft()
+
+            self._cond.notify_all()
+            return callback
+
+    def clear(self):
+        with self._cond:
+            self._callbacks.clear()
+            self._latest.clear()
+            self._cond.notify_all()
+
+class Subscription():
+    """Handle for a subscribed group that streams its OnDataChange updates
+
+    Each update arrives as a batch list of (tag, value, quality, time) tuples.
+    Batches are passed to 'callback' if one was given, otherwise they are
+    held in an UpdateBuffer and returned by get() or by iterating over the
+    subscription.  Every update is also passed to 'on_update' as it arrives.
+    COM only delivers the updates while the subscribing thread waits in
+    get(), poll() or the iterator (or otherwise pumps messages)."""
+
+    def __init__(self, group, convert, wait=None, callback=None, remove=None, buffer=None, on_update=None):
+        self.group = group
+        self.callback = callback
+        self.wait = wait if wait else ThreadWait()
+        self.buffer = buffer if buffer is not None else UpdateBuffer()
+        self.closed = False
+        self._convert = convert
+        self._remove = remove
+        self._on_update = on_update
+
+    def put(self, callback):
+        """Deliver the raw arguments of an OnDataChange callback"""
+
+        if self._on_update:
+            self._on_update(callback)
+
+        if self.callback:
+            self.callback(self._convert(*callback))
+        elif self.buffer.put(callback):
+            self.wait.notify()
+
+    def get(self, timeout=None):
+        """Return the next batch, or None if 'timeout' milliseconds pass or the subscription is closed"""
+
+        self.wait.wait(lambda: len(self.buffer) > 0 or self.closed, timeout / 1000.0 if timeout is not None else None)
+
+        callback = self.buffer.get()
+        if callback is None:
+            return None
+        return self._convert(*callback)
+
+    def poll(self, timeout=0):
+        """Wait 'timeout' milliseconds while dispatching updates to the callback"""
+        self.wait.wait(lambda: self.closed, timeout / 1000.0)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        batch = self.get()
+        if batch is None:
+            raise StopIteration
+        return batch
+
+    def detach(self):
+        """Mark the subscription closed without removing its group"""
+        self.closed = True
+        self.wait.notify()
+
+    def close(self):
+        """Stop the subscription and remove its group from the server"""
+
+        if self.closed: return
+        self.detach()
+        if self._remove: self._remove()
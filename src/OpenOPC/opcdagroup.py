@@ -0,0 +1,227 @@
+###########################################################################
+#
+# OpenOPC for Python OPC-DA Group Library file
+#
+# Item and handle bookkeeping for OPC groups.  This file makes no direct
+# COM calls so the OPCItems object can be replaced by a fake for testing.
+#
+# Copyright (c) 2007-2012 Barry Barnreiter (barry_b@users.sourceforge.net)
+# Copyright (c) 2014 Anton D. Kachalov (mouse@yandex.ru)
+# Copyright (c) 2017 José A. Maita (jose.a.maita@gmail.com)
+# Copyright (c) 2022 j3mg
+#
+###########################################################################
+import threading
+import time
+from collections import OrderedDict
+from OpenOPC.common import tags2trace
+
+class GroupItems():
+    """Tags, client handles and server handles belonging to a single OPC group"""
+
+    def __init__(self):
+        self.tags = []              # tags as last requested by the caller
+        self.valid_tags = {}        # tag -> client handle (in the order the items were added)
+        self.handles_tag = {}       # client handle -> tag
+        self.server_handles = {}    # tag -> server handle
+        self._next_handle = 0
+        self._free_handles = []
+        self._handle_array = None
+
+    def handle_array(self):
+        """Return the valid tags and their server handles as two ordered lists (cached until the items change)"""
+
+        if self._handle_array is None:
+            valid_tags = list(self.valid_tags)
+            self._handle_array = (valid_tags, [self.server_handles[t] for t in valid_tags])
+        return self._handle_array
+
+    def alloc_handle(self):
+        """Return an unused client handle, reusing freed handles first"""
+
+        if len(self._free_handles) > 0:
+            return self._free_handles.pop()
+
+        n = self._next_handle
+        self._next_handle += 1
+        return n
+
+    def free_handle(self, handle):
+        """Return a client handle to the pool of reusable handles"""
+
+        del(self.handles_tag[handle])
+        self._free_handles.append(handle)
+
+    def add_items(self, opc_items, tags, error_msgs=None, error_str=None, trace=None):
+        """Validate and add tags to the group, returning lists of the added tags and their server handles"""
+
+        tags = [t for t in dict.fromkeys(tags) if t not in self.valid_tags]
+        names = list(tags)
+
+        names.insert(0,0)
+        errors = []
+
+        if trace: trace('Validate(%s)' % tags2trace(names))
+
+        try:
+            errors = opc_items.Validate(len(names)-1, names)
+        except:
+            pass
+
+        valid_tags = []
+        client_handles = []
+
+        for i, tag in enumerate(tags):
+            if errors[i] == 0:
+                valid_tags.append(tag)
+                client_handles.append(self.alloc_handle())
+            elif error_msgs is not None:
+                error_msgs[tag] = error_str(errors[i])
+
+            if trace and errors[i] != 0: trace('%s failed validation' % tag)
+
+        client_handles.insert(0,0)
+        valid_tags.insert(0,0)
+        server_handles = []
+        errors = []
+
+        if trace: trace('AddItems(%s)' % tags2trace(valid_tags))
+
+        try:
+            server_handles, errors = opc_items.AddItems(len(client_handles)-1, valid_tags, client_handles)
+        except:
+            pass
+
+        valid_tags_tmp = []
+        server_handles_tmp = []
+        valid_tags.pop(0)
+        client_handles.pop(0)
+        self._handle_array = None
+
+        for i, tag in enumerate(valid_tags):
+            if errors[i] == 0:
+                valid_tags_tmp.append(tag)
+                server_handles_tmp.append(server_handles[i])
+                self.valid_tags[tag] = client_handles[i]
+                self.handles_tag[client_handles[i]] = tag
+                self.server_handles[tag] = server_handles[i]
+            else:
+                self._free_handles.append(client_handles[i])
+                if error_msgs is not None:
+                    error_msgs[tag] = error_str(errors[i])
+
+        return valid_tags_tmp, server_handles_tmp
+
+    def remove_items(self, opc_items, tags, trace=None):
+        """Remove tags from the group and release their client handles (kept if the server call fails)"""
+
+        if trace: trace('RemoveItems(%s)' % tags2trace(['']+tags))
+        server_handles = [self.server_handles[tag] for tag in tags]
+        server_handles.insert(0,0)
+
+        # The items stay registered on the server until Remove succeeds
+        errors = opc_items.Remove(len(server_handles)-1, server_handles)
+        self._handle_array = None
+
+        for tag in tags:
+            self.free_handle(self.valid_tags.pop(tag))
+            del(self.server_handles[tag])
+
+        return errors
+
+    def rebuild(self, opc_items, tags, error_msgs=None, error_str=None, trace=None):
+        """Bring the group items in line with a new tag list by adding and removing only the differences"""
+
+        tag_set = set(tags)
+        add_tags = [t for t in tags if t not in self.valid_tags]
+        del_tags = [t for t in self.valid_tags if t not in tag_set]
+
+        # Remove first so the freed client handles are reused by the added items
+        if len(del_tags) > 0:
+            self.remove_items(opc_items, del_tags, trace)
+
+        if len(add_tags) > 0:
+            self.add_items(opc_items, add_tags, error_msgs, error_str, trace)
+
+        self.tags = tags
+        return add_tags, del_tags
+
+class ItemPool():
+    """Items kept on one hidden group and shared by anonymous reads (or writes)
+
+    Tags already in the pool are accessed straight through their server
+    handles, skipping Validate and AddItems.  Once the pool holds more than
+    'max_items' items, or items go unused for 'max_idle' seconds (None for
+    no limit), the least recently used ones are removed from the server.  The counters are named
+    after 'prefix' so several pools can share one stats dictionary.
+    Callers hold 'lock' while they use the pool and its group, since both
+    are shared by every thread reading (or writing) through the client."""
+
+    def __init__(self, max_items=10000, max_idle=600, stats=None, prefix='pool'):
+        self.max_items = max_items
+        self.max_idle = max_idle
+        self.group = None               # the hidden OPC group, created by the client on first use
+        self.items = GroupItems()
+        self.stats = stats if stats is not None else {}
+        self._hits = prefix + '_hits'
+        self._misses = prefix + '_misses'
+        self._evictions = prefix + '_evictions'
+        for key in (self._hits, self._misses, self._evictions):
+            self.stats.setdefault(key, 0)
+
+        self._last_used = OrderedDict()     # tag -> time of last use, least recently used first
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.items.valid_tags)
+
+    def acquire(self, opc_items, tags, error_msgs=None, error_str=None, trace=None):
+        """Return the valid tags and their server handles, adding to the pool only the tags not already in it"""
+
+        valid_tags = self.items.valid_tags
+        new_tags = [t for t in dict.fromkeys(tags) if t not in valid_tags]
+
+        self.stats[self._hits] += len(tags) - len(new_tags)
+        self.stats[self._misses] += len(new_tags)
+
+        if len(new_tags) > 0:
+            self.items.add_items(opc_items, new_tags, error_msgs, error_str, trace)
+
+        now = time.time()
+        tags = [t for t in dict.fromkeys(tags) if t in valid_tags]
+        for tag in tags:
+            self._last_used[tag] = now
+            self._last_used.move_to_end(tag)
+
+        return tags, [self.items.server_handles[t] for t in tags]
+
+    def evict(self, opc_items, keep=(), trace=None):
+        """Remove least recently used items beyond 'max_items' or unused past 'max_idle', except those in 'keep'"""
+
+        excess = len(self._last_used) - self.max_items
+        idle_before = time.time() - self.max_idle if self.max_idle else None
+
+        del_tags = []
+        for tag, last_used in self._last_used.items():
+            if excess <= 0 and (idle_before is None or last_used >= idle_before):
+                break
+            if tag in keep:
+                continue
+            del_tags.append(tag)
+            excess -= 1
+
+        if len(del_tags) > 0:
+            # Forget the tags only once the server has removed them, so a failed call is retried later
+            self.items.remove_items(opc_items, del_tags, trace)
+            for tag in del_tags:
+                del(self._last_used[tag])
+            self.stats[self._evictions] += len(del_tags)
+
+        return del_tags
+
+    def clear(self):
+        """Forget the pooled items, e.g. once the connection they belong to is gone"""
+
+        self.group = None
+        self.items = GroupItems()
+        self._last_used.clear()
@@ -12,361 +12,575 @@
 ###########################################################################
 import re
 import OpenOPC.systemhealth
+import OpenOPC.opcdaevents
 import win32com.client
 import win32com.server.util
 import win32event
 import pythoncom
 import pywintypes
 import time
-from multiprocessing import Queue
-from OpenOPC.common import get_error_str, quality_str, type_check, tags2trace, TimeoutError, OPCError, SOURCE_CACHE, SOURCE_DEVICE, OPC_QUALITY
-
-current_client = None
-
-class GroupEvents:
-    def __init__(self):
-        self.client = current_client
-
-    def OnDataChange(self, TransactionID, NumItems, ClientHandles, ItemValues, Qualities, TimeStamps):
-        self.client.callback_queue.put((TransactionID, ClientHandles, ItemValues, Qualities, TimeStamps))
+from OpenOPC.opcdaevents import GroupEvents, MessageWait, Subscription, Transactions, UpdateBuffer
+from OpenOPC.opcdagroup import GroupItems, ItemPool
+from OpenOPC.opcdasched import AdaptiveSizer, chunk_ranges
+from OpenOPC.opcdadata import ChangeFilter, ReadBatch, ValueCache
+from OpenOPC.common import ErrorStrings, get_error_str, quality_str, time2epoch, type_check, tags2trace, TimeoutError, OPCError, SOURCE_CACHE, SOURCE_DEVICE, OPC_QUALITY
 
 class ClientIO():
-    def __init__(self):
+    def __init__(self, wait=None):
         self.trace = None
 
-        self.callback_queue = Queue()
+        # Subscription updates of named groups are kept in bounded, per-group buffers
+        self.update_buffers = {}
+        self.buffer_size = 1000
+        self.buffer_policy = 'coalesce'
+        self.transactions = Transactions(wait if wait else MessageWait())
 
-        self._tx_id = 0
         # On reconnect we need to remove the old group names from OpenOPC's internal
         # cache since they are now invalid
         self._groups = {}
-        self._group_tags = {}
-        self._group_valid_tags = {}
-        self._group_server_handles = {}
-        self._group_handles_tag = {}
+        self._group_items = {}
         self._group_hooks = {}
+        self.subscriptions = {}
+        self._subscription_id = 0
         self.cpu = None
+        self.stats = {'com_calls_avoided': 0, 'updates': 0, 'updates_dropped': 0, 'updates_coalesced': 0}
+        self.error_strings = ErrorStrings(stats=self.stats)
+
+        # Anonymous reads and writes keep their items on hidden groups (max_items=0 gives each call its own group)
+        self.item_pool = ItemPool(stats=self.stats)
+        self.write_pool = ItemPool(stats=self.stats, prefix='write_pool')
+
+        # Last values received by reads and subscriptions, served to reads given a max_age
+        self.value_cache = ValueCache(stats=self.stats)
+        self._change_filters = {}   # group (None for anonymous reads) -> ChangeFilter of read_changed()
+
+        # Transaction sizes and pauses learnt by size='auto', kept for the life of the connection
+        self.read_sizer = AdaptiveSizer()
+        self.write_sizer = AdaptiveSizer()
 
     def setTrace(self, trace):
         self.trace = trace
 
-    def iread(self, _opc, clientTools, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False, include_error=False, rebuild=False):
-        """Iterable version of read()"""
+    def _opc_error_str(self, _opc, error):
+        """Return the server's error string for an item error code, memoized per connection"""
+        return self.error_strings.get(error, lambda: _opc.GetErrorString(error))
+
+    def reset_pool(self):
+        """Forget the hidden groups of the anonymous read and write item pools (their items are gone once disconnected)"""
+
+        for pool in (self.item_pool, self.write_pool):
+            with pool.lock:
+                opc_group = pool.group
+                if opc_group is not None:
+                    hook = self._group_hooks.pop(opc_group.Name, None)
+                    if hook: hook.close()
+                    self.update_buffers.pop(opc_group.Name, None)
+                pool.clear()
+
+    def _hook_events(self, opc_group):
+        """Route the OPC group's events to this client"""
+
+        if self.trace: self.trace('WithEvents(%s)' % opc_group.Name)
+        OpenOPC.opcdaevents.current_client = self
+        hook = win32com.client.WithEvents(opc_group, GroupEvents)
+        hook.group_name = opc_group.Name
+        self._group_hooks[opc_group.Name] = hook
+        self.update_buffers[opc_group.Name] = UpdateBuffer(self.buffer_size, self.buffer_policy, stats=self.stats)
+
+    def _result_converters(self, quality='str', timestamps='str', columnar=False):
+        """Return the quality and time conversion functions, and the quality of a failed tag, for a result format"""
+
+        if quality not in ('str', 'raw'):
+            raise ValueError("read(): 'quality' parameter must be 'str' or 'raw'")
+        if timestamps not in ('str', 'epoch'):
+            raise ValueError("read(): 'timestamps' parameter must be 'str' or 'epoch'")
+
+        # Columnar results always keep the raw quality bits and epoch timestamps
+        if columnar or quality == 'raw':
+            convert_quality = int    # the full 16-bit quality word, including substatus and limit bits
+            error_quality = None
+        else:
+            convert_quality = quality_str
+            error_quality = 'Error'
 
-        def add_items(tags):
-            names = list(tags)
+        if columnar or timestamps == 'epoch':
+            convert_time = time2epoch
+        else:
+            convert_time = str
 
-            names.insert(0,0)
-            errors = []
+        return convert_quality, convert_time, error_quality
 
-            if self.trace: self.trace('Validate(%s)' % tags2trace(names))
+    def _cache_callback(self, items, callback):
+        """Store the values of a data change callback in the value cache"""
 
-            try:
-                errors = opc_items.Validate(len(names)-1, names)
-            except:
-                pass
-
-            valid_tags = []
-            valid_values = []
-            client_handles = []
+        if not self.value_cache.used:
+            return
 
-            if not sub_group in self._group_handles_tag:
-                self._group_handles_tag[sub_group] = {}
-                n = 0
-            elif len(self._group_handles_tag[sub_group]) > 0:
-                n = max(self._group_handles_tag[sub_group]) + 1
-            else:
-                n = 0
+        tx_id, handles, values, qualities, timestamps = callback[:5]
+        handles_tag = items.handles_tag
+        self.value_cache.update((handles_tag[h], values[i], qualities[i], timestamps[i]) for i, h in enumerate(handles) if h in handles_tag)
 
-            for i, tag in enumerate(tags):
-                if errors[i] == 0:
-                    valid_tags.append(tag)
-                    client_handles.append(n)
-                    self._group_handles_tag[sub_group][n] = tag
-                    n += 1
-                elif include_error:
-                    error_msgs[tag] = _opc.GetErrorString(errors[i])
+    def _data_change_results(self, items, handles, values, qualities, timestamps, quality='str', time_format='str'):
+        """Convert the arrays of a data change callback into a list of (tag, value, quality, time) tuples"""
 
-                if self.trace and errors[i] != 0: self.trace('%s failed validation' % tag)
+        convert_quality, convert_time, error_quality = self._result_converters(quality, time_format)
+        results = []
 
-            client_handles.insert(0,0)
-            valid_tags.insert(0,0)
-            server_handles = []
-            errors = []
+        for i,h in enumerate(handles):
+            tag = items.handles_tag.get(h)
+            if tag is None: continue
 
-            if self.trace: self.trace('AddItems(%s)' % tags2trace(valid_tags))
+            value = values[i]
+            if type(value) == pywintypes.TimeType:
+                value = convert_time(value)
+            results.append((tag, value, convert_quality(qualities[i]), convert_time(timestamps[i])))
 
-            try:
-                server_handles, errors = opc_items.AddItems(len(client_handles)-1, valid_tags, client_handles)
-            except:
-                pass
+        return results
 
-            valid_tags_tmp = []
-            server_handles_tmp = []
-            valid_tags.pop(0)
+    def iread(self, _opc, clientTools, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False, include_error=False, rebuild=False, window=1, format='tuples', quality='str', timestamps='str', max_age=None):
+        """Iterable version of read() (yields one ReadBatch per sub-group when format='columnar')"""
 
-            if not sub_group in self._group_server_handles:
-                self._group_server_handles[sub_group] = {}
+        if format not in ('tuples', 'columnar'):
+            raise ValueError("iread(): 'format' parameter must be 'tuples' or 'columnar'")
+        columnar = (format == 'columnar')
 
-            for i, tag in enumerate(valid_tags):
-                if errors[i] == 0:
-                    valid_tags_tmp.append(tag)
-                    server_handles_tmp.append(server_handles[i])
-                    self._group_server_handles[sub_group][tag] = server_handles[i]
-                elif include_error:
-                    error_msgs[tag] = _opc.GetErrorString(errors[i])
+        # Named groups are read from their own active items, so only anonymous reads use the value cache
+        if max_age and group != None:
+            raise ValueError("iread(): 'max_age' parameter only applies to anonymous reads (group=None)")
 
-            valid_tags = valid_tags_tmp
-            server_handles = server_handles_tmp
+        convert_quality, convert_time, error_quality = self._result_converters(quality, timestamps, columnar)
 
-            return valid_tags, server_handles
+        def error_str(error):
+            return self._opc_error_str(_opc, error)
 
-        def remove_items(tags):
-            if self.trace: self.trace('RemoveItems(%s)' % tags2trace(['']+tags))
-            server_handles = [self._group_server_handles[sub_group][tag] for tag in tags]
-            server_handles.insert(0,0)
-            errors = []
+        def add_items(items, opc_items, tags, error_msgs):
+            return items.add_items(opc_items, tags, error_msgs if include_error else None, error_str, self.trace)
 
+        def rebuild_items(items, opc_items, tags, error_msgs):
             try:
-                errors = opc_items.Remove(len(server_handles)-1, server_handles)
+                return items.rebuild(opc_items, tags, error_msgs if include_error else None, error_str, self.trace)
             except pythoncom.com_error as err:
-                error_msg = 'RemoveItems: %s' % get_error_str(err, _opc)
+                error_msg = 'RemoveItems: %s' % get_error_str(err, _opc, self.error_strings)
                 raise OPCError(error_msg)
 
-        try:
-            clientTools._update_tx_time()
-            pythoncom.CoInitialize()
+        def cached_values(tags):
+            """Return the cached samples of an anonymous read no older than 'max_age', and the tags still to read"""
 
-            if include_error:
-                sync = True
+            if group != None or not max_age or not self.value_cache.max_items:
+                return {}, tags
 
-            if sync:
-                update = -1
+            cached = self.value_cache.fresh(tags, max_age)
+            return cached, [t for t in tags if t not in cached]
 
-            tags, single, valid = type_check(tags)
-            if not valid:
-                raise TypeError("iread(): 'tags' parameter must be a string or a list of strings")
+        def open_pooled(gid):
+            """Return the read context for sub-group 'gid' of an anonymous read served by the item pool"""
 
-            # Group exists
-            if group in self._groups and not rebuild:
-                num_groups = self._groups[group]
-                data_source = SOURCE_CACHE
+            error_msgs = {}
+            pool = self.item_pool
 
-            # Group non-existant
+            if source != 'hybrid':
+                group_source = SOURCE_CACHE if source == 'cache' else SOURCE_DEVICE
             else:
-                if size:
-                    # Break-up tags into groups of 'size' tags
-                    tag_groups = [tags[i:i+size] for i in range(0, len(tags), size)]
-                else:
-                    tag_groups = [tags]
+                group_source = data_source
 
-                num_groups = len(tag_groups)
-                data_source = SOURCE_DEVICE
+            if pool.group is None:
+                opc_groups = _opc.OPCGroups
+                opc_groups.DefaultGroupUpdateRate = update
 
-            results = []
+                try:
+                    if self.trace: self.trace('AddGroup()')
+                    opc_group = opc_groups.Add()
+                except pythoncom.com_error as err:
+                    error_msg = 'AddGroup: %s' % get_error_str(err, _opc, self.error_strings)
+                    raise OPCError(error_msg)
+
+                # Inactive so the server does not scan the pooled items, since device reads do
+                # not need it, but subscribed since the server only delivers AsyncRead
+                # completions to a subscribed group
+                opc_group.IsActive = 0
+                opc_group.IsSubscribed = 1
+                self._hook_events(opc_group)
+                pool.group = opc_group
+
+            # Reading from the cache needs the server to scan the items, so the first cache read
+            # activates the group, which stays active for later ones (until the idle items are
+            # evicted), and each cache read applies its own update rate
+            if group_source == SOURCE_CACHE:
+                if update >= 0 and pool.group.UpdateRate != update:
+                    pool.group.UpdateRate = update
+                if not pool.group.IsActive:
+                    pool.group.IsActive = 1
+
+            tags = tag_groups[gid]
+            cached, read_tags = cached_values(tags)
+            valid_tags, server_handles = pool.acquire(pool.group.OPCItems, read_tags, error_msgs if include_error else None, error_str, self.trace)
+
+            return {'opc_groups': None, 'opc_group': pool.group, 'items': pool.items, 'tags': tags, 'valid_tags': valid_tags,
+                    'server_handles': server_handles, 'source': group_source, 'error_msgs': error_msgs, 'tx_id': None,
+                    'pooled': True, 'sync': sync or group_source == SOURCE_CACHE, 'cached': cached}
+
+        def open_group(gid):
+            """Get or create sub-group 'gid' and return its read context"""
+
+            if group == None and self.item_pool.max_items:
+                return open_pooled(gid)
+
+            error_msgs = {}
+            opc_groups = _opc.OPCGroups
+            opc_groups.DefaultGroupUpdateRate = update
 
-            for gid in range(num_groups):
-                if gid > 0 and pause > 0: time.sleep(pause/1000.0)
+            # Anonymous group
+            if group == None:
+                try:
+                    if self.trace: self.trace('AddGroup()')
+                    opc_group = opc_groups.Add()
+                except pythoncom.com_error as err:
+                    error_msg = 'AddGroup: %s' % get_error_str(err, _opc, self.error_strings)
+                    raise OPCError(error_msg)
+                sub_group = group
+                new_group = True
+            else:
+                sub_group = '%s.%d' % (group, gid)
 
-                error_msgs = {}
-                opc_groups = _opc.OPCGroups
-                opc_groups.DefaultGroupUpdateRate = update
+                # Existing named group
+                try:
+                    if self.trace: self.trace('GetOPCGroup(%s)' % sub_group)
+                    opc_group = opc_groups.GetOPCGroup(sub_group)
+                    new_group = False
 
-                # Anonymous group
-                if group == None:
+                # New named group
+                except:
                     try:
-                        if self.trace: self.trace('AddGroup()')
-                        opc_group = opc_groups.Add()
+                        if self.trace: self.trace('AddGroup(%s)' % sub_group)
+                        opc_group = opc_groups.Add(sub_group)
                     except pythoncom.com_error as err:
-                        error_msg = 'AddGroup: %s' % get_error_str(err, _opc)
+                        error_msg = 'AddGroup: %s' % get_error_str(err, _opc, self.error_strings)
                         raise OPCError(error_msg)
-                    sub_group = group
+                    self._groups[str(group)] = len(tag_groups)
                     new_group = True
-                else:
-                    sub_group = '%s.%d' % (group, gid)
 
-                    # Existing named group
-                    try:
-                        if self.trace: self.trace('GetOPCGroup(%s)' % sub_group)
-                        opc_group = opc_groups.GetOPCGroup(sub_group)
-                        new_group = False
+            opc_items = opc_group.OPCItems
 
-                    # New named group
-                    except:
-                        try:
-                            if self.trace: self.trace('AddGroup(%s)' % sub_group)
-                            opc_group = opc_groups.Add(sub_group)
-                        except pythoncom.com_error as err:
-                            error_msg = 'AddGroup: %s' % get_error_str(err, _opc)
-                            raise OPCError(error_msg)
-                        self._groups[str(group)] = len(tag_groups)
-                        new_group = True
+            if new_group:
+                opc_group.IsSubscribed = 1
+                opc_group.IsActive = 1
+                if not sync:
+                    self._hook_events(opc_group)
 
-                opc_items = opc_group.OPCItems
+                tags = tag_groups[gid]
+                cached, read_tags = cached_values(tags)
 
-                if new_group:
-                    opc_group.IsSubscribed = 1
-                    opc_group.IsActive = 1
-                    if not sync:
-                        if self.trace: self.trace('WithEvents(%s)' % opc_group.Name)
-                        global current_client
-                        current_client = self
-                        self._group_hooks[opc_group.Name] = win32com.client.WithEvents(opc_group, GroupEvents)
+                items = GroupItems()
+                self._group_items[sub_group] = items
+                add_items(items, opc_items, read_tags, error_msgs)
+                items.tags = tags
+                valid_tags, server_handles = items.handle_array()
 
-                    tags = tag_groups[gid]
+            # Rebuild existing group
+            elif rebuild:
+                tags = tag_groups[gid]
 
-                    valid_tags, server_handles = add_items(tags)
+                items = self._group_items[sub_group]
+                rebuild_items(items, opc_items, tags, error_msgs)
+                valid_tags, server_handles = items.handle_array()
 
-                    self._group_tags[sub_group] = tags
-                    self._group_valid_tags[sub_group] = valid_tags
+            # Existing group
+            else:
+                items = self._group_items[sub_group]
+                tags = items.tags
+                valid_tags, server_handles = items.handle_array()
 
-                # Rebuild existing group
-                elif rebuild:
-                    tags = tag_groups[gid]
+                # Server handles were recorded by AddItems, so skip reading ServerHandle from every OPCItem
+                if sync:
+                    self.stats['com_calls_avoided'] += len(server_handles)
 
-                    valid_tags = self._group_valid_tags[sub_group]
-                    add_tags = [t for t in tags if t not in valid_tags]
-                    del_tags = [t for t in valid_tags if t not in tags]
+            if source != 'hybrid':
+                group_source = SOURCE_CACHE if source == 'cache' else SOURCE_DEVICE
+            else:
+                group_source = data_source
 
-                    if len(add_tags) > 0:
-                        valid_tags, server_handles = add_items(add_tags)
-                        valid_tags = self._group_valid_tags[sub_group] + valid_tags
+            if not new_group:
+                cached = {}
 
-                    if len(del_tags) > 0:
-                        remove_items(del_tags)
-                        valid_tags = [t for t in valid_tags if t not in del_tags]
+            return {'opc_groups': opc_groups, 'opc_group': opc_group, 'items': items, 'tags': tags, 'valid_tags': valid_tags,
+                    'server_handles': server_handles, 'source': group_source, 'error_msgs': error_msgs, 'tx_id': None,
+                    'pooled': False, 'sync': sync, 'cached': cached}
 
-                    self._group_tags[sub_group] = tags
-                    self._group_valid_tags[sub_group] = valid_tags
+        def start_read(ctx):
+            """Send the AsyncRefresh (or AsyncRead of the pooled items) for an async read context"""
 
-                    if source == 'hybrid': data_source = SOURCE_DEVICE
+            if ctx['sync'] or len(ctx['valid_tags']) == 0:
+                return
 
-                # Existing group
-                else:
-                    tags = self._group_tags[sub_group]
-                    valid_tags = self._group_valid_tags[sub_group]
-                    if sync:
-                        server_handles = [item.ServerHandle for item in opc_items]
+            # Register before the request since the callback can arrive while AsyncRefresh is still running
+            ctx['tx_id'] = self.transactions.begin(timeout)
 
-                tag_value = {}
-                tag_quality = {}
-                tag_time = {}
-                tag_error = {}
+            # The pool group holds other tags too, so read just this context's items from the device
+            if ctx['pooled']:
+                server_handles = [0] + ctx['server_handles']
 
-                # Sync Read
-                if sync:
-                    values = []
-                    errors = []
-                    qualities = []
-                    timestamps= []
+                if self.trace: self.trace('AsyncRead(%s)' % tags2trace([0] + ctx['valid_tags']))
 
-                    if len(valid_tags) > 0:
-                        server_handles.insert(0,0)
+                try:
+                    ctx['opc_group'].AsyncRead(NumItems=len(server_handles)-1, ServerHandles=server_handles, TransactionID=ctx['tx_id'])
+                except pythoncom.com_error as err:
+                    self.transactions.cancel(ctx['tx_id'])
+                    ctx['tx_id'] = None
+                    error_msg = 'AsyncRead: %s' % get_error_str(err, _opc, self.error_strings)
+                    raise OPCError(error_msg)
+                return
 
-                        if source != 'hybrid':
-                            data_source = SOURCE_CACHE if source == 'cache' else SOURCE_DEVICE
+            if self.trace: self.trace('AsyncRefresh(%s)' % ctx['source'])
 
-                        if self.trace: self.trace('SyncRead(%s)' % data_source)
+            try:
+                ctx['opc_group'].AsyncRefresh(ctx['source'], ctx['tx_id'])
+            except pythoncom.com_error as err:
+                self.transactions.cancel(ctx['tx_id'])
+                ctx['tx_id'] = None
+                error_msg = 'AsyncRefresh: %s' % get_error_str(err, _opc, self.error_strings)
+                raise OPCError(error_msg)
 
-                        try:
-                            values, errors, qualities, timestamps = opc_group.SyncRead(data_source, len(server_handles)-1, server_handles)
-                        except pythoncom.com_error as err:
-                            error_msg = 'SyncRead: %s' % get_error_str(err, _opc)
-                            raise OPCError(error_msg)
+        def collect_read(ctx):
+            """Wait for (or SyncRead) the values of a read context and return them in dicts keyed by tag"""
 
-                        for i,tag in enumerate(valid_tags):
-                            tag_value[tag] = values[i]
-                            tag_quality[tag] = qualities[i]
-                            tag_time[tag] = timestamps[i]
-                            tag_error[tag] = errors[i]
+            opc_group = ctx['opc_group']
+            items = ctx['items']
+            valid_tags = ctx['valid_tags']
+            read_sync = ctx['sync']
 
-                # Async Read
-                else:
-                    if len(valid_tags) > 0:
-                        if self._tx_id >= 0xFFFF:
-                            self._tx_id = 0
-                        self._tx_id += 1
+            tag_value = {}
+            tag_quality = {}
+            tag_time = {}
+            tag_error = {}
 
-                        if source != 'hybrid':
-                            data_source = SOURCE_CACHE if source == 'cache' else SOURCE_DEVICE
+            # Sync Read
+            if read_sync:
+                values = []
+                errors = []
+                qualities = []
+                timestamps= []
 
-                        if self.trace: self.trace('AsyncRefresh(%s)' % data_source)
+                if len(valid_tags) > 0:
+                    # The handle array is cached by GroupItems, so prepend the COM base index to a copy
+                    server_handles = [0] + ctx['server_handles']
 
-                        try:
-                            opc_group.AsyncRefresh(data_source, self._tx_id)
-                        except pythoncom.com_error as err:
-                            error_msg = 'AsyncRefresh: %s' % get_error_str(err, _opc)
-                            raise OPCError(error_msg)
+                    if self.trace: self.trace('SyncRead(%s)' % ctx['source'])
+
+                    try:
+                        values, errors, qualities, timestamps = opc_group.SyncRead(ctx['source'], len(server_handles)-1, server_handles)
+                    except pythoncom.com_error as err:
+                        error_msg = 'SyncRead: %s' % get_error_str(err, _opc, self.error_strings)
+                        raise OPCError(error_msg)
 
-                        tx_id = 0
-                        start = time.time() * 1000
+                    for i,tag in enumerate(valid_tags):
+                        tag_value[tag] = values[i]
+                        tag_quality[tag] = qualities[i]
+                        tag_time[tag] = timestamps[i]
+                        tag_error[tag] = errors[i]
 
-                        while tx_id != self._tx_id:
-                            now = time.time() * 1000
-                            if now - start > timeout:
-                                raise TimeoutError('Callback: Timeout waiting for data')
+            # Async Read
+            else:
+                if ctx['tx_id'] is not None:
+                    callback = self.transactions.result(ctx['tx_id'])
+                    tx_id, handles, values, qualities, timestamps = callback[:5]
+                    errors = callback[5] if len(callback) > 5 else None    # AsyncRead also reports per item errors
+                    ctx['tx_id'] = None
 
-                            if self.callback_queue.empty():
-                                pythoncom.PumpWaitingMessages()
-                            else:
-                                tx_id, handles, values, qualities, timestamps = self.callback_queue.get()
+                    # Discard the subscription updates received in the meantime
+                    if opc_group.Name in self.update_buffers:
+                        self.update_buffers[opc_group.Name].clear()
 
-                        for i,h in enumerate(handles):
-                            tag = self._group_handles_tag[sub_group][h]
-                            tag_value[tag] = values[i]
-                            tag_quality[tag] = qualities[i]
-                            tag_time[tag] = timestamps[i]
+                    for i,h in enumerate(handles):
+                        if errors and errors[i] != 0: continue
+                        tag = items.handles_tag[h]
+                        tag_value[tag] = values[i]
+                        tag_quality[tag] = qualities[i]
+                        tag_time[tag] = timestamps[i]
 
-                for tag in tags:
-                    if tag in tag_value:
-                        if (not sync and len(valid_tags) > 0) or (sync and tag_error[tag] == 0):
-                            value = tag_value[tag]
-                            if type(value) == pywintypes.TimeType:
-                                value = str(value)
-                            quality = quality_str(tag_quality[tag])
-                            timestamp = str(tag_time[tag])
-                        else:
-                            value = None
-                            quality = 'Error'
-                            timestamp = None
-                        if include_error:
-                            error_msgs[tag] = _opc.GetErrorString(tag_error[tag]).strip('\r\n')
+            return tag_value, tag_quality, tag_time, tag_error
+
+        def finish_read(ctx):
+            """Collect the values for a read context and yield them in tag order"""
+
+            opc_group = ctx['opc_group']
+            valid_tags = ctx['valid_tags']
+            error_msgs = ctx['error_msgs']
+            read_sync = ctx['sync']
+
+            try:
+                tag_value, tag_quality, tag_time, tag_error = collect_read(ctx)
+            except:
+                if auto: self.read_sizer.update(len(ctx['tags']), (time.time() - ctx['start']) * 1000.0, failed=True)
+                raise
+
+            if auto: self.read_sizer.update(len(ctx['tags']), (time.time() - ctx['start']) * 1000.0)
+
+            cached = ctx['cached']
+            if self.value_cache.max_items and self.value_cache.used and len(tag_value) > 0:
+                self.value_cache.update((tag, tag_value[tag], tag_quality[tag], tag_time[tag]) for tag in tag_value
+                                        if not read_sync or tag_error[tag] == 0)
+
+            # Samples young enough for 'max_age' are answered from memory
+            for tag, (value, quality, timestamp) in cached.items():
+                tag_value[tag] = value
+                tag_quality[tag] = quality
+                tag_time[tag] = timestamp
+                tag_error[tag] = 0
+
+            if columnar:
+                columns = ([], [], [], [])
+
+            for tag in ctx['tags']:
+                ok = False
+
+                if tag in tag_value:
+                    if tag in cached or (not read_sync and len(valid_tags) > 0) or (read_sync and tag_error[tag] == 0):
+                        ok = True
+                        value = tag_value[tag]
+                        if type(value) == pywintypes.TimeType:
+                            value = convert_time(value)
+                        quality = convert_quality(tag_quality[tag])
+                        timestamp = convert_time(tag_time[tag])
+                    if include_error:
+                        error_msgs[tag] = self._opc_error_str(_opc, tag_error[tag]).strip('\r\n')
+                else:
+                    if include_error and not tag in error_msgs:
+                        error_msgs[tag] = ''
+
+                if not ok:
+                    value = None
+                    quality = error_quality
+                    timestamp = None
+
+                if columnar:
+                    columns[0].append(value)
+                    columns[1].append(quality if ok else 0)
+                    columns[2].append(timestamp if ok else float('nan'))
+                    columns[3].append(ok)
+                elif single:
+                    if include_error:
+                        yield (value, quality, timestamp, error_msgs[tag])
                     else:
-                        value = None
-                        quality = 'Error'
-                        timestamp = None
-                        if include_error and not tag in error_msgs:
-                            error_msgs[tag] = ''
-
-                    if single:
-                        if include_error:
-                            yield (value, quality, timestamp, error_msgs[tag])
-                        else:
-                            yield (value, quality, timestamp)
+                        yield (value, quality, timestamp)
+                else:
+                    if include_error:
+                        yield (tag, value, quality, timestamp, error_msgs[tag])
                     else:
-                        if include_error:
-                            yield (tag, value, quality, timestamp, error_msgs[tag])
-                        else:
-                            yield (tag, value, quality, timestamp)
+                        yield (tag, value, quality, timestamp)
 
-                if group == None:
-                    try:
-                        if not sync and opc_group.Name in self._group_hooks:
-                            if self.trace: self.trace('CloseEvents(%s)' % opc_group.Name)
-                            self._group_hooks[opc_group.Name].close()
+            if columnar:
+                errors = [error_msgs[tag] for tag in ctx['tags']] if include_error else None
+                yield ReadBatch(ctx['tags'], columns[0], columns[1], columns[2], columns[3], errors)
 
-                        if self.trace: self.trace('RemoveGroup(%s)' % opc_group.Name)
-                        opc_groups.Remove(opc_group.Name)
+            if ctx['pooled']:
+                keep = set()
+                for other in in_flight: keep.update(other['valid_tags'])
 
-                    except pythoncom.com_error as err:
-                        error_msg = 'RemoveGroup: %s' % get_error_str(err, _opc)
-                        raise OPCError(error_msg)
+                try:
+                    self.item_pool.evict(opc_group.OPCItems, keep, self.trace)
+                except pythoncom.com_error as err:
+                    error_msg = 'RemoveItems: %s' % get_error_str(err, _opc, self.error_strings)
+                    raise OPCError(error_msg)
+
+            elif group == None:
+                try:
+                    if not sync and opc_group.Name in self._group_hooks:
+                        if self.trace: self.trace('CloseEvents(%s)' % opc_group.Name)
+                        self._group_hooks.pop(opc_group.Name).close()
+                        self.update_buffers.pop(opc_group.Name, None)
+
+                    if self.trace: self.trace('RemoveGroup(%s)' % opc_group.Name)
+                    ctx['opc_groups'].Remove(opc_group.Name)
+
+                except pythoncom.com_error as err:
+                    error_msg = 'RemoveGroup: %s' % get_error_str(err, _opc, self.error_strings)
+                    raise OPCError(error_msg)
+
+        in_flight = []
+        pool_lock = None
+
+        try:
+            clientTools._update_tx_time()
+            pythoncom.CoInitialize()
+
+            if include_error:
+                sync = True
+
+            if sync:
+                update = -1
+
+            # Pipelining only applies to async reads since SyncRead blocks until the values arrive
+            if sync or not window or window < 1:
+                window = 1 if sync else 0
+
+            tags, single, valid = type_check(tags)
+            if not valid:
+                raise TypeError("iread(): 'tags' parameter must be a string or a list of strings")
+
+            # Group exists
+            if group in self._groups and not rebuild:
+                num_groups = self._groups[group]
+                data_source = SOURCE_CACHE
+                auto = False
+
+            # Group non-existant
+            else:
+                auto = (size == 'auto' and len(tags) > 0)
+
+                if auto:
+                    # Sub-groups are cut as the read goes, at the size learnt from the previous transactions
+                    tag_groups = []
+                elif size:
+                    # Break-up tags into groups of 'size' tags
+                    tag_groups = [tags[i:i+size] for i in range(0, len(tags), size)]
+                else:
+                    tag_groups = [tags]
+
+                num_groups = len(tag_groups)
+                data_source = SOURCE_DEVICE
+
+            if auto:
+                def sub_groups():
+                    for start, end in chunk_ranges(len(tags), sizer=self.read_sizer):
+                        tag_groups.append(tags[start:end])
+                        yield len(tag_groups) - 1
+            else:
+                def sub_groups():
+                    return range(num_groups)
+
+            # The item pool and its group are shared by every thread reading through this client
+            if group == None and self.item_pool.max_items:
+                pool_lock = self.item_pool.lock
+                pool_lock.acquire()
+
+            # Keep up to 'window' sub-group refreshes in flight (0 for all of them) and
+            # yield each sub-group, in order, once its callback has arrived
+            for gid in sub_groups():
+                if auto: pause = self.read_sizer.pause
+                if gid > 0 and pause > 0: time.sleep(pause/1000.0)
+
+                start = time.time()
+                ctx = open_group(gid)
+                ctx['start'] = start
+                in_flight.append(ctx)
+                start_read(ctx)
+
+                if window and len(in_flight) >= window:
+                    for result in finish_read(in_flight.pop(0)): yield result
+
+            while len(in_flight) > 0:
+                for result in finish_read(in_flight.pop(0)): yield result
 
         except pythoncom.com_error as err:
-            error_msg = 'read: %s' % get_error_str(err, _opc)
+            error_msg = 'read: %s' % get_error_str(err, _opc, self.error_strings)
             raise OPCError(error_msg)
 
-    def read(self, _opc, clientTools, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False, include_error=False, rebuild=False):
+        finally:
+            for ctx in in_flight:
+                if ctx['tx_id'] is not None: self.transactions.cancel(ctx['tx_id'])
+            if pool_lock: pool_lock.release()
+
+    def read(self, _opc, clientTools, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False, include_error=False, rebuild=False, window=1, format='tuples', quality='str', timestamps='str', max_age=None):
         """Return list of (value, quality, time) tuples for the specified tag(s)"""
 
         tags_list, single, valid = type_check(tags)
@@ -379,15 +593,36 @@ class ClientIO():
         if num_health_tags > 0:
             if num_opc_tags > 0:
                 raise TypeError("read(): system health and OPC tags cannot be included in the same group")
+            if format == 'columnar':
+                raise TypeError("read(): format='columnar' is not supported for system health tags")
             results = self._read_health(clientTools, tags)
         else:
-            results = self.iread(_opc, clientTools, tags, group, size, pause, source, update, timeout, sync, include_error, rebuild)
+            results = self.iread(_opc, clientTools, tags, group, size, pause, source, update, timeout, sync, include_error, rebuild, window=window, format=format, quality=quality, timestamps=timestamps, max_age=max_age)
+
+        if format == 'columnar':
+            return ReadBatch.concat(list(results))
 
         if single:
             return list(results)[0]
         else:
             return list(results)
 
+    def read_changed(self, _opc, clientTools, tags=None, group=None, deadband=None, percent=None, **kwargs):
+        """Return list of (tag, value, quality, time) tuples for just the tags that changed since the last read_changed() of the group"""
+
+        if kwargs.get('format', 'tuples') != 'tuples':
+            raise TypeError("read_changed(): only format='tuples' is supported")
+
+        tags, single, valid = type_check(tags)
+        if not valid:
+            raise TypeError("read_changed(): 'tags' parameter must be a string or a list of strings")
+
+        if group not in self._change_filters:
+            self._change_filters[group] = ChangeFilter()
+
+        results = self.iread(_opc, clientTools, tags, group, **kwargs)
+        return list(self._change_filters[group].filter(results, deadband, percent))
+
     def _read_health(self, clientTools, tags):
         """Return values of special system health monitoring tags"""
 
@@ -442,8 +677,154 @@ class ClientIO():
 
         return results
 
-    def iwrite(self, _opc, clientTools, tag_value_pairs, size=None, pause=0, include_error=False):
-        """Iterable version of write()"""
+    def iwrite(self, _opc, clientTools, tag_value_pairs, size=None, pause=0, include_error=False, sync=True, window=1, timeout=5000):
+        """Iterable version of write() (sync=False sends AsyncWrite for up to 'window' groups at once)"""
+
+        def error_str(error):
+            return self._opc_error_str(_opc, error)
+
+        def write_result(tag, status, error_msgs):
+            # OPC servers often include newline and carriage return characters
+            # in their error message strings, so remove any found.
+            if include_error:  error_msgs[tag] = error_msgs[tag].strip('\r\n')
+
+            if single:
+                if include_error:
+                    return (status, error_msgs[tag])
+                else:
+                    return status
+            else:
+                if include_error:
+                    return (tag, status, error_msgs[tag])
+                else:
+                    return (tag, status)
+
+        def write_group():
+            """Return the hidden group of the write pool, creating it (and hooking its events for async writes) first if needed"""
+
+            pool = self.write_pool
+
+            if pool.group is None:
+                opc_groups = _opc.OPCGroups
+                if self.trace: self.trace('AddGroup()')
+                opc_group = opc_groups.Add()
+
+                # Writes go straight to the device, so the server need not scan these items
+                opc_group.IsActive = 0
+                pool.group = opc_group
+
+            if not sync and pool.group.Name not in self._group_hooks:
+                # The server only delivers AsyncWrite completions to a subscribed group
+                pool.group.IsSubscribed = 1
+                self._hook_events(pool.group)
+
+            return pool.group
+
+        def write_pooled(tags, values):
+            """Write one group of tags through the write pool, adding only the tags not seen before"""
+
+            pool = self.write_pool
+            error_msgs = dict.fromkeys(tags, '')
+            start = time.time()
+            opc_items = write_group().OPCItems
+            valid_tags, server_handles = pool.acquire(opc_items, tags, error_msgs if include_error else None, error_str, self.trace)
+
+            # The last value wins when a tag appears more than once
+            tag_value = dict(zip(tags, values))
+            valid_values = [tag_value[tag] for tag in valid_tags]
+            tag_error = {}
+
+            if len(valid_tags) > 0:
+                if self.trace: self.trace('SyncWrite(%s)' % tags2trace([0] + valid_tags))
+                try:
+                    errors = pool.group.SyncWrite(len(server_handles), [0] + server_handles, [0] + valid_values)
+                    tag_error = dict(zip(valid_tags, errors))
+                except:
+                    pass
+
+                if auto: self.write_sizer.update(len(tags), (time.time() - start) * 1000.0, failed=(len(tag_error) == 0))
+
+            for tag in tags:
+                if tag in tag_error:
+                    status = 'Success' if tag_error[tag] == 0 else 'Error'
+                    if include_error:  error_msgs[tag] = self._opc_error_str(_opc, tag_error[tag])
+                else:
+                    status = 'Error'
+
+                yield write_result(tag, status, error_msgs)
+
+            pool.evict(opc_items, trace=self.trace)
+
+        def start_write(tags, values):
+            """Send the AsyncWrite for one group of tags and return its write context"""
+
+            pool = self.write_pool
+            start = time.time()
+            opc_group = write_group()
+            error_msgs = dict.fromkeys(tags, '')
+            valid_tags, server_handles = pool.acquire(opc_group.OPCItems, tags, error_msgs if include_error else None, error_str, self.trace)
+
+            tag_value = dict(zip(tags, values))
+            valid_values = [tag_value[tag] for tag in valid_tags]
+            ctx = {'tags': tags, 'valid_tags': valid_tags, 'error_msgs': error_msgs, 'tag_error': {}, 'tx_id': None, 'failure': None, 'start': start}
+
+            if len(valid_tags) == 0:
+                return ctx
+
+            # Register before the request since the callback can arrive while AsyncWrite is still running
+            ctx['tx_id'] = self.transactions.begin(timeout)
+
+            if self.trace: self.trace('AsyncWrite(%s)' % tags2trace([0] + valid_tags))
+
+            try:
+                errors, cancel_id = opc_group.AsyncWrite(NumItems=len(server_handles), ServerHandles=[0] + server_handles,
+                                                         Values=[0] + valid_values, TransactionID=ctx['tx_id'])
+            except pythoncom.com_error as err:
+                self.transactions.cancel(ctx['tx_id'])
+                ctx['tx_id'] = None
+                ctx['failure'] = 'AsyncWrite: %s' % get_error_str(err, _opc, self.error_strings)
+                return ctx
+
+            # Items rejected when the request was sent get no completion callback
+            for i, tag in enumerate(valid_tags):
+                if errors[i] != 0: ctx['tag_error'][tag] = errors[i]
+
+            return ctx
+
+        def finish_write(ctx):
+            """Wait for the AsyncWriteComplete of a write context and yield its statuses in tag order"""
+
+            tag_error = ctx['tag_error']
+            error_msgs = ctx['error_msgs']
+
+            if ctx['tx_id'] is not None:
+                try:
+                    tx_id, handles, errors = self.transactions.result(ctx['tx_id'])
+                    for i, h in enumerate(handles):
+                        tag_error[self.write_pool.items.handles_tag[h]] = errors[i]
+                except Exception as err:
+                    ctx['failure'] = 'AsyncWrite: %s' % err.args[-1]
+                ctx['tx_id'] = None
+
+                if auto: self.write_sizer.update(len(ctx['tags']), (time.time() - ctx['start']) * 1000.0, failed=(ctx['failure'] is not None))
+
+            for tag in ctx['tags']:
+                if tag in tag_error:
+                    status = 'Success' if tag_error[tag] == 0 else 'Error'
+                    if include_error:  error_msgs[tag] = self._opc_error_str(_opc, tag_error[tag])
+                else:
+                    # A timed out or failed request leaves the outcome of its items unknown
+                    status = 'Error'
+                    if include_error and ctx['failure'] and tag in ctx['valid_tags']:  error_msgs[tag] = ctx['failure']
+
+                yield write_result(tag, status, error_msgs)
+
+            keep = set()
+            for other in in_flight: keep.update(other['valid_tags'])
+            self.write_pool.evict(self.write_pool.group.OPCItems, keep, self.trace)
+
+        in_flight = []
+        pool_lock = None
 
         try:
             clientTools._update_tx_time()
@@ -475,8 +856,16 @@ class ClientIO():
             tags = [tag[0] for tag in tag_value_pairs]
             values = [tag[1] for tag in tag_value_pairs]
 
+            auto = (size == 'auto' and len(tags) > 0)
+
+            if auto:
+                # Groups are cut as the write goes, at the size learnt from the previous transactions
+                name_groups = []
+                tag_groups = []
+                value_groups = []
+
             # Break-up tags & values into groups of 'size' tags
-            if size:
+            elif size:
                 name_groups = [names[i:i+size] for i in range(0, len(names), size)]
                 tag_groups = [tags[i:i+size] for i in range(0, len(tags), size)]
                 value_groups = [values[i:i+size] for i in range(0, len(values), size)]
@@ -487,11 +876,51 @@ class ClientIO():
 
             num_groups = len(tag_groups)
 
+            if auto:
+                # The loop below reuses the names 'tags' and 'values', so bind the full lists now
+                def sub_groups(names=names, tags=tags, values=values):
+                    for start, end in chunk_ranges(len(tags), sizer=self.write_sizer):
+                        name_groups.append(names[start:end])
+                        tag_groups.append(tags[start:end])
+                        value_groups.append(values[start:end])
+                        yield len(tag_groups) - 1
+            else:
+                def sub_groups():
+                    return range(num_groups)
+
             status = []
 
-            for gid in range(num_groups):
+            # Async writes always go through the write pool, sync writes unless it is disabled
+            if not sync or self.write_pool.max_items:
+                pool_lock = self.write_pool.lock
+                pool_lock.acquire()
+
+            # Keep up to 'window' AsyncWrites in flight (0 for all of them) and
+            # yield the statuses of each group, in order, once it has completed
+            if not sync:
+                for gid in sub_groups():
+                    if auto: pause = self.write_sizer.pause
+                    if gid > 0 and pause > 0: time.sleep(pause/1000.0)
+
+                    in_flight.append(start_write(tag_groups[gid], value_groups[gid]))
+
+                    if window and len(in_flight) >= window:
+                        for result in finish_write(in_flight.pop(0)): yield result
+
+                while len(in_flight) > 0:
+                    for result in finish_write(in_flight.pop(0)): yield result
+
+                return
+
+            for gid in sub_groups():
+                if auto: pause = self.write_sizer.pause
                 if gid > 0 and pause > 0: time.sleep(pause/1000.0)
 
+                if self.write_pool.max_items:
+                    for result in write_pooled(tag_groups[gid], value_groups[gid]): yield result
+                    continue
+
+                start = time.time()
                 opc_groups = _opc.OPCGroups
                 opc_group = opc_groups.Add()
                 opc_items = opc_group.OPCItems
@@ -522,7 +951,7 @@ class ClientIO():
                         error_msgs[tag] = ''
                         n += 1
                     elif include_error:
-                        error_msgs[tag] = _opc.GetErrorString(errors[i])
+                        error_msgs[tag] = self._opc_error_str(_opc, errors[i])
 
                 client_handles.insert(0,0)
                 valid_tags.insert(0,0)
@@ -546,7 +975,7 @@ class ClientIO():
                         server_handles_tmp.append(server_handles[i])
                         error_msgs[tag] = ''
                     elif include_error:
-                        error_msgs[tag] = _opc.GetErrorString(errors[i])
+                        error_msgs[tag] = self._opc_error_str(_opc, errors[i])
 
                 valid_tags = valid_tags_tmp
                 valid_values = valid_values_tmp
@@ -562,6 +991,8 @@ class ClientIO():
                     except:
                         pass
 
+                    if auto: self.write_sizer.update(len(tags), (time.time() - start) * 1000.0, failed=(len(errors) == 0))
+
                 n = 0
                 for tag in tags:
                     if tag in valid_tags:
@@ -569,33 +1000,25 @@ class ClientIO():
                             status = 'Success'
                         else:
                             status = 'Error'
-                        if include_error:  error_msgs[tag] = _opc.GetErrorString(errors[n])
+                        if include_error:  error_msgs[tag] = self._opc_error_str(_opc, errors[n])
                         n += 1
                     else:
                         status = 'Error'
 
-                    # OPC servers often include newline and carriage return characters
-                    # in their error message strings, so remove any found.
-                    if include_error:  error_msgs[tag] = error_msgs[tag].strip('\r\n')
-
-                    if single:
-                        if include_error:
-                            yield (status, error_msgs[tag])
-                        else:
-                            yield status
-                    else:
-                        if include_error:
-                            yield (tag, status, error_msgs[tag])
-                        else:
-                            yield (tag, status)
+                    yield write_result(tag, status, error_msgs)
 
                 opc_groups.Remove(opc_group.Name)
 
         except pythoncom.com_error as err:
-            error_msg = 'write: %s' % get_error_str(err, _opc)
+            error_msg = 'write: %s' % get_error_str(err, _opc, self.error_strings)
             raise OPCError(error_msg)
 
-    def write(self, _opc, clientTools, tag_value_pairs, size=None, pause=0, include_error=False):
+        finally:
+            for ctx in in_flight:
+                if ctx['tx_id'] is not None: self.transactions.cancel(ctx['tx_id'])
+            if pool_lock: pool_lock.release()
+
+    def write(self, _opc, clientTools, tag_value_pairs, size=None, pause=0, include_error=False, sync=True, window=1, timeout=5000):
         """Write list of (tag, value) pair(s) to the server"""
 
         if type(tag_value_pairs) in (list, tuple) and type(tag_value_pairs[0]) in (list, tuple):
@@ -603,13 +1026,107 @@ class ClientIO():
         else:
             single = True
 
-        status = self.iwrite(_opc, clientTools, tag_value_pairs, size, pause, include_error)
+        status = self.iwrite(_opc, clientTools, tag_value_pairs, size, pause, include_error, sync, window, timeout)
 
         if single:
             return list(status)[0]
         else:
             return list(status)
 
+    def subscribe(self, _opc, clientTools, tags, update_rate=1000, callback=None, group=None, buffer_size=1000, policy='coalesce', quality='str', timestamps='str'):
+        """Subscribe to server-pushed updates of the specified tag(s) and return a Subscription handle"""
+
+        try:
+            clientTools._update_tx_time()
+            pythoncom.CoInitialize()
+
+            tags, single, valid = type_check(tags)
+            if not valid:
+                raise TypeError("subscribe(): 'tags' parameter must be a string or a list of strings")
+
+            if group == None:
+                self._subscription_id += 1
+                group = 'Subscription%d' % self._subscription_id
+
+            if group in self._groups:
+                raise OPCError("subscribe: Group '%s' already exists" % group)
+
+            sub_group = '%s.0' % group
+            opc_groups = _opc.OPCGroups
+            opc_groups.DefaultGroupUpdateRate = update_rate
+
+            try:
+                if self.trace: self.trace('AddGroup(%s)' % sub_group)
+                opc_group = opc_groups.Add(sub_group)
+            except pythoncom.com_error as err:
+                error_msg = 'AddGroup: %s' % get_error_str(err, _opc, self.error_strings)
+                raise OPCError(error_msg)
+
+            items = GroupItems()
+            self._groups[group] = 1
+            self._group_items[sub_group] = items
+
+            self._result_converters(quality, timestamps)
+            convert = lambda tx_id, handles, values, qualities, times: self._data_change_results(items, handles, values, qualities, times, quality, timestamps)
+            buffer = UpdateBuffer(buffer_size, policy, stats=self.stats)
+            subscription = Subscription(group, convert, self.transactions.wait, callback, lambda: self.remove(_opc, group), buffer,
+                                        lambda update: self._cache_callback(items, update))
+            self.subscriptions[sub_group] = subscription
+
+            opc_group.IsSubscribed = 1
+            opc_group.IsActive = 1
+            self._hook_events(opc_group)
+
+            items.add_items(opc_group.OPCItems, tags, trace=self.trace)
+            items.tags = tags
+
+            return subscription
+
+        except pythoncom.com_error as err:
+            error_msg = 'subscribe: %s' % get_error_str(err, _opc, self.error_strings)
+            raise OPCError(error_msg)
+
+    def set_group(self, _opc, group, update_rate=None, deadband=None, active=None):
+        """Change the update rate, percent deadband or active state of a named group in place
+
+        Returns a list of (sub-group, update rate, deadband, active) tuples
+        with the settings in effect afterwards, since servers may revise
+        the requested update rate.  An inactive group is not scanned, so
+        refresh it with sync=True, source='device' or reactivate it first."""
+
+        try:
+            pythoncom.CoInitialize()
+
+            if group not in self._groups:
+                raise OPCError("set_group: Group '%s' does not exist" % group)
+
+            opc_groups = _opc.OPCGroups
+            settings = []
+
+            for i in range(self._groups[group]):
+                sub_group = '%s.%d' % (group, i)
+
+                if self.trace: self.trace('GetOPCGroup(%s)' % sub_group)
+                opc_group = opc_groups.GetOPCGroup(sub_group)
+
+                if update_rate is not None:
+                    if self.trace: self.trace('UpdateRate(%s,%d)' % (sub_group, update_rate))
+                    opc_group.UpdateRate = update_rate
+                if deadband is not None:
+                    if self.trace: self.trace('DeadBand(%s,%s)' % (sub_group, deadband))
+                    opc_group.DeadBand = deadband
+                if active is not None:
+                    if self.trace: self.trace('IsActive(%s,%d)' % (sub_group, bool(active)))
+                    opc_group.IsActive = 1 if active else 0
+
+                settings.append((sub_group, opc_group.UpdateRate, opc_group.DeadBand, bool(opc_group.IsActive)))
+
+            return settings
+
+        except pythoncom.com_error as err:
+            error_msg = 'set_group: %s' % get_error_str(err, _opc, self.error_strings)
+            raise OPCError(error_msg)
+
     def remove(self, _opc, groups):
         """Remove the specified tag group(s)"""
 
@@ -635,24 +1152,27 @@ class ClientIO():
                             if self.trace: self.trace('CloseEvents(%s)' % sub_group)
                             self._group_hooks[sub_group].close()
 
+                        if sub_group in self.subscriptions:
+                            self.subscriptions.pop(sub_group).detach()
+
+                        self.update_buffers.pop(sub_group, None)
+
                         try:
                             if self.trace: self.trace('RemoveGroup(%s)' % sub_group)
                             errors = opc_groups.Remove(sub_group)
                             if errors == None:
                                 groups_deleted = True
                         except pythoncom.com_error as err:
-                            error_msg = 'RemoveGroup: %s' % get_error_str(err, _opc)
+                            error_msg = 'RemoveGroup: %s' % get_error_str(err, _opc, self.error_strings)
                             raise OPCError(error_msg)
 
-                        del(self._group_tags[sub_group])
-                        del(self._group_valid_tags[sub_group])
-                        del(self._group_handles_tag[sub_group])
-                        del(self._group_server_handles[sub_group])
+                        del(self._group_items[sub_group])
                     del(self._groups[group])
+                    self._change_filters.pop(group, None)
             return groups_deleted
 
         except pythoncom.com_error as err:
-            error_msg = 'remove: %s' % get_error_str(err, _opc)
+            error_msg = 'remove: %s' % get_error_str(err, _opc, self.error_strings)
             raise OPCError(error_msg)
 
     def __getitem__(self, _opc, clientTools, key):
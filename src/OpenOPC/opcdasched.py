@@ -0,0 +1,449 @@
+###########################################################################
+#
+# OpenOPC for Python OPC-DA Scheduling Library file
+#
+# Batching of client requests.  This file makes no direct COM calls; the
+# actual reads and writes are passed in as functions so the scheduling
+# can be tested without a server.
+#
+# Copyright (c) 2007-2012 Barry Barnreiter (barry_b@users.sourceforge.net)
+# Copyright (c) 2014 Anton D. Kachalov (mouse@yandex.ru)
+# Copyright (c) 2017 José A. Maita (jose.a.maita@gmail.com)
+# Copyright (c) 2022 j3mg
+#
+###########################################################################
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from OpenOPC.common import OPCError
+
+class QueuedWrite(Future):
+    """Future of a write waiting in a WriteQueue
+
+    Without a writer thread nothing else sends the batch once it is due,
+    so result() and exception() wait for the batch's 'max_delay' and then
+    flush it on the waiting thread."""
+
+    def __init__(self, queue):
+        Future.__init__(self)
+        self._queue = queue
+
+    def result(self, timeout=None):
+        self._queue._flush_due(self, timeout)
+        return Future.result(self, timeout)
+
+    def exception(self, timeout=None):
+        self._queue._flush_due(self, timeout)
+        return Future.exception(self, timeout)
+
+class WriteQueue():
+    """Queue of pending writes flushed to the server in batches
+
+    Writes to a tag still waiting in the queue replace the queued value
+    (last write wins) and share its future.  A batch is flushed once it
+    holds 'max_batch' tags or its oldest write is 'max_delay' milliseconds
+    old, using write(tag_value_pairs) which must return a list of
+    (tag, status) tuples in the same order.  With 'background' set the
+    flushes run on a writer thread.  Otherwise they run on the caller's
+    thread: inside submit() once the batch is due, when one of its futures
+    is waited on (see QueuedWrite), or in flush() and close().  The writer thread calls on_start() before its first batch
+    and on_exit() once it stops (e.g. to open and close the connection it
+    writes through); if on_start() fails every batch fails with its error."""
+
+    def __init__(self, write, max_batch=1000, max_delay=10, background=False, stats=None, on_start=None, on_exit=None):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.stats = stats if stats is not None else {}
+        for key in ('writes_submitted', 'writes_coalesced', 'write_batches'):
+            self.stats.setdefault(key, 0)
+
+        self._write = write
+        self._on_start = on_start
+        self._on_exit = on_exit
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()     # keeps batches in submission order
+        self._pending = OrderedDict()          # tag -> (value, [futures])
+        self._deadline = None
+        self._closed = False
+        self._thread = None
+
+        if background:
+            self._thread = threading.Thread(target=self._run, name='OpenOPC.WriteQueue', daemon=True)
+            self._thread.start()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, tag, value):
+        """Queue a write and return a Future resolving to its status ('Success' or 'Error')"""
+
+        future = QueuedWrite(self)
+
+        with self._cond:
+            if self._closed:
+                raise OPCError('WriteQueue: Queue is closed')
+
+            self.stats['writes_submitted'] += 1
+
+            if tag in self._pending:
+                futures = self._pending.pop(tag)[1]
+                self.stats['writes_coalesced'] += 1
+            else:
+                futures = []
+                if len(self._pending) == 0:
+                    self._deadline = time.time() + self.max_delay / 1000.0
+
+            futures.append(future)
+            self._pending[tag] = (value, futures)
+            due = self._due()
+
+            if self._thread:
+                # Wake the writer for a full batch, or so it starts timing a new one
+                if due or len(self._pending) == 1: self._cond.notify()
+                return future
+
+        if due: self.flush()
+        return future
+
+    def flush(self):
+        """Send everything queued so far, returning the number of tags written"""
+
+        with self._send_lock:
+            with self._cond:
+                batch = self._take()
+            return self._send(batch)
+
+    def close(self, timeout=None):
+        """Flush the queue and stop the writer thread"""
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+        if self._thread:
+            self._thread.join(timeout)
+        else:
+            self.flush()
+
+    def _flush_due(self, future, timeout=None):
+        """Without a writer thread, wait up to 'timeout' seconds for the batch holding future to be due and flush it"""
+
+        if self._thread or future.done():
+            return
+
+        with self._cond:
+            deadline = self._deadline
+
+        if deadline is not None:
+            delay = deadline - time.time()
+            if timeout is not None and timeout < delay:
+                time.sleep(max(timeout, 0))
+                return
+            if delay > 0:
+                time.sleep(delay)
+
+        # Flushing also waits for a batch another thread is already sending
+        if not future.done():
+            self.flush()
+
+    def _due(self):
+        return len(self._pending) >= self.max_batch or (self._deadline is not None and time.time() >= self._deadline)
+
+    def _take(self):
+        batch = self._pending
+        self._pending = OrderedDict()
+        self._deadline = None
+        return batch
+
+    def _send(self, batch):
+        if len(batch) == 0:
+            return 0
+
+        pairs = [(tag, value) for tag, (value, futures) in batch.items()]
+        self.stats['write_batches'] += 1
+
+        try:
+            results = self._write(pairs)
+        except Exception as err:
+            for value, futures in batch.values():
+                for future in futures: future.set_exception(err)
+        else:
+            for (tag, (value, futures)), result in zip(batch.items(), results):
+                for future in futures: future.set_result(result[1])
+
+        return len(pairs)
+
+    def _run(self):
+        try:
+            if self._on_start: self._on_start()
+        except Exception as err:
+            error = err
+            def write(pairs): raise error
+            self._write = write
+
+        try:
+            while True:
+                with self._cond:
+                    while not self._closed and not self._due():
+                        if self._deadline is None:
+                            self._cond.wait()
+                        else:
+                            self._cond.wait(max(self._deadline - time.time(), 0))
+                    closed = self._closed
+
+                self.flush()
+
+                if closed:
+                    return
+        finally:
+            if self._on_exit: self._on_exit()
+
+class AdaptiveSizer():
+    """AIMD control of the number of tags per transaction and the pause between transactions
+
+    After each transaction update() is given its tag count and latency.
+    While transactions finish within 'target' milliseconds the size grows
+    by 'increase' tags and the pause shrinks; a slower transaction cuts
+    the size by 'decrease', and a failed or timed out one also doubles the
+    pause, so a struggling server gets both smaller and fewer requests."""
+
+    def __init__(self, target=250, size=100, min_size=10, max_size=10000, increase=50, decrease=0.5, max_pause=2000):
+        self.target = target
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.increase = increase
+        self.decrease = decrease
+        self.max_pause = max_pause
+        self.pause = 0
+        self.latency = None     # moving average of the transaction latency (ms)
+        self.stats = {'transactions': 0, 'tags': 0, 'slow': 0, 'failures': 0}
+        self._lock = threading.Lock()
+
+    def next_size(self):
+        return int(self.size)
+
+    def update(self, count, latency, failed=False):
+        """Adjust the size and pause after a transaction of 'count' tags taking 'latency' milliseconds"""
+
+        with self._lock:
+            self.stats['transactions'] += 1
+            self.stats['tags'] += count
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+            if failed:
+                self.stats['failures'] += 1
+                self.size = max(self.min_size, self.size * self.decrease)
+                self.pause = min(self.max_pause, max(self.pause * 2, 10))
+            elif latency > self.target:
+                self.stats['slow'] += 1
+                self.size = max(self.min_size, self.size * self.decrease)
+            else:
+                # A short final chunk says nothing about the capacity for bigger ones
+                if count >= int(self.size):
+                    self.size = min(self.max_size, self.size + self.increase)
+                self.pause = self.pause / 2 if self.pause >= 2 else 0
+
+    def state(self):
+        """Return the current size, pause and latency with the counters, for inspection"""
+
+        with self._lock:
+            state = {'size': int(self.size), 'pause': self.pause, 'latency': self.latency, 'target': self.target}
+            state.update(self.stats)
+            return state
+
+def chunk_ranges(count, size=None, sizer=None):
+    """Yield (start, end) index ranges splitting 'count' items into transactions of 'size' items, or of the sizes chosen by 'sizer'"""
+
+    start = 0
+    while start < count:
+        n = sizer.next_size() if sizer else (size or count)
+        yield start, min(start + n, count)
+        start += n
+
+class ScanClass():
+    """A set of tags read every 'period' milliseconds, starting 'offset' milliseconds into the period"""
+
+    def __init__(self, name, tags, period, offset=0, size=None, callback=None):
+        self.name = name
+        self.tags = list(tags)
+        self.period = period
+        self.offset = offset
+        self.size = size
+        self.callback = callback
+        self.next_time = None
+        self.stats = {'scans': 0, 'merged': 0, 'overruns': 0, 'skipped': 0, 'errors': 0,
+                      'latency': None, 'max_latency': 0.0, 'avg_latency': None,
+                      'jitter': None, 'max_jitter': 0.0}
+        self._tick = 0
+        self._base = None
+
+    def schedule(self, base, now=None):
+        """Count the ticks from 'base' (a time.monotonic() value), starting with the first one not before 'now'"""
+
+        self._base = base + self.offset / 1000.0
+        self._tick = 0
+        if now is not None and now > self._base:
+            self._tick = int(math.ceil((now - self._base) / (self.period / 1000.0)))
+        self.next_time = self._base + self._tick * self.period / 1000.0
+
+    def advance(self, now):
+        """Move to the first tick after 'now', counting the ticks missed by an overrun"""
+
+        tick = int((now - self._base) / (self.period / 1000.0)) + 1
+        skipped = tick - self._tick - 1
+        if skipped > 0:
+            self.stats['overruns'] += 1
+            self.stats['skipped'] += skipped
+        self._tick = max(tick, self._tick + 1)
+        self.next_time = self._base + self._tick * self.period / 1000.0
+
+class Scheduler():
+    """Periodic multi-rate polling of scan classes on drift-free timers
+
+    Ticks are computed from the start time rather than by sleeping after
+    each scan, so they do not drift.  Scan classes due at the same tick are
+    read together in one read(tags, size) call, which must return a list of
+    (tag, value, quality, time) tuples, and the results are split back per
+    class.  Each class passes its results to its own callback, or else to
+    'sink', as callback(name, results).  A scan running past the next tick
+    of its class is counted as an overrun and the missed ticks are skipped
+    rather than run late back to back.  The thread of start() calls
+    on_start() before its first scan and on_exit() once it stops; if
+    on_start() fails every scan on that thread fails with its error."""
+
+    def __init__(self, read, sink=None, on_start=None, on_exit=None):
+        self.sink = sink
+        self._read = read
+        self._on_start = on_start
+        self._on_exit = on_exit
+        self._classes = OrderedDict()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self._base = None
+
+    def add(self, name, tags, period, offset=0, size=None, callback=None):
+        """Add a scan class and return it"""
+
+        scan_class = ScanClass(name, tags, period, offset, size, callback)
+        with self._cond:
+            if name in self._classes:
+                raise OPCError("Scheduler: Scan class '%s' already exists" % name)
+            if self._base is not None:
+                scan_class.schedule(self._base, time.monotonic())
+            self._classes[name] = scan_class
+            self._cond.notify()
+        return scan_class
+
+    def remove(self, name):
+        with self._cond:
+            del(self._classes[name])
+
+    def stats(self):
+        """Return a dictionary of scan class name -> counters"""
+        with self._cond:
+            return dict((name, dict(c.stats)) for name, c in self._classes.items())
+
+    def start(self):
+        """Run the scans on a background thread"""
+
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='OpenOPC.Scheduler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        read = self._read
+        try:
+            if self._on_start: self._on_start()
+        except Exception as err:
+            error = err
+            def fail(tags, size): raise error
+            self._read = fail
+
+        try:
+            self.run()
+        finally:
+            self._read = read
+            if self._on_exit: self._on_exit()
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self, duration=None):
+        """Run the scans on the calling thread until stop() is called or 'duration' milliseconds pass"""
+
+        self._stopped = False
+        end = time.monotonic() + duration / 1000.0 if duration is not None else None
+
+        with self._cond:
+            self._base = time.monotonic()
+            for scan_class in self._classes.values():
+                scan_class.schedule(self._base)
+
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = time.monotonic()
+                    if end is not None and now >= end:
+                        return
+                    times = [c.next_time for c in self._classes.values()]
+                    next_time = min(times) if times else None
+                    if next_time is not None and next_time <= now:
+                        break
+                    wait = None if next_time is None else next_time - now
+                    if end is not None:
+                        wait = end - now if wait is None else min(wait, end - now)
+                    self._cond.wait(wait)
+
+                if self._stopped:
+                    return
+
+                due = [c for c in self._classes.values() if c.next_time <= now]
+
+            self._scan(due)
+
+    def _scan(self, due):
+        """Read the tags of the scan classes due at this tick in one transaction"""
+
+        tags = list(dict.fromkeys(tag for c in due for tag in c.tags))
+        sizes = [c.size for c in due if c.size]
+        start = time.monotonic()
+
+        try:
+            results = self._read(tags, min(sizes) if sizes else None)
+            error = None
+        except Exception as err:
+            results = []
+            error = err
+
+        finish = time.monotonic()
+        latency = (finish - start) * 1000.0
+        tag_result = dict((r[0], r) for r in results)
+
+        for c in due:
+            stats = c.stats
+            jitter = (start - c.next_time) * 1000.0
+            stats['scans'] += 1
+            if len(due) > 1: stats['merged'] += 1
+            stats['latency'] = latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+            stats['avg_latency'] = latency if stats['avg_latency'] is None else 0.9 * stats['avg_latency'] + 0.1 * latency
+            stats['jitter'] = jitter
+            stats['max_jitter'] = max(stats['max_jitter'], jitter)
+            c.advance(finish)
+
+            if error is not None:
+                stats['errors'] += 1
+                continue
+
+            callback = c.callback or self.sink
+            if callback:
+                callback(c.name, [tag_result[tag] for tag in c.tags if tag in tag_result])
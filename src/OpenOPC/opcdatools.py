@@ -11,18 +11,83 @@
 # Copyright (c) 2025 Per Johnsson (perjohns@gmail.com) Resolved issue https://stackoverflow.com/questions/21300135/two-issue-about-python-openopc-library/79535814#79535814
 #
 ###########################################################################
-import re
 import OpenOPC
 import OpenOPC.systemhealth
 import pythoncom
 import pywintypes
 import time
-from OpenOPC.common import exceptional, get_error_str, quality_str, type_check, wild2regex, ACCESS_RIGHTS, BROWSER_TYPE, OPCError, OPC_QUALITY, OPC_STATUS
+from concurrent.futures import ThreadPoolExecutor
+from OpenOPC.opcdabrowse import ibrowse, BrowseIndex, NamespaceSnapshot
+from OpenOPC.opcdaevents import MessageWait
+from OpenOPC.opcdadata import PropertyCache
+from OpenOPC.common import exceptional, get_error_str, quality_str, type_check, ACCESS_RIGHTS, BROWSER_TYPE, OPCError, OPC_QUALITY, OPC_STATUS
+
+class ServerBrowser():
+    """Browse source walking an OPCBrowser automation object (see OpenOPC.opcdabrowse.ibrowse)"""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.position = None
+
+    def _move_to(self, branch):
+        if self.position != branch:
+            self.position = None
+            self.browser.MoveToRoot()
+            for p in branch: self.browser.MoveDown(p)
+            self.position = branch
+
+    def branches(self, branch):
+        self._move_to(branch)
+        self.browser.Filter = ''
+        self.browser.ShowBranches()
+        return list(self.browser)
+
+    def leaves(self, branch):
+        self._move_to(branch)
+        self.browser.Filter = ''
+        self.browser.ShowLeafs(False)
+        return list(self.browser)
+
+    def item_id(self, branch, name):
+        self._move_to(branch)
+        return self.browser.GetItemID(name)
+
+    def flat(self):
+        self.position = None
+        self.browser.MoveToRoot()
+        self.browser.Filter = ''
+        self.browser.ShowLeafs(True)
+        return list(self.browser)
+
+class ThreadBrowser(ServerBrowser):
+    """ServerBrowser for a parallel browse worker thread, over a connection opened by connect() on that thread
+
+    The client's own automation object belongs to the apartment of the
+    thread that created it, so each worker browses through its own."""
+
+    def __init__(self, connect):
+        self.connection = connect()
+        try:
+            ServerBrowser.__init__(self, self.connection._opc.CreateBrowser())
+        except:
+            self.close()
+            raise
+
+    def close(self):
+        self.browser = None
+        try:
+            self.connection.close()
+        finally:
+            self.connection = None
+            pythoncom.CoUninitialize()
 
 class ClientTools():
-    def __init__(self, opc_class, opc_host):
+    def __init__(self, opc_class, opc_host, error_strings=None):
         self.opc_class = opc_class
         self.opc_host = opc_host
+        self.error_strings = error_strings
+        self.browse_index = BrowseIndex()
+        self.property_cache = PropertyCache()
         self.__open_serv__ = None 
         self.__open_host__ = None
         self.__open_port__ = None
@@ -38,8 +103,114 @@ class ClientTools():
         self.__open_port__ = port
         self.__open_guid__ = guid
 
-    def iproperties(self, _opc, tags, id=None):
-        """Iterable version of properties()"""
+    def _decode_properties(self, property_id, values):
+        """Replace raw property values by their display form"""
+
+        values = [str(v) if type(v) == pywintypes.TimeType else v for v in values]
+
+        # Replace variant id with type strings
+        try:
+            i = property_id.index(1)
+            values[i] = vt[values[i]]
+        except:
+            pass
+
+        # Replace quality bits with quality strings
+        try:
+            i = property_id.index(3)
+            values[i] = quality_str(values[i])
+        except:
+            pass
+
+        # Replace access rights bits with strings
+        try:
+            i = property_id.index(5)
+            values[i] = ACCESS_RIGHTS[values[i]]
+        except:
+            pass
+
+        return values
+
+    def _tag_properties(self, _opc, tag, property_id=None):
+        """Return (property ids, descriptions, values) of tag, all available properties if property_id is None
+
+        Property lists and values are taken from the property cache where it
+        has them and read from the server otherwise."""
+
+        descriptions = None
+
+        if property_id == None:
+            available = self.property_cache.available(tag)
+            if available is None:
+                count, property_id, descriptions, datatypes = _opc.QueryAvailableProperties(tag)
+
+                # Remove bogus negative property id (not sure why this sometimes happens)
+                tag_properties = list(map(lambda x, y: (x, y), property_id, descriptions))
+                property_id = [p for p, d in tag_properties if p > 0]
+                descriptions = [d for p, d in tag_properties if p > 0]
+                self.property_cache.set_available(tag, property_id, descriptions)
+            else:
+                property_id, descriptions = available
+
+        cached = self.property_cache.get(tag, property_id)
+        missing = [p for p in property_id if p not in cached]
+
+        if len(missing) > 0:
+            values, errors = _opc.GetItemProperties(tag, len(missing), [0] + missing)
+            values = self._decode_properties(missing, list(values))
+            self.property_cache.update(tag, [(p, v) for p, v, e in zip(missing, values, errors) if e == 0])
+            cached.update(zip(missing, values))
+
+        return property_id, descriptions, [cached[p] for p in property_id]
+
+    def _parallel_properties(self, _opc, tags, property_id, workers, connect):
+        """Run _tag_properties() for tags on worker threads and return the results in tag order
+
+        Each worker reads its share of the tags through a connection opened
+        by connect() on its own thread, since _opc belongs to the calling
+        thread's apartment.  The share of a worker that cannot connect is
+        read through _opc afterwards and the worker counted in the stats."""
+
+        stats = self.property_cache.stats
+        stats.setdefault('prop_worker_errors', 0)
+
+        def run(chunk):
+            try:
+                connection = connect()
+            except Exception:
+                return None
+
+            try:
+                return [self._tag_properties(connection._opc, tag, property_id) for tag in chunk]
+            finally:
+                try:
+                    connection.close()
+                finally:
+                    connection = None
+                    pythoncom.CoUninitialize()
+
+        # One share per worker, so each connects only once
+        size = -(-len(tags) // workers)
+        chunks = [tags[i:i+size] for i in range(0, len(tags), size)]
+
+        # Pump messages while the workers run, like any other wait on this thread
+        wait = MessageWait()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='OpenOPC.Properties') as pool:
+            futures = [pool.submit(run, chunk) for chunk in chunks]
+            for future in futures: future.add_done_callback(lambda f: wait.notify())
+            wait.wait(lambda: all(f.done() for f in futures), None)
+
+            results = []
+            for chunk, future in zip(chunks, futures):
+                chunk_results = future.result()
+                if chunk_results is None:
+                    stats['prop_worker_errors'] += 1
+                    chunk_results = [self._tag_properties(_opc, tag, property_id) for tag in chunk]
+                results += chunk_results
+            return results
+
+    def iproperties(self, _opc, tags, id=None, workers=1, connect=None):
+        """Iterable version of properties() (workers > 1 read through connections opened by connect() on each worker thread)"""
 
         try:
             self._update_tx_time()
@@ -71,47 +242,17 @@ class ClientTools():
                 single_property = False
 
             properties = []
+            wanted = property_id if id != None else None
 
-            for tag in tags:
-
-                if id == None:
-                    descriptions = []
-                    property_id = []
-                    count, property_id, descriptions, datatypes = _opc.QueryAvailableProperties(tag)
-
-                    # Remove bogus negative property id (not sure why this sometimes happens)
-                    tag_properties = list(map(lambda x, y: (x, y), property_id, descriptions))
-                    property_id = [p for p, d in tag_properties if p > 0]
-                    descriptions = [d for p, d in tag_properties if p > 0]
-
-                property_id.insert(0, 0)
-                values = []
-                errors = []
-                values, errors = _opc.GetItemProperties(tag, len(property_id)-1, property_id)
-
-                property_id.pop(0)
-                values = [str(v) if type(v) == pywintypes.TimeType else v for v in values]
-
-                # Replace variant id with type strings
-                try:
-                    i = property_id.index(1)
-                    values[i] = vt[values[i]]
-                except:
-                    pass
+            if workers > 1 and len(tags) > 1 and connect:
+                results = self._parallel_properties(_opc, tags, wanted, workers, connect)
+            else:
+                results = (self._tag_properties(_opc, tag, wanted) for tag in tags)
 
-                # Replace quality bits with quality strings
-                try:
-                    i = property_id.index(3)
-                    values[i] = quality_str(values[i])
-                except:
-                    pass
+            for tag, (property_id, tag_descriptions, values) in zip(tags, results):
 
-                # Replace access rights bits with strings
-                try:
-                    i = property_id.index(5)
-                    values[i] = ACCESS_RIGHTS[values[i]]
-                except:
-                    pass
+                if id == None:
+                    descriptions = tag_descriptions
 
                 if id != None:
                     if single_property:
@@ -131,10 +272,10 @@ class ClientTools():
                 for p in tag_properties: yield p
 
         except pythoncom.com_error as err:
-            error_msg = 'properties: %s' % get_error_str(err, _opc)
+            error_msg = 'properties: %s' % get_error_str(err, _opc, self.error_strings)
             raise OPCError(error_msg)
 
-    def properties(self, _opc, tags, id=None):
+    def properties(self, _opc, tags, id=None, workers=1, connect=None):
         """Return list of property tuples (id, name, value) for the specified tag(s) """
 
         if type(tags) not in (list, tuple) and type(id) not in (type(None), list, tuple):
@@ -142,15 +283,15 @@ class ClientTools():
         else:
             single = False
 
-        props = self.iproperties(_opc, tags, id)
+        props = self.iproperties(_opc, tags, id, workers, connect)
 
         if single:
             return list(props)[0]
         else:
             return list(props)
 
-    def ilist(self, _opc, paths='*', recursive=False, flat=False, include_type=False):
-        """Iterable version of list()"""
+    def ilist(self, _opc, paths='*', recursive=False, flat=False, include_type=False, workers=1, connect=None):
+        """Iterable version of list() (workers > 1 browse through connections opened by connect() on each worker thread)"""
 
         try:
             self._update_tx_time()
@@ -167,95 +308,47 @@ class ClientTools():
                 raise TypeError("list(): 'paths' parameter must be a string or a list of strings")
 
             if len(paths) == 0: paths = ['*']
-            nodes = {}
-
-            for path in paths:
-
-                if flat:
-                    browser.MoveToRoot()
-                    browser.Filter = ''
-                    browser.ShowLeafs(True)
-
-                    pattern = re.compile('^%s$' % wild2regex(path) , re.IGNORECASE)
-                    matches = filter(pattern.search, browser)
-                    if include_type:  matches = [(x, node_type) for x in matches]
-
-                    for node in matches: yield node
-                    continue
-
-                queue = []
-                queue.append(path)
-
-                while len(queue) > 0:
-                    tag = queue.pop(0)
-
-                    browser.MoveToRoot()
-                    browser.Filter = ''
-                    pattern = None
-
-                    path_str = '/'
-                    path_list = tag.replace('.','/').split('/')
-                    path_list = [p for p in path_list if len(p) > 0]
-                    found_filter = False
-                    path_postfix = '/'
-
-                    for i, p in enumerate(path_list):
-                        if found_filter:
-                            path_postfix += p + '/'
-                        elif p.find('*') >= 0:
-                            pattern = re.compile('^%s$' % wild2regex(p) , re.IGNORECASE)
-                            found_filter = True
-                        elif len(p) != 0:
-                            pattern = re.compile('^.*$')
-                            browser.ShowBranches()
-
-                            # Branch node, so move down
-                            if len(browser) > 0:
-                                try:
-                                    browser.MoveDown(p)
-                                    path_str += p + '/'
-                                except:
-                                    if i < len(path_list)-1: return
-                                    pattern = re.compile('^%s$' % wild2regex(p) , re.IGNORECASE)
-
-                            # Leaf node, so append all remaining path parts together
-                            # to form a single search expression
-                            else:
-                                p = '.'.join(path_list[i:])
-                                pattern = re.compile('^%s$' % wild2regex(p) , re.IGNORECASE)
-                                break
-
-                    browser.ShowBranches()
-                    node_types = ['Branch','Leaf']
-
-                    if len(browser) == 0:
-                        node_types.pop(0)
-
-                    for node_type in node_types:
-                        if node_type=='Leaf':
-                            browser.ShowLeafs(False)
-
-                        matches = filter(pattern.search, browser)
-
-                        if node_type=='Branch' and recursive:
-                            queue += [path_str + x + path_postfix for x in matches]
-                        else:
-                            if node_type=='Leaf':  matches = [exceptional(browser.GetItemID,x)(x) for x in matches]
-                            if include_type:  matches = [(x, node_type) for x in matches]
-                            for node in matches:
-                                if not node in nodes: yield node
-                                nodes[node] = True
+
+            # With the browse cache off a throwaway index still saves re-listing branches within this call
+            index = self.browse_index if self.browse_index.ttl != 0 else BrowseIndex(ttl=None, stats=self.browse_index.stats)
+
+            make_source = (lambda: ThreadBrowser(connect)) if connect else None
+            for node in ibrowse(index, ServerBrowser(browser), paths, recursive, flat, include_type, workers, make_source, MessageWait()):
+                yield node
 
         except pythoncom.com_error as err:
-            error_msg = 'list: %s' % get_error_str(err, _opc)
+            error_msg = 'list: %s' % get_error_str(err, _opc, self.error_strings)
             raise OPCError(error_msg)
 
-    def list(self, _opc, paths='*', recursive=False, flat=False, include_type=False):
+    def list(self, _opc, paths='*', recursive=False, flat=False, include_type=False, workers=1, connect=None):
         """Return list of item nodes at specified path(s) (tree browser)"""
 
-        nodes = self.ilist(_opc, paths, recursive, flat, include_type)
+        nodes = self.ilist(_opc, paths, recursive, flat, include_type, workers, connect)
         return list(nodes)
 
+    def save_namespace(self, _opc, filename, paths=None, properties=False, max_age=None):
+        """Save the address space below path(s) to an SQLite snapshot file (see OpenOPC.opcdabrowse.NamespaceSnapshot)"""
+
+        try:
+            self._update_tx_time()
+            pythoncom.CoInitialize()
+            browser = _opc.CreateBrowser()
+
+            # Canonical datatype (1) and access rights (5) of newly found items
+            def item_properties(item_ids):
+                values = dict(((tag, i), v) for tag, i, v in self.iproperties(_opc, item_ids, id=[1, 5]))
+                return [(values.get((tag, 1)), values.get((tag, 5))) for tag in item_ids]
+
+            snapshot = NamespaceSnapshot(filename)
+            try:
+                return snapshot.save(ServerBrowser(browser), paths, item_properties if properties else None, max_age)
+            finally:
+                snapshot.close()
+
+        except pythoncom.com_error as err:
+            error_msg = 'save_namespace: %s' % get_error_str(err, _opc, self.error_strings)
+            raise OPCError(error_msg)
+
     def servers(self, _opc, opc_host='localhost'):
         """Return list of available OPC servers"""
 
@@ -266,7 +359,7 @@ class ClientTools():
             return servers
 
         except pythoncom.com_error as err:
-            error_msg = 'servers: %s' % get_error_str(err, _opc)
+            error_msg = 'servers: %s' % get_error_str(err, _opc, self.error_strings)
             raise OPCError(error_msg)
 
     def info(self, _opc):
@@ -309,7 +402,7 @@ class ClientTools():
             return info_list
 
         except pythoncom.com_error as err:
-            error_msg = 'info: %s' % get_error_str(err, _opc)
+            error_msg = 'info: %s' % get_error_str(err, _opc, self.error_strings)
             raise OPCError(error_msg)
 
     def ping(self, _opc):
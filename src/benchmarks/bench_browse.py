@@ -0,0 +1,54 @@
+"""
+Benchmark for the parallel recursive browse (list(recursive=True, workers=N))
+
+Walks a synthetic address space through an in-process fake of the server
+browser that sleeps for a fixed latency on every listing and item ID call,
+the way a remote DCOM server does.  The elapsed time should drop roughly in
+proportion to the number of workers.
+
+Usage:  python benchmarks/bench_browse.py
+"""
+import time
+from OpenOPC.opcdabrowse import ibrowse, BrowseIndex
+
+LATENCY = 0.0005 # seconds per COM call
+
+class FakeBrowser():
+    """Browse source over channels / devices / tags with a fixed call latency"""
+
+    def __init__(self, channels=10, devices=10, tags=20):
+        self.channels = channels
+        self.devices = devices
+        self.tags = tags
+
+    def branches(self, branch):
+        time.sleep(LATENCY)
+        if len(branch) == 0:
+            return ['Channel_%d' % i for i in range(self.channels)]
+        if len(branch) == 1:
+            return ['Device_%d' % i for i in range(self.devices)]
+        return []
+
+    def leaves(self, branch):
+        time.sleep(LATENCY)
+        return ['Tag_%d' % i for i in range(self.tags)] if len(branch) == 2 else []
+
+    def item_id(self, branch, name):
+        time.sleep(LATENCY)
+        return '.'.join(branch + (name,))
+
+    def flat(self):
+        return []
+
+def bench(workers):
+    start = time.perf_counter()
+    nodes = list(ibrowse(BrowseIndex(ttl=None), FakeBrowser(), ['*'], recursive=True, workers=workers, make_source=FakeBrowser))
+    return time.perf_counter() - start, len(nodes)
+
+if __name__ == '__main__':
+    print('%8s %8s %12s %10s' % ('workers', 'items', 'elapsed s', 'speedup'))
+    base = None
+    for workers in (1, 2, 4, 8):
+        elapsed, count = bench(workers)
+        base = base or elapsed
+        print('%8d %8d %12.2f %10.1f' % (workers, count, elapsed, base / elapsed))
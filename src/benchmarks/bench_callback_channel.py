@@ -0,0 +1,42 @@
+"""
+Benchmark for the OnDataChange callback channel used by ClientIO
+
+Compares the multiprocessing.Queue previously used for callback_queue with an
+in-process queue.Queue and the per-group UpdateBuffer now used, for payloads
+of 1k, 10k and 100k items.  Each payload has the shape GroupEvents.OnDataChange
+delivers: a transaction id plus tuples of client handles, values, qualities
+and timestamps.
+
+Usage:  python benchmarks/bench_callback_channel.py
+"""
+import datetime
+import multiprocessing
+import queue
+import time
+from OpenOPC.opcdaevents import UpdateBuffer
+
+def payload(num_items):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (1,
+            tuple(range(num_items)),
+            tuple(float(i) for i in range(num_items)),
+            tuple(192 for i in range(num_items)),
+            tuple(now for i in range(num_items)))
+
+def bench(channel, num_items, repeat):
+    callback = payload(num_items)
+    start = time.perf_counter()
+    for i in range(repeat):
+        channel.put(callback)
+        channel.get()
+    return (time.perf_counter() - start) / repeat
+
+if __name__ == '__main__':
+    print('%8s %22s %18s %20s' % ('items', 'multiprocessing ms', 'queue.Queue ms', 'UpdateBuffer ms'))
+    for num_items, repeat in ((1000, 200), (10000, 50), (100000, 5)):
+        mp_queue = multiprocessing.Queue()
+        mp = bench(mp_queue, num_items, repeat)
+        mp_queue.close()
+        inproc = bench(queue.Queue(), num_items, repeat)
+        buffered = bench(UpdateBuffer(policy='drop_oldest'), num_items, repeat)
+        print('%8d %22.3f %18.4f %20.4f' % (num_items, mp * 1000.0, inproc * 1000.0, buffered * 1000.0))
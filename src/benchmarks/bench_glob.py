@@ -0,0 +1,42 @@
+"""
+Benchmark for the compiled multi-pattern glob matcher used by flat browsing
+
+Classifies a synthetic namespace of one million item IDs against several
+wildcard paths, once the way the flat browser used to (one regex per path,
+one pass over all names per path) and once with compile_glob() (all paths
+compiled together, one pass over the names).  The legacy count is higher
+when globs overlap since it reported a name once per matching glob.
+
+Usage:  python benchmarks/bench_glob.py
+"""
+import re
+import time
+from OpenOPC.common import compile_glob, wild2regex
+
+PATTERNS = ['Channel_7.*', '*.Alarm_3', '*Device_42*', 'Channel_1?.Device_1.Tag_*', 'Channel_3.Device_5.Tag_17']
+
+def namespace(size=1000000):
+    return ['Channel_%d.Device_%d.%s_%d' % (i % 20, (i // 20) % 50, 'Alarm' if i % 7 == 0 else 'Tag', i % 1000) for i in range(size)]
+
+def legacy(names, patterns):
+    matches = []
+    for path in patterns:
+        pattern = re.compile('^%s$' % wild2regex(path) , re.IGNORECASE)
+        matches.append(list(filter(pattern.search, names)))
+    return matches
+
+def compiled(names, patterns):
+    return compile_glob(patterns).classify(names)
+
+def bench(func, names, patterns):
+    start = time.perf_counter()
+    result = func(names, patterns)
+    return time.perf_counter() - start, sum(len(r) for r in result)
+
+if __name__ == '__main__':
+    names = namespace()
+    print('%10s %10s %10s %12s' % ('patterns', 'method', 'matches', 'elapsed s'))
+    for count in (1, 3, 5):
+        for label, func in (('legacy', legacy), ('compiled', compiled)):
+            elapsed, matches = bench(func, names, PATTERNS[:count])
+            print('%10d %10s %10d %12.2f' % (count, label, matches, elapsed))
@@ -0,0 +1,63 @@
+"""
+Benchmark for the incremental rebuild of named read groups (iread rebuild=True)
+
+Runs GroupItems.rebuild() against an in-process fake of the OPCItems COM
+object so only the Python bookkeeping is measured.  The cost per tag should
+stay flat as the group size grows.
+
+Usage:  python benchmarks/bench_rebuild.py
+"""
+import time
+from OpenOPC.opcdagroup import GroupItems
+
+class FakeOPCItems():
+    """In-process stand-in for the OPCItems automation object (1-based arrays)"""
+
+    def __init__(self):
+        self._next_server_handle = 1000
+
+    def Validate(self, count, names):
+        return [0] * count
+
+    def AddItems(self, count, names, client_handles):
+        server_handles = list(range(self._next_server_handle, self._next_server_handle + count))
+        self._next_server_handle += count
+        return server_handles, [0] * count
+
+    def Remove(self, count, server_handles):
+        return [0] * count
+
+def legacy_rebuild(valid_tags, tags):
+    """The list-scan diff used by iread before GroupItems (for comparison)"""
+    add_tags = [t for t in tags if t not in valid_tags]
+    del_tags = [t for t in valid_tags if t not in tags]
+    return add_tags, del_tags
+
+def bench(size, churn=0.1, legacy=False):
+    opc_items = FakeOPCItems()
+    tags = ['Channel_1.Device_1.Tag_%d' % i for i in range(size)]
+
+    # Recipe change: drop the first 'churn' fraction of tags and add as many new ones
+    shift = int(size * churn)
+    new_tags = tags[shift:] + ['Channel_1.Device_2.Tag_%d' % i for i in range(shift)]
+
+    if legacy:
+        start = time.perf_counter()
+        legacy_rebuild(tags, new_tags)
+        return time.perf_counter() - start
+
+    items = GroupItems()
+    items.add_items(opc_items, tags)
+    items.tags = tags
+
+    start = time.perf_counter()
+    items.rebuild(opc_items, new_tags)
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    print('%8s %12s %12s %14s' % ('tags', 'rebuild ms', 'us/tag', 'legacy diff ms'))
+    for size in (2500, 5000, 10000, 20000, 40000):
+        elapsed = bench(size)
+        legacy = bench(size, legacy=True) if size <= 10000 else None
+        print('%8d %12.2f %12.3f %14s' % (size, elapsed * 1000.0, elapsed * 1e6 / size,
+                                          '%.2f' % (legacy * 1000.0) if legacy is not None else '-'))
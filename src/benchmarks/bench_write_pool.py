@@ -0,0 +1,107 @@
+"""
+Benchmark for the cached write group used by iwrite
+
+Replays a setpoint writer (repeated writes to the same tags) through
+ClientIO.iwrite against an in-process fake of the OPC automation objects,
+counting the COM calls each write makes.  Every fake COM call waits
+'latency' microseconds so the totals approximate an out-of-process server.
+With the write pool disabled (max_items=0) iwrite creates, fills and
+removes a group on every write; the pooled path should settle at one
+SyncWrite per write.  Like ClientIO itself this needs pywin32.
+
+Usage:  python benchmarks/bench_write_pool.py [latency_us]
+"""
+import sys
+import time
+from OpenOPC.opcdaio import ClientIO
+from OpenOPC.opcdatools import ClientTools
+
+class ComCounter():
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+        end = time.perf_counter() + self.latency
+        while time.perf_counter() < end: pass
+
+class FakeOPCItems():
+    """In-process stand-in for the OPCItems automation object (1-based arrays)"""
+
+    def __init__(self, com):
+        self.com = com
+        self._next_server_handle = 1000
+
+    def Validate(self, count, names):
+        self.com.call()
+        return [0] * count
+
+    def AddItems(self, count, names, client_handles):
+        self.com.call()
+        server_handles = list(range(self._next_server_handle, self._next_server_handle + count))
+        self._next_server_handle += count
+        return server_handles, [0] * count
+
+    def Remove(self, count, server_handles):
+        self.com.call()
+        return [0] * count
+
+class FakeOPCGroup():
+    def __init__(self, com, name):
+        self.com = com
+        self.Name = name
+        self.IsActive = 1
+        self.IsSubscribed = 0
+        self.OPCItems = FakeOPCItems(com)
+
+    def SyncWrite(self, count, server_handles, values):
+        self.com.call()
+        return [0] * count
+
+class FakeOPCGroups():
+    def __init__(self, com):
+        self.com = com
+        self.DefaultGroupUpdateRate = 1000
+        self._count = 0
+
+    def Add(self):
+        self.com.call()
+        self._count += 1
+        return FakeOPCGroup(self.com, 'Group%d' % self._count)
+
+    def Remove(self, name):
+        self.com.call()
+
+class FakeOPCServer():
+    """Stand-in for the OPC automation server object passed to ClientIO as _opc"""
+
+    def __init__(self, com):
+        self.OPCGroups = FakeOPCGroups(com)
+
+def bench(writes, tags_per_write, latency, pooled=True):
+    com = ComCounter(latency)
+    _opc = FakeOPCServer(com)
+    client_io = ClientIO()
+    client_tools = ClientTools(None, None, client_io.error_strings)
+    if not pooled: client_io.write_pool.max_items = 0
+    tags = ['Channel_1.Device_1.Setpoint_%d' % i for i in range(2000)]
+
+    start = time.perf_counter()
+    for n in range(writes):
+        i = (n * tags_per_write) % len(tags)
+        batch = tags[i:i+tags_per_write]
+        client_io.write(_opc, client_tools, [(tag, float(n)) for tag in batch])
+    return time.perf_counter() - start, com.calls
+
+if __name__ == '__main__':
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 100.0) / 1e6
+    writes = 10000
+
+    print('%d writes, %.0f us per COM call' % (writes, latency * 1e6))
+    print('%12s %8s %14s %12s %14s' % ('tags/write', 'path', 'COM calls', 'calls/write', 'writes/s'))
+    for tags_per_write in (1, 10, 100):
+        for pooled in (False, True):
+            elapsed, calls = bench(writes, tags_per_write, latency, pooled)
+            print('%12d %8s %14d %12.2f %14.0f' % (tags_per_write, 'pooled' if pooled else 'group',
+                                                  calls, calls / float(writes), writes / elapsed))
@@ -0,0 +1,229 @@
+"""
+Unit tests for OpenOPC.opcdabrowse
+Requires:
+        pytest
+"""
+import os
+import threading
+import time
+import pytest
+from OpenOPC.opcdabrowse import ibrowse, prefetch, path_parts, BrowseIndex, NamespaceSnapshot
+
+class FakeBrowser():
+    """Stand-in for the server browser counting every listing it serves"""
+
+    def __init__(self):
+        self.tree = {(): ['Channel_1', 'Channel_2'], ('Channel_1',): ['Device_1'], ('Channel_2',): [], ('Channel_1', 'Device_1'): []}
+        self.tags = {('Channel_1', 'Device_1'): ['Tag_1', 'Tag_2'], ('Channel_2',): ['Tag_3']}
+        self.calls = 0
+
+    def branches(self, path):
+        self.calls += 1
+        return self.tree[path]
+
+    def leaves(self, path):
+        self.calls += 1
+        return self.tags.get(path, [])
+
+    def item_id(self, path, name):
+        self.calls += 1
+        return '.'.join(path + (name,))
+
+    def flat(self):
+        self.calls += 1
+        return ['Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2', 'Channel_2.Tag_3']
+
+def test_pathparts():
+    assert(path_parts('Channel_1.Device_1') == ('Channel_1', 'Device_1') and path_parts('/Channel_1//Device_1/') == ('Channel_1', 'Device_1'))
+
+def test_browsecached():
+    browser = FakeBrowser()
+    index = BrowseIndex(ttl=None)
+    for i in range(2):
+        assert(list(index.branches((), browser.branches)) == ['Channel_1', 'Channel_2'])
+        assert(list(index.leaves(('Channel_1', 'Device_1'), browser.leaves)) == ['Tag_1', 'Tag_2'])
+        assert(index.item_id(('Channel_1', 'Device_1'), 'Tag_2', browser.item_id) == 'Channel_1.Device_1.Tag_2')
+    assert(browser.calls == 3 and index.stats['browse_hits'] == 3 and index.stats['browse_misses'] == 3)
+
+def test_browsettl():
+    browser = FakeBrowser()
+    index = BrowseIndex(ttl=0.05)
+    index.leaves(('Channel_1', 'Device_1'), browser.leaves)
+    index.item_id(('Channel_1', 'Device_1'), 'Tag_1', browser.item_id)
+    time.sleep(0.1)
+    index.leaves(('Channel_1', 'Device_1'), browser.leaves)
+    assert(browser.calls == 3)
+    index.item_id(('Channel_1', 'Device_1'), 'Tag_1', browser.item_id) # IDs survive a refresh of the listing
+    assert(browser.calls == 3)
+
+def test_browseinvalidate():
+    browser = FakeBrowser()
+    index = BrowseIndex(ttl=None)
+    index.branches((), browser.branches)
+    index.leaves(('Channel_1', 'Device_1'), browser.leaves)
+    index.leaves(('Channel_2',), browser.leaves)
+    index.flat(browser.flat)
+    index.invalidate('Channel_1')
+    index.branches((), browser.branches)
+    index.leaves(('Channel_2',), browser.leaves)
+    assert(browser.calls == 4)
+    index.leaves(('Channel_1', 'Device_1'), browser.leaves)
+    index.flat(browser.flat)
+    assert(browser.calls == 6)
+    index.invalidate()
+    index.branches((), browser.branches)
+    assert(browser.calls == 7)
+
+def test_browserefreshkeepssubtrees():
+    browser = FakeBrowser()
+    index = BrowseIndex(ttl=None)
+    index.branches((), browser.branches)
+    index.leaves(('Channel_2',), browser.leaves)
+    browser.tree[()] = ['Channel_2', 'Channel_3']
+    index.root.branches_time = None
+    assert(list(index.branches((), browser.branches)) == ['Channel_2', 'Channel_3'])
+    index.leaves(('Channel_2',), browser.leaves)
+    assert(browser.calls == 3)
+
+def test_ibrowse():
+    index = BrowseIndex(ttl=None)
+    browser = FakeBrowser()
+    assert(list(ibrowse(index, browser, ['*'])) == ['Channel_1', 'Channel_2'])
+    assert(list(ibrowse(index, browser, ['Channel_1.Device_1'], include_type=True)) == [('Channel_1.Device_1.Tag_1', 'Leaf'), ('Channel_1.Device_1.Tag_2', 'Leaf')])
+    assert(list(ibrowse(index, browser, ['*'], recursive=True)) == ['Channel_2.Tag_3', 'Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2'])
+    assert(list(ibrowse(index, browser, ['*.Tag_2'], flat=True)) == ['Channel_1.Device_1.Tag_2'])
+
+def test_snapshotsave(tmp_path):
+    browser = FakeBrowser()
+    snapshot = NamespaceSnapshot(str(tmp_path / 'namespace.db'))
+    summary = snapshot.save(browser, properties=lambda ids: [('VT_R4', 'Read/Write')] * len(ids))
+    assert(summary == {'branches': 4, 'skipped': 0, 'added': 3, 'removed': 0} and len(snapshot) == 3)
+    snapshot.close()
+
+    snapshot = NamespaceSnapshot(str(tmp_path / 'namespace.db'), readonly=True)
+    assert(snapshot.list('Channel*') == ['Channel_1', 'Channel_2'])
+    assert(snapshot.list(recursive=True) == list(ibrowse(BrowseIndex(ttl=None), browser, ['*'], recursive=True)))
+    assert(snapshot.list('*.Tag_?', flat=True) == ['Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2', 'Channel_2.Tag_3'])
+    assert(snapshot.properties('Channel_2.Tag_3') == [('Channel_2.Tag_3', 'VT_R4', 'Read/Write')])
+
+def test_snapshotrefresh(tmp_path):
+    browser = FakeBrowser()
+    snapshot = NamespaceSnapshot(str(tmp_path / 'namespace.db'))
+    snapshot.save(browser)
+    browser.tree[()] = ['Channel_2']
+    browser.tags[('Channel_2',)] = ['Tag_3', 'Tag_4']
+    calls = browser.calls
+    assert(snapshot.save(browser) == {'branches': 2, 'skipped': 0, 'added': 1, 'removed': 2})
+    assert(browser.calls - calls == 5) # two listings per branch plus one item ID for the new leaf
+    assert(snapshot.list(recursive=True) == ['Channel_2.Tag_3', 'Channel_2.Tag_4'])
+
+def test_snapshotmaxage(tmp_path):
+    browser = FakeBrowser()
+    snapshot = NamespaceSnapshot(str(tmp_path / 'namespace.db'))
+    snapshot.save(browser)
+    browser.tags[('Channel_2',)] = ['Tag_3', 'Tag_4']
+    calls = browser.calls
+    assert(snapshot.save(browser, max_age=3600) == {'branches': 0, 'skipped': 4, 'added': 0, 'removed': 0})
+    assert(browser.calls == calls)
+    snapshot._db.execute("UPDATE branches SET browsed = 0 WHERE path = 'Channel_2'")
+    assert(snapshot.save(browser, max_age=3600) == {'branches': 1, 'skipped': 3, 'added': 1, 'removed': 0})
+    assert(browser.calls - calls == 3) # only the stale branch is listed again
+    assert(snapshot.list(recursive=True) == ['Channel_2.Tag_3', 'Channel_2.Tag_4', 'Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2'])
+
+def test_snapshotrefreshbranch(tmp_path):
+    browser = FakeBrowser()
+    snapshot = NamespaceSnapshot(str(tmp_path / 'namespace.db'))
+    snapshot.save(browser)
+    browser.tags[('Channel_1', 'Device_1')] = ['Tag_1']
+    browser.tags[('Channel_2',)] = []
+    assert(snapshot.save(browser, 'Channel_1.Device_1') == {'branches': 1, 'skipped': 0, 'added': 0, 'removed': 1})
+    assert(snapshot.list(recursive=True) == ['Channel_2.Tag_3', 'Channel_1.Device_1.Tag_1'])
+
+def test_snapshotreorder(tmp_path):
+    browser = FakeBrowser()
+    snapshot = NamespaceSnapshot(str(tmp_path / 'namespace.db'))
+    snapshot.save(browser)
+    browser.tree[()] = ['Channel_2', 'Channel_1']
+    snapshot.save(browser, '')
+    assert(snapshot.list() == ['Channel_2', 'Channel_1'])
+
+def test_snapshotreadonly(tmp_path):
+    filename = str(tmp_path / 'nosuch.db')
+    with pytest.raises(Exception) as exc_info:
+        NamespaceSnapshot(filename, readonly=True)
+    assert('does not exist' in str(exc_info.value) and not os.path.exists(filename))
+
+    (tmp_path / 'other.db').write_bytes(b'')
+    with pytest.raises(Exception) as exc_info:
+        NamespaceSnapshot(str(tmp_path / 'other.db'), readonly=True)
+    assert('not a namespace snapshot' in str(exc_info.value))
+
+class SlowBrowser(FakeBrowser):
+    """FakeBrowser over a wider tree that takes a while per listing and records how many run at once"""
+
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self):
+        FakeBrowser.__init__(self)
+        self.tree = {(): ['Channel_%d' % c for c in range(4)]}
+        self.tags = {}
+        for c in range(4):
+            self.tree[('Channel_%d' % c,)] = ['Device_%d' % d for d in range(3)]
+            for d in range(3):
+                self.tree[('Channel_%d' % c, 'Device_%d' % d)] = []
+                self.tags[('Channel_%d' % c, 'Device_%d' % d)] = ['Tag_%d' % t for t in range(5)]
+
+    def branches(self, path):
+        with SlowBrowser.lock:
+            SlowBrowser.active += 1
+            SlowBrowser.peak = max(SlowBrowser.peak, SlowBrowser.active)
+        time.sleep(0.01)
+        with SlowBrowser.lock:
+            SlowBrowser.active -= 1
+        return FakeBrowser.branches(self, path)
+
+def test_parallelbrowse():
+    sources = []
+    def make_source():
+        sources.append(SlowBrowser())
+        return sources[-1]
+    sequential = list(ibrowse(BrowseIndex(ttl=None), SlowBrowser(), ['*'], recursive=True))
+    SlowBrowser.peak = 0
+    parallel = list(ibrowse(BrowseIndex(ttl=None), SlowBrowser(), ['*'], recursive=True, workers=3, make_source=make_source))
+    assert(parallel == sequential and len(parallel) == 60 and len(sources) == 3)
+    assert(SlowBrowser.peak <= 3)
+
+class RecordingWait():
+    """Wait strategy polling the predicate, recording the calls made to it"""
+
+    def __init__(self):
+        self.waits = 0
+        self.notifies = 0
+
+    def notify(self):
+        self.notifies += 1
+
+    def wait(self, predicate, timeout):
+        self.waits += 1
+        while not predicate(): time.sleep(0.001)
+        return True
+
+def test_prefetchwait():
+    wait = RecordingWait()
+    nodes = list(ibrowse(BrowseIndex(ttl=None), FakeBrowser(), ['*'], recursive=True, workers=2, make_source=FakeBrowser, wait=wait))
+    assert(len(nodes) == 3 and wait.waits == 1 and wait.notifies == 2)
+
+def test_prefetchfailures():
+    browser = FakeBrowser()
+    index = BrowseIndex(ttl=None)
+    def make_source():
+        raise RuntimeError('no browser')
+    stats = {}
+    assert(prefetch(index, make_source, [()], workers=2, stats=stats) == 0 and stats['browse_worker_errors'] == 2)
+    assert(prefetch(index, lambda: browser, [('Channel_1',), ('Channel_9',)], workers=2, stats=stats) == 2)
+    assert(stats['browse_prefetched'] == 2 and stats['browse_prefetch_errors'] == 1)
+    calls = browser.calls
+    assert(list(ibrowse(index, browser, ['Channel_1'], recursive=True)) == ['Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2'])
+    assert(browser.calls == calls + 1) # only the root listing, to find Channel_1
@@ -7,8 +7,10 @@ Requires:
         Matrikon.OPC.Automation dll registered
 """
 import os
+import time
 import pytest
 import OpenOPC
+import OpenOPC.opcdabrowse
 import pythoncom
 from OpenOPC.common import OPCError
 
@@ -58,6 +60,12 @@ def test_nonwindowsread(mocker):
     response = opc.read(taglistkep)
     assert(response == None)
 
+def test_nonwindowssubscribe(mocker):
+    mocker.patch.object(OpenOPC.opcda, 'win32com_found', False)
+    opc = OpenOPC.client()
+    response = opc.subscribe('Channel_1.Device_1.Tag_1')
+    assert(response == None)
+
 def test_nonwindowsremove(mocker):
     mocker.patch.object(OpenOPC.opcda, 'win32com_found', False)
     opc = OpenOPC.client()
@@ -149,6 +157,12 @@ def test_nonwindowsos_get_error_str(mocker):
     response = opc._get_error_str(err='dummy')
     assert(response == None)
 
+def test_nonwindowsos_stats(mocker):
+    mocker.patch.object(OpenOPC.opcda, 'win32com_found', False)
+    opc = OpenOPC.client()
+    response = opc.stats()
+    assert(response == None)
+
 def test_nonwindowsos_update_tx_time(mocker):
     mocker.patch.object(OpenOPC.opcda, 'win32com_found', False)
     opc = OpenOPC.client()
@@ -197,6 +211,101 @@ def test_readsized():
     tags = pytest.opcClient.read(taglistkep, size=2)
     assert(len(tags) == 2)
 
+def test_readpipelined():
+    taglistkep = ['Channel_1.Device_1.Bool_1', 'Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2', 'Channel_1.Device_1.Tag_3']
+    tags = pytest.opcClient.read(taglistkep, size=1, window=0)
+    assert(len(tags) == 4 and [t[0] for t in tags] == taglistkep and tags[3][2] == 'Good')
+
+def test_readcolumnar():
+    taglistkep = ['Channel_1.Device_1.Bool_1', 'Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2', 'Channel_1.Device_1.Tag_3']
+    batch = pytest.opcClient.read(taglistkep, size=2, format='columnar')
+    assert(batch.tags == taglistkep and (int(batch.qualities[0]) >> 6) == 3 and batch.timestamps[0] > 0)
+    assert(batch.to_tuples()[1][0] == 'Channel_1.Device_1.Tag_1')
+
+def test_readrawepoch():
+    taglistkep = ['Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2']
+    tags = pytest.opcClient.read(taglistkep, quality='raw', timestamps='epoch')
+    assert(tags[0][2] == 192 and isinstance(tags[0][3], float) and tags[0][3] > 0)
+
+def test_readbadqualityformat():
+    with pytest.raises(ValueError):
+        pytest.opcClient.read('Channel_1.Device_1.Tag_1', quality='bits')
+
+def test_readpooled():
+    taglistkep = ['Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2']
+    pytest.opcClient.read(taglistkep)
+    hits = pytest.opcClient.stats()['pool_hits']
+    tags = pytest.opcClient.read(taglistkep)
+    assert(len(tags) == 2 and tags[0][2] == 'Good' and pytest.opcClient.stats()['pool_hits'] == hits + 2)
+
+def test_readpooledinactive():
+    taglistkep = ['Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2']
+    pytest.opcClient.close()
+    pytest.opcClient.connect()      # reconnect to the same server with an empty item pool
+    pytest.opcClient.read(taglistkep)
+    assert(pytest.opcClient.clientIO.item_pool.group.IsActive == 0)
+    tags = pytest.opcClient.read(taglistkep, source='cache', update=250)
+    pool_group = pytest.opcClient.clientIO.item_pool.group
+    assert(len(tags) == 2 and pool_group.IsActive == 1 and pool_group.UpdateRate == 250)
+
+def test_readauto():
+    taglistkep = ['Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2', 'Channel_1.Device_1.Tag_3']
+    tags = pytest.opcClient.read(taglistkep, size='auto')
+    sizing = pytest.opcClient.sizing()['read']
+    assert(len(tags) == 3 and sizing['transactions'] >= 1 and sizing['size'] > 0)
+
+def test_readmaxage():
+    taglistkep = ['Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2']
+    pytest.opcClient.clientIO.value_cache.clear()
+    first = pytest.opcClient.read(taglistkep, max_age=60000)   # the first max_age read starts filling the cache
+    hits = pytest.opcClient.stats()['cache_hits']
+    tags = pytest.opcClient.read(taglistkep, max_age=60000)
+    assert(tags == first and pytest.opcClient.stats()['cache_hits'] == hits + 2)
+
+def test_readmaxagegroup():
+    with pytest.raises(ValueError) as exc_info:
+        pytest.opcClient.read('Channel_1.Device_1.Tag_1', group='test_readmaxagegroup', max_age=1000)
+    assert("'max_age' parameter only applies to anonymous reads" in str(exc_info.value))
+
+def test_readchanged():
+    taglistkep = ['Channel_1.Device_1.Bool_1', 'Channel_1.Device_1.Tag_1']
+    first = pytest.opcClient.read_changed(taglistkep, group='test_readchanged')
+    second = pytest.opcClient.read_changed(taglistkep, group='test_readchanged', deadband=1000000)
+    pytest.opcClient.remove('test_readchanged')
+    assert(len(first) == 2 and len(second) <= 1)
+
+def test_setgroup():
+    taglistkep = ['Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2']
+    pytest.opcClient.read(taglistkep, group='test_setgroup')
+    settings = pytest.opcClient.set_group('test_setgroup', update_rate=5000, deadband=1.0, active=False)
+    parked = pytest.opcClient.read(group='test_setgroup', sync=True, source='device')
+    pytest.opcClient.set_group('test_setgroup', active=True)
+    pytest.opcClient.remove('test_setgroup')
+    assert(settings[0][0] == 'test_setgroup.0' and settings[0][3] == False and len(parked) == 2)
+
+def test_setgroupbadgroup():
+    with pytest.raises(Exception) as exc_info:
+        pytest.opcClient.set_group('no_such_group', active=False)
+    assert('does not exist' in str(exc_info.value))
+
+def test_scheduler():
+    results = []
+    scheduler = pytest.opcClient.scheduler(sink=lambda name, batch: results.append((name, batch)))
+    scheduler.add('fast', ['Channel_1.Device_1.Tag_1'], 100)
+    scheduler.add('slow', ['Channel_1.Device_1.Tag_2'], 200)
+    scheduler.run(450)
+    assert(scheduler.stats()['fast']['scans'] >= 4 and results[0][1][0][0] == 'Channel_1.Device_1.Tag_1')
+
+def test_schedulerbackground():
+    results = []
+    scheduler = pytest.opcClient.scheduler(sink=lambda name, batch: results.append((name, batch)))
+    scheduler.add('scan', ['Channel_1.Device_1.Tag_1'], 100)
+    scheduler.start()
+    time.sleep(0.45)
+    scheduler.stop(5)
+    stats = scheduler.stats()['scan']
+    assert(stats['scans'] >= 3 and stats['errors'] == 0 and results[0][1][0][2] == 'Good')
+
 def test_readsync():
     taglistkep = ['Channel_1.Device_1.Bool_1', 'Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2', 'Channel_1.Device_1.Tag_3']
     tags = pytest.opcClient.read(taglistkep, sync=True)
@@ -285,6 +394,19 @@ def test_iread():
     opclist = list(tags)
     assert(len(opclist) == 4 and opclist[0][2] == 'Good') # test for 4 tags and quality of first tag
 
+def test_statsgroupreadsync():
+    before = pytest.opcClient.stats()['com_calls_avoided']
+    tagkep = ['Channel_1.Device_1.Bool_1'] # needs to contain a tag
+    tags = pytest.opcClient.read(tagkep, group='Device1Group', sync=True)
+    assert(len(tags) == 4 and pytest.opcClient.stats()['com_calls_avoided'] == before + 4)
+
+def test_subscribe():
+    taglistkep = ['Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2']
+    subscription = pytest.opcClient.subscribe(taglistkep, update_rate=100)
+    batch = subscription.get(timeout=5000)
+    subscription.close()
+    assert(len(batch) > 0 and batch[0][0] in taglistkep and subscription.group not in pytest.opcClient.clientIO._groups)
+
 def test_groupremove():
     removed = pytest.opcClient.remove(groups='Device1and2Group')
     assert(removed)
@@ -320,6 +442,39 @@ def test_iwrite():
     status = list(pytest.opcClient.iwrite(tagPair))
     assert(status[0][1] == 'Success' and  status[1][1] == 'Success' and status[2][1] == 'Success')
 
+def test_writepooled():
+    tagPair = [('Channel_1.Device_1.Tag_1', 8), ('Channel_1.Device_1.Tag_2', 62)]
+    pytest.opcClient.write(tagPair)
+    hits = pytest.opcClient.stats()['write_pool_hits']
+    status = pytest.opcClient.write(tagPair)
+    assert(status == [('Channel_1.Device_1.Tag_1', 'Success'), ('Channel_1.Device_1.Tag_2', 'Success')])
+    assert(pytest.opcClient.stats()['write_pool_hits'] == hits + 2)
+
+def test_iwritepipelined():
+    tagPair = [('Channel_1.Device_1.Tag_1', 8), ('Channel_1.Device_1.Tag_2', 62), ('Channel_1.Device_1.Bad_1', 0), ('Channel_1.Device_1.Tag_3', 74)]
+    status = list(pytest.opcClient.iwrite(tagPair, size=2, sync=False, window=0, include_error=True))
+    assert([s[1] for s in status] == ['Success', 'Success', 'Error', 'Success'] and status[2][2] != '')
+
+def test_writeasync():
+    pytest.opcClient.start_writer(max_delay=1000, background=False)
+    futures = [pytest.opcClient.write_async(('Channel_1.Device_1.Tag_1', v)) for v in (1, 2, 3)]
+    assert(pytest.opcClient.flush_writes() == 1 and futures[0].result(0) == 'Success')
+    assert(pytest.opcClient.read('Channel_1.Device_1.Tag_1', sync=True)[0] == 3)
+    pytest.opcClient.stop_writer()
+
+def test_writeasynclone():
+    pytest.opcClient.start_writer(max_delay=50)
+    future = pytest.opcClient.write_async(('Channel_1.Device_1.Tag_1', 6))
+    assert(future.result(5) == 'Success' and pytest.opcClient.read('Channel_1.Device_1.Tag_1', sync=True)[0] == 6)
+    pytest.opcClient.stop_writer()
+
+def test_writeasyncbackground():
+    pytest.opcClient.start_writer(max_delay=10, background=True)
+    futures = [pytest.opcClient.write_async(('Channel_1.Device_1.Tag_1', v)) for v in (4, 5)]
+    assert(futures[-1].result(5) == 'Success')
+    pytest.opcClient.stop_writer()
+    assert(pytest.opcClient.read('Channel_1.Device_1.Tag_1', sync=True)[0] == 5)
+
 def test_getitem():
     tagkep = 'Channel_1.Device_1.Tag_1'
     value = pytest.opcClient.__getitem__(tagkep)
@@ -382,6 +537,23 @@ def test_iproperties():
     props = list(pytest.opcClient.iproperties(taglistkep))
     assert(props[0][0] == 'Channel_1.Device_1.Bool_1')
 
+def test_propertiescached():
+    taglistkep = ['Channel_1.Device_1.Bool_1', 'Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2', 'Channel_1.Device_1.Tag_3']
+    pytest.opcClient.invalidate_properties()
+    props = pytest.opcClient.properties(taglistkep, id=[1, 5])
+    hits = pytest.opcClient.stats()['prop_hits']
+    assert(pytest.opcClient.properties(taglistkep, id=[1, 5]) == props)
+    assert(pytest.opcClient.stats()['prop_hits'] == hits + 8)
+
+def test_propertiesparallel():
+    taglistkep = ['Channel_1.Device_1.Bool_1', 'Channel_1.Device_1.Tag_1', 'Channel_1.Device_1.Tag_2', 'Channel_1.Device_1.Tag_3']
+    pytest.opcClient.invalidate_properties()
+    errors = pytest.opcClient.stats().get('prop_worker_errors', 0)
+    props = pytest.opcClient.properties(taglistkep, id=[1, 5], workers=4)
+    assert(pytest.opcClient.stats()['prop_worker_errors'] == errors)
+    pytest.opcClient.invalidate_properties()
+    assert(props == pytest.opcClient.properties(taglistkep, id=[1, 5]))
+
 def test_list():
     opclist = pytest.opcClient.list()
     assert(opclist[2] == 'Channel_1')
@@ -398,6 +570,14 @@ def test_listdevicewithrecursion():
     opclist = pytest.opcClient.list(paths="Channel_1.Device_1", recursive=True)
     assert(len(opclist) == 40 and opclist[0] == 'Channel_1.Device_1._System._DeviceId' and opclist[1] == 'Channel_1.Device_1._System._Enabled')
 
+def test_listparallelrecursion():
+    opclist = pytest.opcClient.list(paths="Channel_1", recursive=True)
+    pytest.opcClient.invalidate_browse()
+    stats = pytest.opcClient.stats()
+    assert(pytest.opcClient.list(paths="Channel_1", recursive=True, workers=4) == opclist)
+    after = pytest.opcClient.stats()
+    assert(after['browse_worker_errors'] == stats.get('browse_worker_errors', 0) and after['browse_prefetched'] > stats.get('browse_prefetched', 0))
+
 def test_listchannels():
     opclist = pytest.opcClient.list(paths="Channel*")
     assert(len(opclist) == 5 and opclist[1] == 'Channel_1' and opclist[4] == 'Channel_4')
@@ -419,6 +599,27 @@ def test_ilist():
     opclist = list(pytest.opcClient.ilist())
     assert(opclist[2] == 'Channel_1')
 
+def test_listbrowsecache():
+    pytest.opcClient.set_browse_cache(ttl=None)
+    try:
+        opclist = pytest.opcClient.list(paths="Channel_1.Device_1", recursive=True)
+        misses = pytest.opcClient.stats()['browse_misses']
+        assert(pytest.opcClient.list(paths="Channel_1.Device_1", recursive=True) == opclist)
+        assert(pytest.opcClient.stats()['browse_misses'] == misses)
+        pytest.opcClient.invalidate_browse("Channel_1.Device_1")
+        assert(pytest.opcClient.list(paths="Channel_1.Device_1", recursive=True) == opclist)
+        assert(pytest.opcClient.stats()['browse_misses'] > misses)
+    finally:
+        pytest.opcClient.set_browse_cache(ttl=0)
+
+def test_savenamespace(tmp_path):
+    filename = str(tmp_path / 'namespace.db')
+    summary = pytest.opcClient.save_namespace(filename, "Channel_1.Device_1", properties=True)
+    assert(summary['added'] == 40 and pytest.opcClient.save_namespace(filename, "Channel_1.Device_1")['added'] == 0)
+    snapshot = OpenOPC.opcdabrowse.NamespaceSnapshot(filename, readonly=True)
+    assert(snapshot.list(paths="Channel_1.Device_1", recursive=True) == pytest.opcClient.list(paths="Channel_1.Device_1", recursive=True))
+    snapshot.close()
+
 def test_servers():
     serverlist = pytest.opcClient.servers('127.0.0.1') # Works with Matrikon.OPC.Automation dll
     assert(len(serverlist) > 0)
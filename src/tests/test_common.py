@@ -0,0 +1,75 @@
+"""
+Unit tests for OpenOPC.common
+Requires:
+        pytest
+"""
+import pytest
+from OpenOPC.common import compile_glob, wild2regex, ErrorStrings, GlobMatcher, get_error_str
+
+class FakeOPC():
+    """Counts the GetErrorString round trips made to the server"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def GetErrorString(self, error):
+        self.calls += 1
+        return 'Error %d\r\n' % error
+
+def com_error(scode):
+    return Exception(-2147352567, 'Exception occurred.', (0, None, None, None, 0, scode), None)
+
+def test_errorstringshits():
+    opc = FakeOPC()
+    cache = ErrorStrings()
+    for error in [-1073479673, -1073479673, -1073479672] * 100:
+        error_str = cache.get(error, lambda: opc.GetErrorString(error))
+    assert(opc.calls == 2 and cache.stats['error_str_misses'] == 2 and cache.stats['error_str_hits'] == 298)
+
+def test_errorstringslru():
+    cache = ErrorStrings(maxsize=2)
+    cache.get(1, lambda: 'one')
+    cache.get(2, lambda: 'two')
+    cache.get(1, lambda: 'one')
+    cache.get(3, lambda: 'three')
+    assert(len(cache) == 2 and cache.get(1, lambda: 'miss') == 'one' and cache.get(2, lambda: 'miss') == 'miss')
+
+def test_errorstringsclear():
+    stats = {}
+    cache = ErrorStrings(stats=stats)
+    cache.get(1, lambda: 'old server')
+    cache.clear()
+    assert(cache.get(1, lambda: 'new server') == 'new server' and stats['error_str_misses'] == 2)
+
+def test_geterrorstrcache():
+    cache = ErrorStrings()
+    error_str = get_error_str(com_error(-2147467259), cache=cache)
+    assert(get_error_str(com_error(-2147467259), cache=cache) == error_str and cache.stats['error_str_hits'] == 1)
+    assert(get_error_str(Exception(0, 'Invalid class string', None, None), cache=cache) == 'Invalid class string')
+
+def test_globmatcher():
+    matcher = GlobMatcher(['Channel_1.Device_1.Tag_1', 'channel_2*', '*.bool_1', '*Device_3*', 'Channel_?.Device_4.*', '*'])
+    names = ['channel_1.device_1.tag_1', 'Channel_2.Device_1.Tag_1', 'Channel_1.Device_1.Bool_1', 'Channel_1.Device_3.Tag_1', 'Channel_1.Device_4.Tag_1', 'Other']
+    assert([matcher.match(n) for n in names] == [0, 1, 2, 3, 4, 5])
+    assert(GlobMatcher(['*.Tag_1', 'Channel_1.*']).match('Channel_1.Device_1.Tag_1') == 0)
+    assert(GlobMatcher(['Tag_[!2]']).match('Tag_2') is None and GlobMatcher(['Tag_[!2]'])('Tag_3'))
+
+def test_globmatcherregex():
+    import re
+    globs = ['*', 'Tag_1', 'tag*', '*_1', '*ag*', 'T?g_*', 'T*_1', '[!T]*', '']
+    names = ['Tag_1', 'tag_2', 'Bool_1', 'Tg_1', 'TAG_11', '']
+    for glob in globs:
+        pattern = re.compile('^%s$' % wild2regex(glob), re.IGNORECASE)
+        assert([bool(pattern.search(n)) for n in names] == [compile_glob(glob)(n) for n in names])
+
+def test_compileglobcached():
+    assert(compile_glob('Channel_*') is compile_glob(['Channel_*']))
+
+def test_globclassify():
+    names = ['Channel_%d.Device_%d.%s_%d' % (i % 3, i % 5, 'Alarm' if i % 7 == 0 else 'Tag', i % 11) for i in range(500)] + ['İstanbul.Tag_1']
+    globs = ['channel_1.*', '*.alarm_3', '*Device_2*', 'Channel_?.Device_4.Tag_1*', 'Channel_0.Device_0.Tag_10', '*Tag_1', '*']
+    for count in (1, 2, 5, 7):
+        matcher = GlobMatcher(globs[:count])
+        expected = [[n for n in names if matcher.match(n) == i] for i in range(count)]
+        assert(matcher.classify(names) == expected)
+        assert(matcher.classify(names[:-1]) == [[n for n in b if n != 'İstanbul.Tag_1'] for b in expected])
@@ -0,0 +1,165 @@
+"""
+Unit tests for OpenOPC.opcdaevents
+Requires:
+        pytest
+"""
+import threading
+import time
+import pytest
+import OpenOPC.opcdaevents
+from OpenOPC.opcdaevents import GroupEvents, Subscription, ThreadWait, Transactions, UpdateBuffer
+
+class FakeClient():
+    def __init__(self):
+        self.transactions = Transactions(ThreadWait())
+        self.subscriptions = {}
+        self.update_buffers = {'Group.0': UpdateBuffer()}
+
+class FakeGroup():
+    """Fires GroupEvents.OnDataChange from another thread, like a free-threaded OPC server"""
+
+    def __init__(self, client, delay=0.1, name='Group.0'):
+        OpenOPC.opcdaevents.current_client = client
+        self.events = GroupEvents()
+        self.events.group_name = name
+        self.delay = delay
+
+    def AsyncRefresh(self, source, tx_id):
+        callback = (tx_id, 2, [0, 1], [1.5, 2.5], [192, 192], [0, 0])
+        threading.Timer(self.delay, self.events.OnDataChange, callback).start()
+
+def test_asyncrefreshcompletion():
+    client = FakeClient()
+    group = FakeGroup(client)
+    tx = client.transactions.begin()
+    group.AsyncRefresh(2, tx)
+    cpu_start = time.process_time()
+    tx_id, handles, values, qualities, timestamps = client.transactions.result(tx, 5000)
+    assert(tx_id == tx and values == [1.5, 2.5])
+    assert(time.process_time() - cpu_start < 0.05) # blocked, not spinning
+
+def test_asyncreadcompletion():
+    client = FakeClient()
+    group = FakeGroup(client)
+    tx = client.transactions.begin()
+    threading.Timer(0.05, group.events.OnAsyncReadComplete, (tx, 1, [3], [7.5], [192], [0], [0])).start()
+    assert(client.transactions.result(tx, 5000) == (tx, [3], [7.5], [192], [0], [0]))
+
+def test_asyncwritecompletion():
+    client = FakeClient()
+    group = FakeGroup(client)
+    tx = client.transactions.begin()
+    threading.Timer(0.05, group.events.OnAsyncWriteComplete, (tx, 2, [3, 4], [0, -1073479673])).start()
+    assert(client.transactions.result(tx, 5000) == (tx, [3, 4], [0, -1073479673]))
+
+def test_asyncrefreshtimeout():
+    client = FakeClient()
+    group = FakeGroup(client, delay=0.5)
+    tx = client.transactions.begin()
+    group.AsyncRefresh(2, tx)
+    with pytest.raises(Exception) as exc_info:
+        client.transactions.result(tx, 100)
+    assert('Timeout waiting for data' in str(exc_info.value))
+    time.sleep(0.6)
+    assert(client.transactions.stats['late_callbacks'] == 1 and len(client.update_buffers['Group.0']) == 0)
+
+def test_unsolicitedcallback():
+    client = FakeClient()
+    group = FakeGroup(client, delay=0)
+    group.AsyncRefresh(2, 0)
+    time.sleep(0.1)
+    tx_id, handles, values, qualities, timestamps = client.update_buffers['Group.0'].get()
+    assert(tx_id == 0 and handles == [0, 1])
+
+def test_concurrenttransactions():
+    client = FakeClient()
+    slow = FakeGroup(client, delay=0.3)
+    fast = FakeGroup(client, delay=0.05)
+    tx_slow = client.transactions.begin()
+    tx_fast = client.transactions.begin()
+    slow.AsyncRefresh(2, tx_slow)
+    fast.AsyncRefresh(2, tx_fast)
+    assert(tx_slow != tx_fast and client.transactions.pending() == 2)
+    assert(client.transactions.result(tx_fast)[0] == tx_fast)
+    assert(client.transactions.result(tx_slow)[0] == tx_slow)
+
+def test_transactionidwrap():
+    transactions = Transactions()
+    transactions._tx_id = Transactions.MAX_TX_ID - 1
+    tx_last = transactions.begin()
+    tx_first = transactions.begin()
+    assert(tx_last == Transactions.MAX_TX_ID and tx_first == 1)
+    transactions._tx_id = 0
+    assert(transactions.begin() == 2) # 1 is still in use
+
+def test_purgeorphans():
+    transactions = Transactions()
+    transactions.begin(timeout=10)
+    tx = transactions.begin(timeout=10)
+    transactions.complete(tx, 'never collected')
+    time.sleep(0.05)
+    assert(transactions.purge() == 2 and transactions.pending() == 0 and transactions.stats['expired'] == 2)
+
+def convert(tx_id, handles, values, qualities, timestamps):
+    return [('Tag_%d' % h, values[i], 'Good', timestamps[i]) for i, h in enumerate(handles)]
+
+def test_subscriptioniterator():
+    client = FakeClient()
+    group = FakeGroup(client, delay=0.05)
+    removed = []
+    subscription = Subscription('Group', convert, client.transactions.wait, remove=lambda: removed.append(True), buffer=UpdateBuffer(policy='drop_oldest'))
+    client.subscriptions['Group.0'] = subscription
+    group.AsyncRefresh(2, 0)
+    group.AsyncRefresh(2, 0)
+    batches = []
+    for batch in subscription:
+        batches.append(batch)
+        if len(batches) == 2: subscription.close()
+    assert(batches[0] == [('Tag_0', 1.5, 'Good', 0), ('Tag_1', 2.5, 'Good', 0)] and len(batches) == 2 and removed == [True])
+
+def test_subscriptioncallback():
+    client = FakeClient()
+    group = FakeGroup(client, delay=0)
+    batches = []
+    client.subscriptions['Group.0'] = Subscription('Group', convert, client.transactions.wait, callback=batches.append)
+    group.AsyncRefresh(2, 0)
+    client.subscriptions['Group.0'].poll(200)
+    assert(len(batches) == 1 and len(client.update_buffers['Group.0']) == 0)
+
+def test_subscriptiononupdate():
+    client = FakeClient()
+    group = FakeGroup(client, delay=0)
+    updates = []
+    client.subscriptions['Group.0'] = Subscription('Group', convert, client.transactions.wait, on_update=updates.append)
+    group.AsyncRefresh(2, 0)
+    assert(client.subscriptions['Group.0'].get(1000) is not None and updates[0][2] == [1.5, 2.5])
+
+def test_subscriptiongettimeout():
+    subscription = Subscription('Group', convert)
+    assert(subscription.get(50) == None)
+
+def test_buffercoalesce():
+    stats = {}
+    buffer = UpdateBuffer(maxlen=3, stats=stats)
+    buffer.put((0, [0, 1], [1, 2], [192, 192], [0, 0]))
+    buffer.put((0, [1, 2], [3, 4], [192, 192], [1, 1]))
+    buffer.put((0, [3], [5], [192], [2]))
+    assert(len(buffer) == 3 and stats['updates_coalesced'] == 1 and stats['updates_dropped'] == 1)
+    assert(buffer.get() == (0, [1, 2, 3], [3, 4, 5], [192, 192, 192], [1, 1, 2]) and buffer.get() == None)
+
+def test_bufferdropoldest():
+    buffer = UpdateBuffer(maxlen=2, policy='drop_oldest')
+    for i in range(3): buffer.put((0, [0], [i], [192], [i]))
+    assert(buffer.stats['updates_dropped'] == 1 and buffer.get()[2] == [1] and buffer.get()[2] == [2])
+
+def test_bufferblock():
+    buffer = UpdateBuffer(maxlen=1, policy='block', timeout=50)
+    assert(buffer.put((0, [0], [1], [192], [0])) == True)
+    assert(buffer.put((0, [0], [2], [192], [0])) == False and buffer.stats['updates_dropped'] == 1)
+    threading.Timer(0.02, buffer.get).start()
+    buffer.timeout = 5000
+    assert(buffer.put((0, [0], [3], [192], [0])) == True and buffer.get()[2] == [3])
+
+def test_badbufferpolicy():
+    with pytest.raises(ValueError):
+        UpdateBuffer(policy='drop_newest')
@@ -0,0 +1,116 @@
+"""
+Unit tests for OpenOPC.opcdagroup
+Requires:
+        pytest
+"""
+import pytest
+import time
+from OpenOPC.opcdagroup import GroupItems, ItemPool
+
+class FakeOPCItems():
+    """In-process stand-in for the OPCItems automation object"""
+
+    def __init__(self, invalid=(), fail_remove=False):
+        self.invalid = invalid
+        self.fail_remove = fail_remove
+        self.removed = []
+        self._next_server_handle = 1000
+
+    def Validate(self, count, names):
+        return [1 if n in self.invalid else 0 for n in names[1:]]
+
+    def AddItems(self, count, names, client_handles):
+        server_handles = list(range(self._next_server_handle, self._next_server_handle + count))
+        self._next_server_handle += count
+        return server_handles, [0] * count
+
+    def Remove(self, count, server_handles):
+        if self.fail_remove:
+            raise RuntimeError('Remove failed')
+        self.removed += server_handles[1:]
+        return [0] * count
+
+def test_additems():
+    items = GroupItems()
+    valid_tags, server_handles = items.add_items(FakeOPCItems(), ['Tag_1', 'Tag_2', 'Tag_3'])
+    assert(valid_tags == ['Tag_1', 'Tag_2', 'Tag_3'] and server_handles == [1000, 1001, 1002])
+    assert(items.handles_tag == {0: 'Tag_1', 1: 'Tag_2', 2: 'Tag_3'})
+
+def test_additemsinvalid():
+    error_msgs = {}
+    items = GroupItems()
+    valid_tags, server_handles = items.add_items(FakeOPCItems(invalid=['Bad_1']), ['Tag_1', 'Bad_1'], error_msgs, lambda e: 'Error %d' % e)
+    assert(valid_tags == ['Tag_1'] and error_msgs == {'Bad_1': 'Error 1'})
+
+def test_rebuild():
+    opc_items = FakeOPCItems()
+    items = GroupItems()
+    items.add_items(opc_items, ['Tag_1', 'Tag_2', 'Tag_3'])
+    add_tags, del_tags = items.rebuild(opc_items, ['Tag_2', 'Tag_3', 'Tag_4'])
+    assert(add_tags == ['Tag_4'] and del_tags == ['Tag_1'] and opc_items.removed == [1000])
+    assert(list(items.valid_tags) == ['Tag_2', 'Tag_3', 'Tag_4'] and items.tags == ['Tag_2', 'Tag_3', 'Tag_4'])
+
+def test_removefailurekeepshandles():
+    opc_items = FakeOPCItems()
+    items = GroupItems()
+    items.add_items(opc_items, ['Tag_1', 'Tag_2'])
+    opc_items.fail_remove = True
+    with pytest.raises(RuntimeError):
+        items.remove_items(opc_items, ['Tag_1'])
+    assert(items.valid_tags == {'Tag_1': 0, 'Tag_2': 1} and items.server_handles['Tag_1'] == 1000)
+    items.add_items(opc_items, ['Tag_3'])
+    assert(items.valid_tags['Tag_3'] == 2)
+
+def test_poolevictfailure():
+    opc_items = FakeOPCItems()
+    pool = ItemPool(max_items=1)
+    pool.acquire(opc_items, ['Tag_1', 'Tag_2'])
+    opc_items.fail_remove = True
+    with pytest.raises(RuntimeError):
+        pool.evict(opc_items)
+    opc_items.fail_remove = False
+    assert(pool.evict(opc_items) == ['Tag_1'] and opc_items.removed == [1000] and len(pool) == 1)
+
+def test_rebuildreuseshandles():
+    opc_items = FakeOPCItems()
+    items = GroupItems()
+    items.add_items(opc_items, ['Tag_1', 'Tag_2', 'Tag_3'])
+    items.rebuild(opc_items, ['Tag_2', 'Tag_3', 'Tag_4'])
+    assert(items.valid_tags['Tag_4'] == 0 and items.handles_tag[0] == 'Tag_4')
+    items.rebuild(opc_items, ['Tag_2', 'Tag_3', 'Tag_4', 'Tag_5'])
+    assert(items.valid_tags['Tag_5'] == 3)
+
+def test_handlearray():
+    opc_items = FakeOPCItems()
+    items = GroupItems()
+    items.add_items(opc_items, ['Tag_1', 'Tag_2'])
+    valid_tags, server_handles = items.handle_array()
+    assert(valid_tags == ['Tag_1', 'Tag_2'] and server_handles == [1000, 1001])
+    assert(items.handle_array()[1] is server_handles)
+    items.rebuild(opc_items, ['Tag_2', 'Tag_3'])
+    assert(items.handle_array() == (['Tag_2', 'Tag_3'], [1001, 1002]))
+
+def test_poolacquire():
+    opc_items = FakeOPCItems(invalid=['Bad_1'])
+    pool = ItemPool()
+    pool.acquire(opc_items, ['Tag_1', 'Tag_2'])
+    valid_tags, server_handles = pool.acquire(opc_items, ['Tag_2', 'Tag_3', 'Bad_1'])
+    assert(valid_tags == ['Tag_2', 'Tag_3'] and server_handles == [1001, 1002])
+    assert(pool.stats['pool_hits'] == 1 and pool.stats['pool_misses'] == 4 and len(pool) == 3)
+
+def test_poolevictlru():
+    opc_items = FakeOPCItems()
+    pool = ItemPool(max_items=3)
+    pool.acquire(opc_items, ['Tag_1', 'Tag_2', 'Tag_3'])
+    pool.acquire(opc_items, ['Tag_1'])
+    pool.acquire(opc_items, ['Tag_4', 'Tag_5'])
+    assert(pool.evict(opc_items, keep={'Tag_2'}) == ['Tag_3', 'Tag_1'] and opc_items.removed == [1002, 1000])
+    assert(list(pool.items.valid_tags) == ['Tag_2', 'Tag_4', 'Tag_5'] and pool.stats['pool_evictions'] == 2)
+
+def test_poolevictidle():
+    opc_items = FakeOPCItems()
+    pool = ItemPool(max_idle=0.05)
+    pool.acquire(opc_items, ['Tag_1', 'Tag_2'])
+    time.sleep(0.1)
+    pool.acquire(opc_items, ['Tag_2'])
+    assert(pool.evict(opc_items) == ['Tag_1'] and len(pool) == 1)
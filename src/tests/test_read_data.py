@@ -0,0 +1,113 @@
+"""
+Unit tests for OpenOPC.opcdadata
+Requires:
+        pytest
+"""
+import datetime
+import math
+import time
+import pytest
+from OpenOPC.common import epoch2time, time2epoch
+from OpenOPC.opcdadata import ChangeFilter, PropertyCache, ReadBatch, ValueCache
+
+def batch():
+    return ReadBatch(['Tag_1', 'Tag_2', 'Tag_3'], [8, None, 2.5], [192, 0, 0x56], [1660000000.0, float('nan'), 1660000001.5], [True, False, True])
+
+def test_time2epoch():
+    timestamp = datetime.datetime(2022, 8, 8, 23, 6, 40, tzinfo=datetime.timezone.utc)
+    assert(time2epoch(timestamp) == 1660000000.0 and math.isnan(time2epoch(None)))
+
+def test_batchcolumns():
+    b = batch()
+    assert(len(b) == 3 and b.index['Tag_3'] == 2)
+    assert(int(b.qualities[2]) == 0x56 and b.timestamps[0] == 1660000000.0 and not b.ok[1])
+
+def test_batchtotuples():
+    tags = batch().to_tuples()
+    assert(tags[0] == ('Tag_1', 8, 'Good', '2022-08-08 23:06:40+00:00'))
+    assert(tags[1] == ('Tag_2', None, 'Error', None) and tags[2][2] == 'Uncertain')
+
+def test_epoch2time():
+    timestamp = datetime.datetime(2022, 8, 8, 23, 6, 40, 123000, tzinfo=datetime.timezone.utc)
+    assert(str(epoch2time(time2epoch(timestamp))) == str(timestamp) and epoch2time(float('nan')) is None)
+
+def test_batchtotuplesroundtrip():
+    # A columnar read converted back gives the strings of the tuple path, str(timestamp)
+    timestamps = [datetime.datetime(2022, 8, 8, 23, 6, 40, ms * 1000, tzinfo=datetime.timezone.utc) for ms in (0, 1, 123, 999)]
+    b = ReadBatch(['Tag_%d' % i for i in range(4)], [1] * 4, [192] * 4, [time2epoch(t) for t in timestamps], [True] * 4)
+    assert([t[3] for t in b.to_tuples()] == [str(t) for t in timestamps])
+
+def test_batchconcat():
+    b = ReadBatch.concat([batch(), ReadBatch(['Tag_4'], [1], [192], [1660000002.0], [True])])
+    assert(b.tags == ['Tag_1', 'Tag_2', 'Tag_3', 'Tag_4'] and b.index['Tag_4'] == 3 and b.to_tuples()[3][1] == 1)
+
+def test_valuecachefresh():
+    cache = ValueCache()
+    cache.update([('Tag_1', 1.5, 192, 0), ('Tag_2', 2.5, 192, 0)], received=time.time() - 1.0)
+    cache.update([('Tag_2', 3.5, 192, 1)])
+    assert(cache.fresh(['Tag_1', 'Tag_2', 'Tag_3'], 500) == {'Tag_2': (3.5, 192, 1)})
+    assert(cache.stats['cache_hits'] == 1 and cache.stats['cache_misses'] == 2)
+    assert(cache.fresh(['Tag_1'], 5000) == {'Tag_1': (1.5, 192, 0)})
+
+def test_valuecacheused():
+    cache = ValueCache()
+    assert(not cache.used)
+    cache.fresh(['Tag_1'], 1000)
+    assert(cache.used)
+
+def test_valuecacheevict():
+    cache = ValueCache(max_items=2)
+    cache.update([('Tag_1', 1, 192, 0), ('Tag_2', 2, 192, 0)])
+    cache.update([('Tag_1', 3, 192, 0), ('Tag_3', 4, 192, 0)])
+    assert(len(cache) == 2 and sorted(cache.fresh(['Tag_1', 'Tag_2', 'Tag_3'], 1000)) == ['Tag_1', 'Tag_3'])
+    assert(cache.stats['cache_evictions'] == 1)
+
+def test_valuecachedisabled():
+    cache = ValueCache(max_items=0)
+    cache.update([('Tag_1', 1, 192, 0)])
+    assert(len(cache) == 0)
+
+def test_changefilter():
+    changes = ChangeFilter()
+    first = [('Tag_1', 1.0, 'Good', 't0'), ('Tag_2', 'on', 'Good', 't0'), ('Tag_3', 5, 'Good', 't0')]
+    assert(list(changes.filter(first)) == first)
+    second = [('Tag_1', 1.0, 'Good', 't1'), ('Tag_2', 'off', 'Good', 't1'), ('Tag_3', 5, 'Bad', 't1')]
+    assert([r[0] for r in changes.filter(second)] == ['Tag_2', 'Tag_3'])
+
+def test_changefilterdeadband():
+    changes = ChangeFilter()
+    changes.changed('Tag_1', 100.0, 'Good')
+    assert(changes.changed('Tag_1', 100.4, 'Good', deadband=0.5) == False)
+    assert(changes.changed('Tag_1', 100.6, 'Good', deadband=0.5) == True)      # drift is measured from the last reported value
+    assert(changes.changed('Tag_1', 101.6, 'Good', percent=1) == False)
+    assert(changes.changed('Tag_1', 101.8, 'Good', deadband={'Tag_2': 5}, percent={'Tag_1': 1}) == True)
+
+def test_propertycache():
+    cache = PropertyCache(ttl=None)
+    cache.update('Tag_1', [(1, 'VT_R4'), (2, 1.5), (3, 'Good'), (5, 'Read/Write'), (100, 'degC')])
+    assert(cache.get('Tag_1', [1, 2, 3, 5, 100]) == {1: 'VT_R4', 5: 'Read/Write', 100: 'degC'})
+    assert(cache.stats['prop_hits'] == 3 and cache.stats['prop_misses'] == 2)
+    cache.set_available('Tag_1', [1, 2], ['Item Canonical DataType', 'Item Value'])
+    assert(cache.available('Tag_1') == ([1, 2], ['Item Canonical DataType', 'Item Value']) and cache.available('Tag_2') == None)
+
+def test_propertycachettl():
+    cache = PropertyCache(ttl=0.05)
+    cache.update('Tag_1', [(1, 'VT_R4'), (100, 'degC')])
+    cache.set_available('Tag_1', [1, 100], ['Item Canonical DataType', 'EU Units'])
+    time.sleep(0.1)
+    assert(cache.get('Tag_1', [1, 100]) == {1: 'VT_R4'} and cache.available('Tag_1') == None) # the datatype is kept for the session
+
+def test_propertycacheinvalidate():
+    cache = PropertyCache()
+    cache.update('Tag_1', [(1, 'VT_R4')])
+    cache.update('Tag_2', [(1, 'VT_BOOL')])
+    cache.invalidate(['Tag_1'])
+    assert(cache.get('Tag_1', [1]) == {} and cache.get('Tag_2', [1]) == {1: 'VT_BOOL'})
+    cache.invalidate()
+    assert(len(cache) == 0)
+
+def test_propertycachedisabled():
+    cache = PropertyCache(ttl=0)
+    cache.update('Tag_1', [(1, 'VT_R4')])
+    cache.set_available('Tag_1', [1], ['Item Canonical DataType'])
+    assert(cache.get('Tag_1', [1]) == {} and cache.available('Tag_1') == None and len(cache) == 0)
@@ -0,0 +1,219 @@
+"""
+Unit tests for OpenOPC.opcdasched
+Requires:
+        pytest
+"""
+import concurrent.futures
+import threading
+import time
+import pytest
+from OpenOPC.common import OPCError
+from OpenOPC.opcdasched import AdaptiveSizer, Scheduler, WriteQueue, chunk_ranges
+
+class FakeWriter():
+    """Records each batch written, like one iwrite() call per batch"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def write(self, tag_value_pairs):
+        if self.fail:
+            raise OPCError('write: Server unavailable')
+        self.batches.append(tag_value_pairs)
+        return [(tag, 'Success') for tag, value in tag_value_pairs]
+
+def test_writequeuecoalesce():
+    writer = FakeWriter()
+    queue = WriteQueue(writer.write, max_delay=1000, background=False)
+    futures = [queue.submit('Tag_1', i) for i in range(10)]
+    queue.submit('Tag_2', 'x')
+    assert(queue.flush() == 2 and writer.batches == [[('Tag_1', 9), ('Tag_2', 'x')]])
+    assert([f.result(0) for f in futures] == ['Success'] * 10 and queue.stats['writes_coalesced'] == 9)
+
+def test_writequeuebatchsize():
+    writer = FakeWriter()
+    queue = WriteQueue(writer.write, max_batch=2, max_delay=1000, background=False)
+    queue.submit('Tag_1', 1)
+    assert(len(writer.batches) == 0)
+    queue.submit('Tag_2', 2)
+    assert(writer.batches == [[('Tag_1', 1), ('Tag_2', 2)]] and len(queue) == 0)
+
+def test_writequeuedefault():
+    writer = FakeWriter()
+    queue = WriteQueue(writer.write, max_delay=0)
+    future = queue.submit('Tag_1', 1)
+    assert(future.result(0) == 'Success' and writer.batches == [[('Tag_1', 1)]])
+    queue.close()
+
+def test_writequeuelonewrite():
+    writer = FakeWriter()
+    queue = WriteQueue(writer.write, max_delay=50)
+    start = time.time()
+    future = queue.submit('Tag_1', 1)
+    assert(len(writer.batches) == 0)
+    assert(future.result(5) == 'Success' and writer.batches == [[('Tag_1', 1)]])
+    assert(0.04 <= time.time() - start < 1)
+
+def test_writequeueresulttimeout():
+    writer = FakeWriter()
+    queue = WriteQueue(writer.write, max_delay=1000)
+    future = queue.submit('Tag_1', 1)
+    with pytest.raises(concurrent.futures.TimeoutError):
+        future.result(0.01)
+    assert(writer.batches == [] and queue.flush() == 1 and future.result(0) == 'Success')
+
+def test_writequeuebackground():
+    writer = FakeWriter()
+    queue = WriteQueue(writer.write, max_delay=20, background=True)
+    futures = [queue.submit('Tag_%d' % (i % 5), i) for i in range(100)]
+    assert(futures[-1].result(5) == 'Success' and futures[0].result(0) == 'Success')
+    queue.close(5)
+    values = dict(pair for batch in writer.batches for pair in batch)
+    assert(values == {'Tag_0': 95, 'Tag_1': 96, 'Tag_2': 97, 'Tag_3': 98, 'Tag_4': 99} and len(writer.batches) < 100)
+
+def test_writequeuethreadhooks():
+    threads = []
+    def write(tag_value_pairs):
+        threads.append(('write', threading.current_thread()))
+        return [(tag, 'Success') for tag, value in tag_value_pairs]
+
+    queue = WriteQueue(write, max_delay=0, background=True,
+                       on_start=lambda: threads.append(('start', threading.current_thread())),
+                       on_exit=lambda: threads.append(('exit', threading.current_thread())))
+    assert(queue.submit('Tag_1', 1).result(5) == 'Success')
+    queue.close(5)
+    assert([name for name, thread in threads] == ['start', 'write', 'exit'])
+    assert(len(set(thread for name, thread in threads)) == 1 and threads[0][1] is not threading.current_thread())
+
+def test_writequeuestartfailure():
+    def on_start():
+        raise OPCError('Connect: Server unavailable')
+
+    writer = FakeWriter()
+    queue = WriteQueue(writer.write, max_delay=0, background=True, on_start=on_start)
+    future = queue.submit('Tag_1', 1)
+    with pytest.raises(Exception) as exc_info:
+        future.result(5)
+    queue.close(5)
+    assert('Server unavailable' in str(exc_info.value) and writer.batches == [])
+
+def test_writequeueerror():
+    queue = WriteQueue(FakeWriter(fail=True).write, background=False)
+    future = queue.submit('Tag_1', 1)
+    queue.flush()
+    with pytest.raises(Exception) as exc_info:
+        future.result(0)
+    assert('Server unavailable' in str(exc_info.value))
+
+def test_writequeueclosed():
+    queue = WriteQueue(FakeWriter().write, background=False)
+    queue.close()
+    with pytest.raises(Exception) as exc_info:
+        queue.submit('Tag_1', 1)
+    assert('Queue is closed' in str(exc_info.value))
+
+def test_sizerincrease():
+    sizer = AdaptiveSizer(target=100, size=100, increase=50)
+    sizer.update(100, 20)
+    sizer.update(30, 20)    # short final chunk
+    assert(sizer.next_size() == 150 and sizer.state()['transactions'] == 2)
+
+def test_sizerdecrease():
+    sizer = AdaptiveSizer(target=100, size=400, min_size=150)
+    sizer.update(400, 250)
+    assert(sizer.next_size() == 200 and sizer.pause == 0)
+    sizer.update(200, 0, failed=True)
+    assert(sizer.next_size() == 150 and sizer.pause == 10)
+    sizer.update(150, 20)
+    assert(sizer.pause == 5 and sizer.state()['failures'] == 1)
+
+def test_sizerconverges():
+    # A server whose latency grows with the transaction size: 1 ms per 10 tags
+    sizer = AdaptiveSizer(target=100, size=10, max_size=100000)
+    for i in range(200):
+        n = sizer.next_size()
+        sizer.update(n, n / 10.0)
+    assert(500 <= sizer.next_size() <= 1050)
+
+def test_chunkranges():
+    assert(list(chunk_ranges(5, 2)) == [(0, 2), (2, 4), (4, 5)] and list(chunk_ranges(3)) == [(0, 3)])
+    sizer = AdaptiveSizer(size=40, increase=10)
+    ranges = []
+    for start, end in chunk_ranges(100, sizer=sizer):
+        ranges.append((start, end))
+        sizer.update(end - start, 1)
+    assert(ranges == [(0, 40), (40, 90), (90, 100)])
+
+class FakeReader():
+    """Records each read transaction, taking 'delay' seconds per read"""
+
+    def __init__(self, delay=0):
+        self.reads = []
+        self.delay = delay
+
+    def read(self, tags, size):
+        self.reads.append(tags)
+        time.sleep(self.delay)
+        return [(tag, 1.0, 'Good', '') for tag in tags]
+
+def test_schedulermerge():
+    reader = FakeReader()
+    results = []
+    scheduler = Scheduler(reader.read, sink=lambda name, batch: results.append((name, batch)))
+    scheduler.add('fast', ['Tag_1', 'Tag_2'], 20)
+    scheduler.add('slow', ['Tag_2', 'Tag_3'], 40)
+    scheduler.run(90)
+    assert(reader.reads[0] == ['Tag_1', 'Tag_2', 'Tag_3'] and results[1] == ('slow', [('Tag_2', 1.0, 'Good', ''), ('Tag_3', 1.0, 'Good', '')]))
+    stats = scheduler.stats()
+    assert(4 <= stats['fast']['scans'] <= 5 and 2 <= stats['slow']['scans'] <= 3 and stats['slow']['merged'] == stats['slow']['scans'])
+
+def test_schedulernodrift():
+    reader = FakeReader(delay=0.005)
+    scheduler = Scheduler(reader.read)
+    scheduler.add('scan', ['Tag_1'], 20)
+    scheduler.run(205)
+    # Sleeping 20 ms after each 5 ms read would only fit 9 scans
+    assert(scheduler.stats()['scan']['scans'] >= 10 and scheduler.stats()['scan']['overruns'] == 0)
+
+def test_scheduleroverrun():
+    reader = FakeReader(delay=0.05)
+    scheduler = Scheduler(reader.read)
+    scheduler.add('scan', ['Tag_1'], 20)
+    scheduler.run(100)
+    stats = scheduler.stats()['scan']
+    assert(stats['scans'] == 2 and stats['overruns'] == 2 and stats['skipped'] >= 4 and stats['max_latency'] >= 50)
+
+def test_scheduleroffset():
+    reader = FakeReader()
+    scheduler = Scheduler(reader.read)
+    scheduler.add('a', ['Tag_1'], 40)
+    scheduler.add('b', ['Tag_2'], 40, offset=20)
+    scheduler.start()
+    time.sleep(0.07)
+    scheduler.stop(1)
+    assert(reader.reads[:2] == [['Tag_1'], ['Tag_2']] and scheduler.stats()['b']['merged'] == 0)
+
+def test_schedulerthreadhooks():
+    reader = FakeReader()
+    threads = []
+    scheduler = Scheduler(reader.read, on_start=lambda: threads.append(threading.current_thread()),
+                          on_exit=lambda: threads.append(threading.current_thread()))
+    scheduler.add('scan', ['Tag_1'], 20)
+    scheduler.start()
+    time.sleep(0.05)
+    scheduler.stop(1)
+    assert(len(threads) == 2 and threads[0] is threads[1] and threads[0] is not threading.current_thread())
+    assert(scheduler.stats()['scan']['scans'] >= 1)
+
+def test_schedulerstartfailure():
+    def on_start():
+        raise OPCError('Connect: Server unavailable')
+
+    reader = FakeReader()
+    scheduler = Scheduler(reader.read, on_start=on_start)
+    scheduler.add('scan', ['Tag_1'], 20)
+    scheduler.start()
+    time.sleep(0.05)
+    scheduler.stop(1)
+    assert(reader.reads == [] and scheduler.stats()['scan']['errors'] >= 1)